@@ -0,0 +1,101 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+asyncio discovery of a fake campus.
+
+Serves --switches fake IOS switches over telnet on 127.0.x.y, cabled as a
+tree with --fanout children per switch, every command taking --delay
+seconds, and discovers them from the root with max_in_flight switches
+talked to at the same time. Reports time and the threads used.
+
+    python -m benchmarks.bench_async_discovery --switches 500 --delay 0.2 --in-flight 10 200
+"""
+
+import argparse
+import asyncio
+import logging
+import threading
+import time
+
+from netwalk import Fabric
+
+from tests.fakedevice import FakeDevice, FakeNetwork
+
+
+def build_tree(count, fanout, delay):
+    devices = []
+    for num in range(count):
+        address = f"127.0.{1 + num // 250}.{1 + num % 250}"
+        devices.append(FakeDevice(f"sw{num}", address, ports=fanout + 1, delay=delay))
+        if num:
+            parent = devices[(num - 1) // fanout]
+            parent.connect(2 + (num - 1) % fanout, devices[num], 1)
+    return devices
+
+
+async def discover(devices, in_flight):
+    network = FakeNetwork(devices)
+    await network.start()
+    peak_threads = threading.active_count()
+
+    async def watch():
+        nonlocal peak_threads
+        while True:
+            peak_threads = max(peak_threads, threading.active_count())
+            await asyncio.sleep(0.05)
+
+    watcher = asyncio.ensure_future(watch())
+    try:
+        fabric = Fabric()
+        start = time.perf_counter()
+        await fabric.async_init_from_seed_device([devices[0].address],
+                                                 [("cisco", "cisco")],
+                                                 [{'transport': 'telnet', 'port': network.telnet_port}],
+                                                 max_in_flight=in_flight,
+                                                 timeout=60)
+        elapsed = time.perf_counter() - start
+    finally:
+        watcher.cancel()
+        await network.stop()
+
+    return fabric, elapsed, peak_threads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--switches', type=int, default=500)
+    parser.add_argument('--fanout', type=int, default=8)
+    parser.add_argument('--delay', type=float, default=0.2)
+    parser.add_argument('--in-flight', type=int, nargs='+', default=[10, 200])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    print(f"{args.switches} switches, {args.delay}s per command")
+
+    for in_flight in args.in_flight:
+        devices = build_tree(args.switches, args.fanout, args.delay)
+        fabric, elapsed, threads = asyncio.run(discover(devices, in_flight))
+        assert len(fabric.switches) == args.switches, f"Found {len(fabric.switches)} switches"
+        print(f"{in_flight:>5} in flight: {elapsed:7.2f}s  {args.switches / elapsed:7.1f} switches/s  "
+              f"{threads} threads")
+
+
+if __name__ == '__main__':
+    main()
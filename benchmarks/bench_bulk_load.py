@@ -0,0 +1,83 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Fabric.load_configs throughput by number of worker processes.
+
+Writes --switches synthetic show run files to a temporary directory and
+loads them with 1, 2, 4... up to --max-workers processes.
+
+    python -m benchmarks.bench_bulk_load --switches 1000 --max-workers 8
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from netwalk import Fabric
+
+from .bench_parse_config import build_corpus
+
+
+def write_corpus(directory, switches, ports):
+    corpus = build_corpus(switches, ports)
+    per_switch = ports + 4
+    for index in range(switches):
+        blocks = corpus[index * per_switch:(index + 1) * per_switch]
+        with open(os.path.join(directory, f"sw{index}.cfg"), "w") as configfile:
+            configfile.write(f"hostname sw{index}\n!\n")
+            for block in blocks:
+                configfile.write("\n".join(block) + "\n")
+            configfile.write("end\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--switches', type=int, default=500)
+    parser.add_argument('--ports', type=int, default=52)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunksize', type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        write_corpus(directory, args.switches, args.ports)
+        print(f"{args.switches} files, {os.cpu_count()} CPUs")
+
+        workers = 1
+        baseline = None
+        while workers <= args.max_workers:
+            fabric = Fabric()
+            start = time.perf_counter()
+            fabric.load_configs(directory, workers=workers, chunksize=args.chunksize)
+            elapsed = time.perf_counter() - start
+            assert len(fabric.switches) == args.switches
+
+            baseline = baseline or elapsed
+            per_file = statistics.median(fabric.parse_times.values())
+            print(f"{workers:3d} workers: {elapsed:7.2f}s  "
+                  f"{args.switches / elapsed:8.1f} files/s  "
+                  f"speedup {baseline / elapsed:5.2f}x  "
+                  f"median parse {per_file * 1000:6.1f}ms/file")
+            workers *= 2
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+CDP neighbor parsing throughput.
+
+Parses --switches "show cdp neigh detail" outputs of --neighbors entries
+each, once opening and compiling the template for every output like
+netwalk 1.1.2 did and once through the template registry, on --threads
+threads like a discovery would.
+
+    python -m benchmarks.bench_cdp_parse --switches 2000 --neighbors 48 --threads 40
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import textfsm
+
+from netwalk import TemplateRegistry
+from netwalk.templates import TEMPLATE_DIR
+
+CDP_ENTRY = ("-------------------------\n"
+             "Device ID: {host}.example.com\n"
+             "Entry address(es): \n"
+             "  IP address: 10.{octet}.{num}.1\n"
+             "Platform: cisco WS-C2960X-48FPD-L,  Capabilities: Switch IGMP \n"
+             "Interface: GigabitEthernet1/0/{num},  Port ID (outgoing port): GigabitEthernet1/0/49\n"
+             "Holdtime : 150 sec\n"
+             "\n"
+             "Version :\n"
+             "Cisco IOS Software, C2960X Software (C2960X-UNIVERSALK9-M), Version 15.2(2)E7, RELEASE SOFTWARE (fc3)\n"
+             "Technical Support: http://www.cisco.com/techsupport\n"
+             "Copyright (c) 1986-2017 by Cisco Systems, Inc.\n"
+             "\n"
+             "advertisement version: 2\n"
+             "VTP Management Domain: ''\n"
+             "Native VLAN: 1\n"
+             "Duplex: full\n"
+             "\n")
+
+
+def build_output(switch: int, neighbors: int) -> str:
+    out = [f"core{switch}#show cdp neigh detail\n"]
+    for num in range(1, neighbors + 1):
+        out.append(CDP_ENTRY.format(host=f"sw{switch}-{num}", octet=switch % 256, num=num))
+    out.append(f"core{switch}#")
+    return "".join(out)
+
+
+def legacy_parse(text: str):
+    fsmpath = os.path.join(TEMPLATE_DIR, "show_cdp_neigh_detail.textfsm")
+    with open(fsmpath, 'r') as fsmfile:
+        re_table = textfsm.TextFSM(fsmfile)
+        return re_table.ParseText(text)
+
+
+def run(func, outputs, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(func, outputs))
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--switches', type=int, default=2000)
+    parser.add_argument('--neighbors', type=int, default=48)
+    parser.add_argument('--threads', type=int, default=40)
+    args = parser.parse_args()
+
+    outputs = [build_output(x, args.neighbors) for x in range(args.switches)]
+    size = sum(len(x) for x in outputs)
+    print(f"{args.switches} outputs, {args.neighbors} neighbors each, "
+          f"{size / 1e6:.1f} MB, {args.threads} threads")
+
+    registry = TemplateRegistry()
+
+    def registry_parse(text):
+        return registry.parse("show_cdp_neigh_detail", text)
+
+    # Warm up both
+    legacy_parse(outputs[0])
+    registry_parse(outputs[0])
+
+    results = {}
+    for label, func in (('legacy', legacy_parse), ('registry', registry_parse)):
+        elapsed, results[label] = run(func, outputs, args.threads)
+        count = sum(len(x) for x in results[label])
+        print(f"{label:>10}: {elapsed:6.2f}s  {args.switches / elapsed:8.0f} outputs/s  "
+              f"{count / elapsed:9.0f} neighbors/s")
+
+    assert results['legacy'] == results['registry'], "Different results"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Time of Fabric._find_links on a large fabric.
+
+Builds --switches switches cabled as a ring, each with --hosts CDP
+neighbors that are not switches (phones, APs), and times joining them.
+Half the switches are named in CDP without domain, so they are found by
+hostname. Neighbors are built again before every round.
+
+    python -m benchmarks.bench_find_links --switches 2000 --hosts 40
+"""
+
+import argparse
+import time
+
+from netwalk import Fabric, Interface, Switch
+
+
+def build_fabric(count, hosts):
+    switches = {}
+    for num in range(count):
+        switch = Switch(f"sw{num}", facts={'hostname': f"sw{num}", 'fqdn': f"sw{num}.example.com"})
+        for port in range(hosts + 2):
+            switch.add_interface(Interface(name=f"GigabitEthernet1/0/{port}", switch=switch))
+        switches[f"sw{num}.example.com"] = switch
+
+    for num, switch in enumerate(switches.values()):
+        peer = (num + 1) % count
+        name = f"sw{peer}.example.com" if num % 2 else f"sw{peer}"
+        switch.interfaces["GigabitEthernet1/0/0"].neighbors = [{'hostname': name,
+                                                                'remote_int': "GigabitEthernet1/0/1"}]
+        back = f"sw{num}.example.com" if num % 2 else f"sw{num}"
+        switches[f"sw{peer}.example.com"].interfaces["GigabitEthernet1/0/1"].neighbors = \
+            [{'hostname': back, 'remote_int': "GigabitEthernet1/0/0"}]
+        for port in range(2, hosts + 2):
+            switch.interfaces[f"GigabitEthernet1/0/{port}"].neighbors = [{'hostname': f"SEP{num:06d}{port:06d}",
+                                                                          'remote_int': "Port 1"}]
+
+    fabric = Fabric()
+    fabric.switches = switches
+    return fabric
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--switches', type=int, default=2000)
+    parser.add_argument('--hosts', type=int, default=40)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    best = None
+    for _ in range(args.rounds):
+        fabric = build_fabric(args.switches, args.hosts)
+        start = time.perf_counter()
+        unresolved = fabric._find_links()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    links = sum(isinstance(x, Interface)
+                for switch in fabric.switches.values()
+                for intf in switch.interfaces.values()
+                for x in intf.neighbors)
+    print(f"{args.switches} switches, {links // 2} links, {len(unresolved or [])} unresolved: "
+          f"_find_links {best:.3f}s")
+
+
+if __name__ == '__main__':
+    main()
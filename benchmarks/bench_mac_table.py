@@ -0,0 +1,112 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Memory and time of MAC tables in a large fabric.
+
+Spreads --entries MAC table entries over --switches switches, every MAC
+being seen by several switches like in a real layer 2 domain, and compares
+dict tables with MacTable: memory of the switch tables and time taken by
+Fabric._recalculate_macs. Requires numpy.
+
+    python -m benchmarks.bench_mac_table --entries 2000000 --switches 200
+"""
+
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from netaddr import EUI
+
+from netwalk import Fabric, Interface, MacTable, Switch
+
+
+def build_switches(count, ports):
+    switches = []
+    for num in range(count):
+        switch = Switch(f"sw{num}", facts={'hostname': f"sw{num}", 'fqdn': f"sw{num}"})
+        for port in range(ports):
+            switch.add_interface(Interface(name=f"GigabitEthernet1/0/{port}", switch=switch))
+        switches.append(switch)
+    return switches
+
+
+def build_tables(switches, entries, seen_by, seed):
+    "Return one list of (mac, vlan, port) per switch"
+    rnd = random.Random(seed)
+    macs = entries // seen_by
+    tables = [[] for _ in switches]
+    for _ in range(macs):
+        mac = rnd.getrandbits(48)
+        vlan = rnd.randint(1, 4094)
+        for index in rnd.sample(range(len(switches)), seen_by):
+            tables[index].append((mac, vlan, rnd.randrange(len(switches[index].interfaces))))
+    return tables
+
+
+def load(switches, tables, columnar):
+    for switch, table in zip(switches, tables):
+        interfaces = list(switch.interfaces.values())
+        entries = {EUI(mac): {'interface': interfaces[port], 'vlan': vlan} for mac, vlan, port in table}
+        switch.mac_table = MacTable(entries) if columnar else entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=500000)
+    parser.add_argument('--switches', type=int, default=100)
+    parser.add_argument('--ports', type=int, default=52)
+    parser.add_argument('--seen-by', type=int, default=4)
+    args = parser.parse_args()
+
+    switches = build_switches(args.switches, args.ports)
+    tables = build_tables(switches, args.entries, args.seen_by, 1)
+    count = sum(len(x) for x in tables)
+    print(f"{count} entries on {args.switches} switches")
+
+    results = {}
+    for label, columnar in (('dict', False), ('MacTable', True)):
+        for switch in switches:
+            switch.mac_table = {}
+        gc.collect()
+
+        tracemalloc.start()
+        load(switches, tables, columnar)
+        gc.collect()
+        used, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        fabric = Fabric(columnar_mac_table=columnar)
+        fabric.switches = {x.hostname: x for x in switches}
+        start = time.perf_counter()
+        fabric._recalculate_macs()
+        elapsed = time.perf_counter() - start
+
+        results[label] = {mac: data['interface'] for mac, data in fabric.mac_table.items()}
+        print(f"{label:>10}: {used / count:6.0f} bytes/entry  {used / 2**20:8.1f} MiB  "
+              f"_recalculate_macs {elapsed:6.2f}s")
+        del fabric
+
+    assert results['dict'] == results['MacTable'], "Different results"
+
+
+if __name__ == '__main__':
+    main()
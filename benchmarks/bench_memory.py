@@ -0,0 +1,139 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Memory used by Interface objects in a large fabric.
+
+Builds a Fabric with --interfaces interfaces parsed from synthetic configs,
+once with the current slotted Interface and once with the previous
+__dict__ based one, and reports bytes per interface and construction time.
+
+    python -m benchmarks.bench_memory --interfaces 200000
+"""
+
+import argparse
+import gc
+import logging
+import time
+import tracemalloc
+
+from netwalk import Fabric, Interface, Switch
+
+from .bench_parse_config import build_corpus
+
+
+class DictInterface():
+    "Interface as of netwalk 1.1.2, with a __dict__ and per instance containers"
+
+    def __init__(self, **kwargs):
+        from netwalk.switch import Switch
+        self.logger = logging.getLogger(__name__)
+        self.name = kwargs.get('name', None)
+        self.description = kwargs.get('description', "")
+        self.address = kwargs.get('address', {})
+        self.vrf = kwargs.get('vrf', "default")
+        self.mode = kwargs.get('mode', 'access')
+        self.channel_group = kwargs.get('channel_group', None)
+        self.channel_protocol = kwargs.get('channel_protocol', None)
+        self.allowed_vlan = kwargs.get('allowed_vlan', None)
+        self.native_vlan = kwargs.get('native_vlan', 1)
+        self.voice_vlan = kwargs.get('voice_vlan', None)
+        self.switch = kwargs.get('switch', None)
+        self.parent_interface = kwargs.get('parent_interface', None)
+        self.is_up = kwargs.get('is_up', True)
+        self.is_enabled = kwargs.get('is_enabled', True)
+        self.config = kwargs.get('config', None)
+        self.unparsed_lines = kwargs.get('unparsed_lines', [])
+        self.mac_count = 0
+        self.type_edge = kwargs.get('type_edge', False)
+        self.bpduguard = kwargs.get('bpduguard', False)
+        self.routed_port = kwargs.get('routed_port', False)
+        self.neighbors = kwargs.get('neighbors', [])
+        self.last_in = kwargs.get('last_in', None)
+        self.last_out = kwargs.get('last_out', None)
+        self.last_clearing = kwargs.get('last_clearing', None)
+        self.counters = kwargs.get('counters', None)
+        self.device = kwargs.get('switch', None)
+        self.speed = kwargs.get('speed', None)
+
+        if self.config is not None:
+            self.parse_config()
+
+
+# Same parser, only the object layout differs
+for _name, _value in vars(Interface).items():
+    if _name == 'parse_config' or _name.startswith('_parse_') or \
+            _name in ('_apply_rules', '_allowed_vlan_to_list'):
+        setattr(DictInterface, _name, _value)
+
+
+def build_fabric(cls, corpus, ports):
+    fabric = Fabric()
+    for index in range(0, len(corpus), ports):
+        hostname = f"sw{index // ports}"
+        switch = Switch(hostname, facts={'hostname': hostname, 'fqdn': hostname})
+        for block in corpus[index:index + ports]:
+            switch.add_interface(cls(config=block, switch=switch))
+        fabric.switches[hostname] = switch
+    return fabric
+
+
+def measure(cls, corpus, ports):
+    gc.collect()
+    start = time.perf_counter()
+    fabric = build_fabric(cls, corpus, ports)
+    elapsed = time.perf_counter() - start
+    del fabric
+
+    gc.collect()
+    tracemalloc.start()
+    fabric = build_fabric(cls, corpus, ports)
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del fabric
+
+    return used, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--interfaces', type=int, default=200000)
+    parser.add_argument('--ports', type=int, default=52)
+    args = parser.parse_args()
+
+    # build_corpus adds 4 SVIs per switch
+    switches = max(1, args.interfaces // (args.ports + 4))
+    corpus = [block for block in build_corpus(switches, args.ports)]
+    # Config lines are kept by both layouts, do not count them
+    configs = [list(x) for x in corpus]
+    count = len(corpus)
+    print(f"{count} interfaces on {switches} switches")
+
+    results = {}
+    for label, cls in (('__dict__', DictInterface), ('__slots__', Interface)):
+        used, elapsed = measure(cls, configs, args.ports + 4)
+        results[label] = used
+        print(f"{label:>10}: {used / count:8.0f} bytes/interface  "
+              f"{elapsed:6.2f}s to build")
+
+    print(f"{'saving':>10}: {1 - results['__slots__'] / results['__dict__']:8.1%}")
+
+
+if __name__ == '__main__':
+    main()
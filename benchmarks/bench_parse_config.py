@@ -0,0 +1,296 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Compare Interface.parse_config against the original regex chain.
+
+Builds a synthetic corpus of interface blocks, checks both parsers produce
+the same Interface state and reports lines/second for each.
+
+    python -m benchmarks.bench_parse_config --switches 200 --ports 52
+"""
+
+import argparse
+import ipaddress
+import random
+import re
+import time
+
+from netwalk import Interface
+
+
+def legacy_parse_config(self):
+    "Interface.parse_config as of netwalk 1.1.2"
+    if isinstance(self.config, str):
+        self.config = self.config.split("\n")
+
+    for line in self.config:
+        cleanline = line.strip()
+        match = re.search(r"switchport mode (.*)$", cleanline)
+        if match is not None:
+            self.mode = match.groups()[0].strip()
+            if self.mode == 'trunk' and self.allowed_vlan is None:
+                self.allowed_vlan = set([x for x in range(1, 4095)])
+            continue
+
+    for line in self.config:
+        cleanline = line.strip()
+
+        match = re.search(r"^interface ([A-Za-z\-]*(\/*\d*)+)", cleanline)
+        if match is not None:
+            self.name = match.groups()[0]
+            if "vlan" in self.name.lower():
+                self.routed_port = True
+                self.mode = 'access'
+                self.native_vlan = int(self.name.lower().replace("vlan",""))
+            continue
+
+        match = re.search(r"switchport mode (.*)$", cleanline)
+        if match is not None:
+            continue
+
+        match = re.search(r"description (.*)$", cleanline)
+        if match is not None:
+            self.description = match.groups()[0]
+            continue
+
+        match = re.search(r"channel-group (\d*) mode (\w*)", cleanline)
+        if match is not None:
+            self.channel_group = int(match.groups()[0])
+            self.channel_protocol = match.groups()[1]
+            continue
+
+        match = re.search(r"switchport access vlan (.*)$", cleanline)
+        if match is not None and self.mode != 'trunk':
+            self.native_vlan = int(match.groups()[0])
+            continue
+
+        match = re.search(r"switchport voice vlan (.*)$", cleanline)
+        if match is not None and self.mode == 'access':
+            self.voice_vlan = int(match.groups()[0])
+            continue
+
+        match = re.search(r"switchport trunk native vlan (.*)$", cleanline)
+        if match is not None and self.mode == 'trunk':
+            self.native_vlan = int(match.groups()[0])
+            continue
+
+        match = re.search(
+            r"switchport trunk allowed vlan ([0-9\-\,]*)$", cleanline)
+        if match is not None:
+            self.allowed_vlan = self._allowed_vlan_to_list(
+                match.groups()[0])
+            continue
+
+        match = re.search(
+            r"switchport trunk allowed vlan add ([0-9\-\,]*)$", cleanline)
+        if match is not None:
+            new_vlans = self._allowed_vlan_to_list(match.groups()[0])
+            self.allowed_vlan.update(list(new_vlans))
+            continue
+
+        match = re.search(
+            r"spanning-tree portfast", cleanline)
+        if match is not None:
+            if "trunk" in cleanline and self.mode == "trunk":
+                self.type_edge = True
+            elif "trunk" not in cleanline and self.mode == "access":
+                self.type_edge = True
+            continue
+
+        match = re.search(
+            r"spanning-tree bpduguard", cleanline)
+        if match is not None:
+            self.bpduguard = True
+            continue
+
+        if "no shutdown" in line:
+            self.is_enabled = True
+            continue
+        elif "shutdown" in line:
+            self.is_enabled = False
+            continue
+
+        if "switchport trunk encapsulation" in line:
+            continue
+
+        match = re.search(
+            r'vrf forwarding (.*)', cleanline)
+        if match is not None:
+            self.vrf = match.groups()[0]
+            continue
+
+        match = re.search(
+            r'ip address (\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}) (\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\s?(secondary)?', cleanline)
+        if match is not None:
+            address, netmask, secondary = match.groups()
+            addrobj = ipaddress.ip_interface(f"{address}/{netmask}")
+            addr_type = 'primary' if secondary is None else 'secondary'
+            if 'ipv4' not in self.address:
+                self.address['ipv4'] = {}
+            self.address['ipv4'][addrobj] = {'type': addr_type}
+            self.routed_port = True
+            continue
+
+        match = re.search(
+            r"standby (\d{1,3})?\s?(ip|priority|preempt|version)\s?(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}|\d*)?\s?(secondary)?", cleanline)
+        if match is not None:
+            grpid, command, argument, secondary = match.groups()
+            grpid = 0 if grpid is None else int(grpid)
+            if 'hsrp' not in self.address:
+                self.address['hsrp'] = {'version': 1, 'groups': {}}
+            if command == 'version':
+                self.address['hsrp']['version'] = int(argument)
+                continue
+            if grpid not in self.address['hsrp']['groups']:
+                self.address['hsrp']['groups'][grpid] = {'priority': 100, 'preempt': False, 'secondary': []}
+            if command == 'ip':
+                if secondary is not None:
+                    self.address['hsrp']['groups'][grpid]['secondary'].append(ipaddress.ip_address(argument))
+                else:
+                    self.address['hsrp']['groups'][grpid]['address'] = ipaddress.ip_address(argument)
+            elif command == 'priority':
+                self.address['hsrp']['groups'][grpid]['priority'] = int(argument)
+            elif command == 'preempt':
+                self.address['hsrp']['groups'][grpid]['preempt'] = True
+            continue
+
+        if cleanline != '' and cleanline != '!':
+            self.unparsed_lines.append(cleanline)
+
+
+class LegacyInterface(Interface):
+    parse_config = legacy_parse_config
+
+
+def access_block(rnd, name):
+    block = [f"interface {name}",
+             f" description user port {rnd.randint(1, 999)}",
+             f" switchport access vlan {rnd.randint(2, 400)}"]
+    if rnd.random() < 0.5:
+        block.append(f" switchport voice vlan {rnd.randint(401, 500)}")
+    block += [" switchport mode access",
+              " switchport nonegotiate",
+              " switchport port-security maximum 3",
+              " switchport port-security violation restrict",
+              " storm-control broadcast level 10.00",
+              " storm-control action shutdown",
+              " spanning-tree portfast",
+              " spanning-tree bpduguard enable",
+              " no cdp enable",
+              "!"]
+    if rnd.random() < 0.1:
+        block.insert(-1, " shutdown")
+    return block
+
+
+def trunk_block(rnd, name):
+    first = rnd.randint(2, 100)
+    block = [f"interface {name}",
+             " description uplink",
+             " switchport trunk encapsulation dot1q",
+             f" switchport trunk native vlan {rnd.randint(900, 999)}",
+             f" switchport trunk allowed vlan 1,{first}-{first + 50},200",
+             f" switchport trunk allowed vlan add {first + 300}",
+             " switchport mode trunk",
+             f" channel-group {rnd.randint(1, 8)} mode active",
+             " spanning-tree portfast trunk",
+             " ip dhcp snooping trust",
+             "!"]
+    return block
+
+
+def svi_block(rnd, vlan):
+    octet = rnd.randint(1, 250)
+    return [f"interface Vlan{vlan}",
+            f" description svi {vlan}",
+            " vrf forwarding users",
+            f" ip address 10.{octet}.{vlan % 250}.2 255.255.255.0",
+            f" ip address 10.{octet}.{vlan % 250 + 1}.2 255.255.255.0 secondary",
+            " standby version 2",
+            f" standby {vlan} ip 10.{octet}.{vlan % 250}.1",
+            f" standby {vlan} priority 110",
+            f" standby {vlan} preempt",
+            " ip helper-address 10.0.0.10",
+            " no ip redirects",
+            " no shutdown",
+            "!"]
+
+
+def build_corpus(switches, ports, seed=0):
+    "Return a list of interface config blocks, one list of lines each"
+    rnd = random.Random(seed)
+    corpus = []
+    for _ in range(switches):
+        for port in range(1, ports + 1):
+            name = f"GigabitEthernet1/0/{port}"
+            if port > ports - 4:
+                corpus.append(trunk_block(rnd, name))
+            else:
+                corpus.append(access_block(rnd, name))
+        for vlan in range(10, 14):
+            corpus.append(svi_block(rnd, vlan))
+    return corpus
+
+
+def state(interface):
+    return {k: getattr(interface, k) for k in (
+        'name', 'description', 'address', 'vrf', 'mode', 'channel_group',
+        'channel_protocol', 'allowed_vlan', 'native_vlan', 'voice_vlan',
+        'is_enabled', 'unparsed_lines', 'type_edge', 'bpduguard',
+        'routed_port')}
+
+
+def run(cls, corpus, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for block in corpus:
+            cls(config=block)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--switches', type=int, default=100)
+    parser.add_argument('--ports', type=int, default=52)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.switches, args.ports)
+    lines = sum(len(x) for x in corpus)
+
+    for block in corpus:
+        assert state(Interface(config=block)) == state(LegacyInterface(config=block)), block
+
+    print(f"{len(corpus)} interfaces, {lines} lines, parsed state identical")
+
+    results = {}
+    for label, cls in (('legacy', LegacyInterface), ('dispatch', Interface)):
+        elapsed = run(cls, corpus, args.repeat)
+        results[label] = elapsed
+        print(f"{label:>10}: {elapsed:8.3f}s  {lines / elapsed:12,.0f} lines/s")
+
+    print(f"{'speedup':>10}: {results['legacy'] / results['dispatch']:8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
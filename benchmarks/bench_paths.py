@@ -0,0 +1,98 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Time of path searches on a meshed core.
+
+Builds --cores core switches fully meshed with --parallel links between
+each pair, and --access access switches each with an uplink to two cores.
+Times the shortest path, --k shortest paths and all paths up to
+--max-hops links between two access switches, with a cold and a warm
+PathEngine cache.
+
+    python -m benchmarks.bench_paths --cores 8 --parallel 2 --access 200 --k 50
+"""
+
+import argparse
+import time
+
+from netwalk import Fabric, Interface, Switch
+
+
+def build_fabric(cores, parallel, access):
+    fabric = Fabric()
+    switches = [Switch(f"sw{x}", facts={'hostname': f"sw{x}", 'fqdn': f"sw{x}.example.com"})
+                for x in range(cores + access)]
+    fabric.switches = {x.facts['fqdn']: x for x in switches}
+
+    def cable(left, right):
+        ports = []
+        for switch in (left, right):
+            name = f"GigabitEthernet0/{len(switch.interfaces)}"
+            switch.add_interface(Interface(name=name, switch=switch, neighbors=[]))
+            ports.append(switch.interfaces[name])
+        ports[0].neighbors.append({'hostname': right.facts['fqdn'], 'remote_int': ports[1].name})
+        ports[1].neighbors.append({'hostname': left.facts['fqdn'], 'remote_int': ports[0].name})
+
+    for x in range(cores):
+        for y in range(x + 1, cores):
+            for _ in range(parallel):
+                cable(switches[x], switches[y])
+    for num in range(access):
+        cable(switches[cores + num], switches[num % cores])
+        cable(switches[cores + num], switches[(num + 1) % cores])
+
+    fabric.refresh_global_information()
+    return fabric, switches
+
+
+def timed(label, function):
+    start = time.perf_counter()
+    result = function()
+    print(f"{label:>28}: {time.perf_counter() - start:8.4f}s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cores', type=int, default=8)
+    parser.add_argument('--parallel', type=int, default=2)
+    parser.add_argument('--access', type=int, default=200)
+    parser.add_argument('--k', type=int, default=50)
+    parser.add_argument('--max-hops', type=int, default=4)
+    args = parser.parse_args()
+
+    fabric, switches = build_fabric(args.cores, args.parallel, args.access)
+    start, end = switches[args.cores], [switches[-1]]
+    print(f"{len(switches)} switches, {fabric.path_engine.links // 2} links")
+
+    for cache in ("cold", "warm"):
+        timed(f"shortest, {cache}", lambda: fabric.shortest_path(start, end))
+        paths = timed(f"{args.k} shortest, {cache}", lambda: fabric.k_shortest_paths(start, end, args.k))
+        bounded = timed(f"up to {args.max_hops} hops, {cache}",
+                        lambda: list(fabric.iter_paths(start, end, max_hops=args.max_hops)))
+    print(f"{len(paths)} shortest, longest {len(paths[-1]) // 2} hops; {len(bounded)} paths up to "
+          f"{args.max_hops} hops")
+
+    streamed = timed("all paths, 1s timeout", lambda: list(fabric.iter_paths(start, end, timeout=1)))
+    print(f"{len(streamed)} paths streamed before the timeout")
+
+
+if __name__ == '__main__':
+    main()
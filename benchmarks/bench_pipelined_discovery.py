@@ -0,0 +1,81 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+asyncio discovery with outputs parsed in threads or in processes.
+
+Discovers --switches fake IOS switches with --ports ports each, talked to
+in memory through the "fake" transport, every command taking --delay
+seconds. Outputs are parsed by each count of --workers threads, then
+processes. Processes only help with more than one CPU.
+
+    python -m benchmarks.bench_pipelined_discovery --switches 200 --ports 48 --workers 1 2 4
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+from netwalk import Fabric
+
+from benchmarks.bench_async_discovery import build_tree
+from tests.fakedevice import FakeCLI
+
+
+async def discover(devices, workers, processes):
+    FakeCLI.devices = {x.address: x for x in devices}
+    fabric = Fabric()
+    start = time.perf_counter()
+    await fabric.async_init_from_seed_device([devices[0].address],
+                                             [("cisco", "cisco")],
+                                             [{'transport': 'fake'}],
+                                             max_in_flight=200,
+                                             parse_threads=workers,
+                                             parse_processes=workers if processes else 0,
+                                             timeout=60)
+    return fabric, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--switches', type=int, default=200)
+    parser.add_argument('--ports', type=int, default=48)
+    parser.add_argument('--fanout', type=int, default=8)
+    parser.add_argument('--delay', type=float, default=0.05)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    print(f"{args.switches} switches, {args.ports} ports, {args.delay}s per command, {os.cpu_count()} CPUs")
+
+    for processes in (False, True):
+        for workers in args.workers:
+            devices = build_tree(args.switches, args.fanout, args.delay)
+            for device in devices:
+                device.ports = max(device.ports, args.ports)
+            fabric, elapsed = asyncio.run(discover(devices, workers, processes))
+            assert len(fabric.switches) == args.switches, f"Found {len(fabric.switches)} switches"
+            kind = "processes" if processes else "threads"
+            print(f"{workers:>3} {kind:<9}: {elapsed:7.2f}s  {args.switches / elapsed:7.1f} switches/s")
+
+
+if __name__ == '__main__':
+    main()
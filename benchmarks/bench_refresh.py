@@ -0,0 +1,97 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Time of Fabric.refresh_global_information after adding one switch.
+
+Builds a core switch with --switches access switches below it, each with
+--hosts MACs on its access ports, learned by the core on the downlink.
+The last access switch is left out of the fabric: refreshes once, adds it
+like add_switch would and times a full and an incremental refresh.
+
+    python -m benchmarks.bench_refresh --switches 1500 --hosts 40
+"""
+
+import argparse
+import time
+
+from netaddr import EUI
+
+from netwalk import Fabric, Interface, Switch
+
+
+def access_switch(num, hosts):
+    switch = Switch(f"sw{num}", facts={'hostname': f"sw{num}", 'fqdn': f"sw{num}.example.com"})
+    uplink = Interface(name="TenGigabitEthernet1/1/1", switch=switch,
+                       neighbors=[{'hostname': "core.example.com", 'remote_int': f"TenGigabitEthernet1/0/{num}"}])
+    switch.add_interface(uplink)
+    table = {}
+    for host in range(hosts):
+        port = Interface(name=f"GigabitEthernet1/0/{host + 1}", switch=switch, neighbors=[])
+        switch.add_interface(port)
+        table[EUI((num << 16) + host)] = {'interface': port, 'vlan': 10}
+    switch.mac_table = table
+    return switch
+
+
+def build_fabric(count, hosts):
+    "Return the fabric without the last access switch, and that switch"
+    fabric = Fabric()
+    core = Switch("core", facts={'hostname': "core", 'fqdn': "core.example.com"})
+    fabric.switches = {"core.example.com": core}
+    table = {}
+    for num in range(count + 1):
+        switch = access_switch(num, hosts)
+        downlink = Interface(name=f"TenGigabitEthernet1/0/{num}", switch=core,
+                             neighbors=[{'hostname': f"sw{num}.example.com",
+                                         'remote_int': "TenGigabitEthernet1/1/1"}])
+        core.add_interface(downlink)
+        for mac in switch.mac_table:
+            table[mac] = {'interface': downlink, 'vlan': 10}
+        if num < count:
+            fabric.switches[f"sw{num}.example.com"] = switch
+    core.mac_table = table
+    return fabric, switch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--switches', type=int, default=1500)
+    parser.add_argument('--hosts', type=int, default=40)
+    args = parser.parse_args()
+
+    for full in (True, False):
+        fabric, switch = build_fabric(args.switches, args.hosts)
+        start = time.perf_counter()
+        fabric.refresh_global_information()
+        first = time.perf_counter() - start
+
+        fabric.switches[f"sw{args.switches}.example.com"] = switch
+        start = time.perf_counter()
+        fabric.refresh_global_information(full=full)
+        elapsed = time.perf_counter() - start
+        fabric.refresh_global_information(check=True)
+
+        label = "full" if full else "incremental"
+        print(f"{args.switches} switches, first refresh {first:.3f}s, "
+              f"{label} refresh after adding one {elapsed:.4f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -19,37 +19,20 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import pickle
 import networkx as nx
 from pyvis.network import Network
-from netwalk import Interface
 
 #matplotlib.use("Agg")
 
 with open('fabric_data.bin', 'rb') as fabricfile:
     fabric = pickle.load(fabricfile)
 
-g = nx.Graph()
-
-g.add_nodes_from([swdata.facts['fqdn'] for swname, swdata in fabric.switches.items()])
-
-labeldict = {y: x for x, y in fabric.switches.items()}
-
-for swname, swdata in fabric.switches.items():
-    for intname, intdata in swdata.interfaces.items():
-        if hasattr(intdata, 'neighbors'):
-            if len(intdata.neighbors) == 1:
-                if isinstance(intdata.neighbors[0], Interface):
-                    side_a = intdata.switch.facts['fqdn']
-                    side_b = intdata.neighbors[0].switch.facts['fqdn']
-
-                    #try:
-                    #    assert side_a.name != "SMba32_CStellaICT"
-                    #    assert side_b.name != "SMba32_CStellaICT"
-                    #except AssertionError:
-                    #    continue
-
-                    g.add_edge(side_a, side_b)
-
-
-
+# One edge per pair of switches however many links they have
+g = fabric.topology.to_networkx(multigraph=False)
+g = nx.relabel_nodes(g, {node: data['switch'].facts['fqdn'] for node, data in g.nodes(data=True)})
+# pyvis can only show plain attributes, drop the Switch and Interface objects
+for _, _, data in g.edges(data=True):
+    data.clear()
+for _, data in g.nodes(data=True):
+    data.clear()
 
 nt = Network('100%', '75%')
 nt.show_buttons()
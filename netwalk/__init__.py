@@ -3,8 +3,18 @@
 from .interface import Interface
 from .switch import Switch
 from .fabric import Fabric
+from .vlanset import VlanSet
+from .parsecache import ParseCache
+from .mactable import MacTable
+from .templates import TemplateRegistry, register_template
+from .logincache import LoginCache
+from .failurecache import FailureCache
+from .scheduler import DiscoveryScheduler
+from .checkpoint import Checkpoint
+from .topology import Topology
 
-__all__ = ["Interface", "Switch", "Fabric"]
+__all__ = ["Interface", "Switch", "Fabric", "VlanSet", "ParseCache", "MacTable", "TemplateRegistry", "register_template",
+           "LoginCache", "FailureCache", "DiscoveryScheduler", "Checkpoint", "Topology"]
 
 
 #Taken from requests library, check their documentation
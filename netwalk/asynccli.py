@@ -0,0 +1,479 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"Define asynchronous CLI transports and the session replaying their outputs"
+
+import abc
+import asyncio
+import logging
+import re
+from typing import Callable, Dict, Iterable, List, Optional
+
+from napalm.ios.ios import IOSDriver
+
+try:
+    import asyncssh
+except ImportError:
+    asyncssh = None
+
+# Commands sent by Switch._get_switch_data through NAPALM, collected before
+# parsing. Anything else is fetched when asked for
+IOS_COMMANDS = ("show version",
+                "show hosts",
+                "show ip interface brief",
+                "show run",
+                "show mac-address-table",
+                "show mac address-table",
+                "show interfaces",
+                "show interface summary",
+                "show cdp neigh detail",
+                "show vtp status",
+                "show vlan all-ports",
+                "show ip interface",
+                "show ipv6 interface",
+                "show arp | exclude Incomplete")
+
+# Telnet protocol bytes
+IAC = 255
+DONT = 254
+DO = 253
+WONT = 252
+WILL = 251
+SB = 250
+SE = 240
+ECHO = 1
+SGA = 3
+
+_PROMPT_RE = re.compile(r"(?:^|\n)([^\n]*?[>#]) ?$")
+_USERNAME_RE = re.compile(r"(?:[Uu]sername|[Ll]ogin): ?$")
+_PASSWORD_RE = re.compile(r"[Pp]assword: ?$")
+_LOGIN_FAILED_RE = re.compile(r"% (?:Login invalid|Authentication failed|Bad passwords)")
+
+
+class AuthenticationError(ConnectionError):
+    "Device refused the credentials"
+
+
+class HostUnreachable(ConnectionError):
+    "No port to log in to the device answered"
+
+
+class AsyncCLI(abc.ABC):
+    """
+    CLI session to an IOS device, driven by its prompt
+
+    Subclasses open the stream and read and write text on it, implementing
+    _connect, _read, _write and _disconnect.
+    Every read waits at most timeout seconds
+    """
+
+    default_port = 0
+
+    def __init__(self,
+                 host: str,
+                 username: str,
+                 password: str,
+                 port: Optional[int] = None,
+                 secret: Optional[str] = None,
+                 timeout: float = 30):
+        self.logger = logging.getLogger(__name__)
+        self.host = host
+        self.username = username
+        self.password = password
+        self.port = port or self.default_port
+        self.secret = secret
+        self.timeout = timeout
+        self.prompt: Optional[str] = None
+        self._buffer = ""
+
+    def clone(self) -> 'AsyncCLI':
+        "Return a new, not connected, CLI to the same device"
+        return type(self)(self.host,
+                          self.username,
+                          self.password,
+                          port=self.port,
+                          secret=self.secret,
+                          timeout=self.timeout)
+
+    async def __aenter__(self) -> 'AsyncCLI':
+        await self.open()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    @abc.abstractmethod
+    async def _connect(self):
+        "Open the stream to host"
+
+    @abc.abstractmethod
+    async def _read(self) -> str:
+        "Return the next chunk of text, raise ConnectionError on EOF"
+
+    @abc.abstractmethod
+    def _write(self, text: str):
+        "Send text"
+
+    @abc.abstractmethod
+    async def _disconnect(self):
+        "Close the stream"
+
+    async def _login(self) -> str:
+        "Answer the device login prompts, return the CLI prompt"
+        match = await self._read_until(_PROMPT_RE)
+        return match.group(1).strip()
+
+    async def _read_until(self, *patterns: re.Pattern) -> re.Match:
+        """
+        Read until the buffer, without carriage returns, matches one of
+        patterns. Return the match and empty the buffer
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        while True:
+            for pattern in patterns:
+                match = pattern.search(self._buffer)
+                if match:
+                    self._buffer = ""
+                    return match
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError(f"Timeout waiting for {self.host}")
+
+            chunk = await asyncio.wait_for(self._read(), remaining)
+            self._buffer += chunk.replace("\r", "")
+
+    async def open(self):
+        "Connect, log in and prepare the terminal"
+        self.logger.info("Connecting to %s:%d with %s", self.host, self.port, type(self).__name__)
+        await asyncio.wait_for(self._connect(), self.timeout)
+        try:
+            self.prompt = await self._login()
+
+            if self.prompt.endswith(">") and self.secret is not None:
+                self._write("enable\n")
+                await self._read_until(_PASSWORD_RE)
+                self._write(self.secret + "\n")
+                match = await self._read_until(_PROMPT_RE)
+                self.prompt = match.group(1).strip()
+
+            await self.send_command("terminal length 0")
+            await self.send_command("terminal width 511")
+        except BaseException:
+            await self._disconnect()
+            raise
+
+    async def send_command(self, command: str) -> str:
+        "Run command, return its output without echo and prompt"
+        self._write(command + "\n")
+        prompt = re.compile(r"(?:^|\n)" + re.escape(self.prompt) + r" ?$")
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        while not prompt.search(self._buffer):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError(f"Timeout waiting for {command} on {self.host}")
+            chunk = await asyncio.wait_for(self._read(), remaining)
+            self._buffer += chunk.replace("\r", "")
+
+        output, self._buffer = self._buffer, ""
+        lines = output.split("\n")[:-1]
+        if lines and command in lines[0]:
+            lines = lines[1:]
+
+        return "\n".join(lines)
+
+    async def collect(self, commands: Iterable[str]) -> Dict[str, str]:
+        "Run commands one after the other, return {command: output}"
+        return {command: await self.send_command(command) for command in commands}
+
+    async def close(self):
+        try:
+            self._write("exit\n")
+        except Exception:
+            pass
+        await self._disconnect()
+
+
+class TelnetCLI(AsyncCLI):
+    "CLI over telnet, refusing every option but echo and suppress go ahead"
+
+    default_port = 23
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        self._pending = b""
+
+    def _negotiate(self, data: bytes) -> bytes:
+        "Answer and strip telnet commands"
+        data = self._pending + data
+        self._pending = b""
+        out = bytearray()
+        start = 0
+        while True:
+            iac = data.find(IAC, start)
+            if iac < 0:
+                out += data[start:]
+                break
+
+            out += data[start:iac]
+            if iac + 1 >= len(data):
+                self._pending = data[iac:]
+                break
+
+            command = data[iac + 1]
+            if command == IAC:
+                out.append(IAC)
+                start = iac + 2
+            elif command in (DO, DONT, WILL, WONT):
+                if iac + 2 >= len(data):
+                    self._pending = data[iac:]
+                    break
+                option = data[iac + 2]
+                if command == DO:
+                    self._writer.write(bytes((IAC, WONT, option)))
+                elif command == WILL:
+                    answer = DO if option in (ECHO, SGA) else DONT
+                    self._writer.write(bytes((IAC, answer, option)))
+                start = iac + 3
+            elif command == SB:
+                end = data.find(bytes((IAC, SE)), iac)
+                if end < 0:
+                    self._pending = data[iac:]
+                    break
+                start = end + 2
+            else:
+                start = iac + 2
+
+        return bytes(out)
+
+    async def _read(self) -> str:
+        while True:
+            data = await self._reader.read(65536)
+            if not data:
+                raise ConnectionError(f"Connection to {self.host} closed")
+            text = self._negotiate(data).decode('utf-8', 'replace')
+            if text:
+                return text
+
+    def _write(self, text: str):
+        self._writer.write(text.replace("\n", "\r\n").encode('utf-8'))
+
+    async def _login(self) -> str:
+        match = await self._read_until(_USERNAME_RE, _PASSWORD_RE, _PROMPT_RE)
+        if match.re is _USERNAME_RE:
+            self._write(self.username + "\n")
+            match = await self._read_until(_PASSWORD_RE, _PROMPT_RE)
+
+        if match.re is _PASSWORD_RE:
+            self._write(self.password + "\n")
+            match = await self._read_until(_LOGIN_FAILED_RE, _USERNAME_RE, _PASSWORD_RE, _PROMPT_RE)
+            if match.re is not _PROMPT_RE:
+                raise AuthenticationError(f"Authentication failed on {self.host}")
+
+        return match.group(1).strip()
+
+    async def _disconnect(self):
+        try:
+            self._writer.close()
+            await self._writer.wait_closed()
+        except Exception:
+            pass
+
+
+class SSHCLI(AsyncCLI):
+    "CLI over an SSH interactive shell, requires asyncssh"
+
+    default_port = 22
+
+    async def _connect(self):
+        if asyncssh is None:
+            raise ImportError("SSH transport requires asyncssh, install netwalk[asyncssh]")
+
+        try:
+            self._conn = await asyncssh.connect(self.host,
+                                                port=self.port,
+                                                username=self.username,
+                                                password=self.password,
+                                                known_hosts=None,
+                                                client_keys=None)
+        except asyncssh.PermissionDenied as exc:
+            raise AuthenticationError(f"Authentication failed on {self.host}") from exc
+        except asyncssh.Error as exc:
+            raise ConnectionError(str(exc)) from exc
+
+        self._process = await self._conn.create_process(term_type="vt100", term_size=(511, 24))
+
+    async def _read(self) -> str:
+        data = await self._process.stdout.read(65536)
+        if not data:
+            raise ConnectionError(f"Connection to {self.host} closed")
+        return data
+
+    def _write(self, text: str):
+        self._process.stdin.write(text)
+
+    async def _disconnect(self):
+        try:
+            self._conn.close()
+            await self._conn.wait_closed()
+        except Exception:
+            pass
+
+
+# Transports open_cli can choose from, by optional_args['transport']
+TRANSPORTS: Dict[str, type] = {'ssh': SSHCLI, 'telnet': TelnetCLI}
+
+
+def open_cli(host: str,
+             username: str,
+             password: str,
+             optional_args: Optional[dict] = None,
+             timeout: float = 30) -> AsyncCLI:
+    """
+    Return an AsyncCLI, not connected yet, for NAPALM style optional_args:
+    transport (ssh, telnet or any other in TRANSPORTS), port and secret
+    """
+    if optional_args is None:
+        optional_args = {}
+
+    cls = TRANSPORTS[optional_args.get('transport', 'ssh')]
+    return cls(host,
+               username,
+               password,
+               port=optional_args.get('port', None),
+               secret=optional_args.get('secret', None),
+               timeout=timeout)
+
+
+def transport_port(optional_args: Optional[dict] = None) -> Optional[int]:
+    "Return the TCP port NAPALM style optional_args connect to, None if unknown"
+    if optional_args is None:
+        optional_args = {}
+
+    try:
+        port = optional_args.get('port') or TRANSPORTS[optional_args.get('transport', 'ssh')].default_port
+    except KeyError:
+        return None
+
+    return port or None
+
+
+async def probe_port(host: str, port: int, timeout: float = 1) -> bool:
+    "Return True if a TCP connection to host:port succeeds within timeout"
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True
+
+
+async def preflight(host: str,
+                    optional_args: List[Optional[dict]],
+                    timeout: float = 1) -> List[Optional[dict]]:
+    """
+    Probe the ports of every optional_args at the same time, return the ones
+    whose port answered, in the same order. Ports that can't be told from
+    optional_args are not probed and kept.
+    Raise HostUnreachable if nothing is left
+    """
+    ports = {transport_port(x) for x in optional_args} - {None}
+    results = await asyncio.gather(*(probe_port(host, x, timeout) for x in ports))
+    open_ports = {port for port, is_open in zip(ports, results) if is_open}
+
+    usable = [x for x in optional_args if transport_port(x) is None or transport_port(x) in open_ports]
+    if not usable:
+        raise HostUnreachable(f"No answer from {host} on ports {sorted(ports)}")
+
+    return usable
+
+
+class _ReplayChannel():
+    "Stands in for the netmiko connection of a NAPALM driver"
+
+    def __init__(self,
+                 outputs: Dict[str, str],
+                 fetch: Optional[Callable[[str], str]] = None,
+                 prompt: str = "#"):
+        self.outputs = outputs
+        self.fetch = fetch
+        self.prompt = prompt
+        self.timeout = 30
+        self._written = ""
+
+    def _output(self, command: str) -> str:
+        try:
+            return self.outputs[command]
+        except KeyError:
+            if self.fetch is None:
+                raise
+
+        self.outputs[command] = self.fetch(command)
+        return self.outputs[command]
+
+    def send_command(self, command: str, **kwargs) -> str:
+        return self._output(command)
+
+    def write_channel(self, data: str):
+        self._written += data
+
+    def _read_written(self) -> str:
+        command = self._written.strip()
+        self._written = ""
+        return command + "\n" + self._output(command) + "\n"
+
+    def read_until_pattern(self, pattern: str = "", **kwargs) -> str:
+        return self._read_written()
+
+    def read_until_prompt(self, **kwargs) -> str:
+        return self._read_written() + self.prompt
+
+    def disconnect(self):
+        pass
+
+
+class ReplaySession(IOSDriver):
+    """
+    NAPALM IOS driver answering from outputs collected elsewhere
+
+    outputs: dict       {command: output}
+    fetch: callable     Called with a command missing from outputs, returns its output
+    prompt: str         Device prompt
+    """
+
+    def __init__(self,
+                 hostname: str,
+                 outputs: Dict[str, str],
+                 fetch: Optional[Callable[[str], str]] = None,
+                 prompt: str = "#"):
+        super().__init__(hostname, username="", password="")
+        self.device = _ReplayChannel(outputs, fetch, prompt)
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
@@ -0,0 +1,177 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"Define Checkpoint object"
+
+import logging
+import os
+import pickle
+import threading
+from typing import Any, Dict, List, Optional, Union
+
+from .switch import Switch
+
+_HEADER = ('netwalk-checkpoint', 1)
+
+
+class Checkpoint():
+    """
+    Append-only file of the progress of a discovery, to resume it if it
+    stops half way
+
+    Every host discovery is done with is appended as soon as it is done:
+    its status, its Switch if discovered, and the CDP neighbors it queued.
+    Loading replays the records in order. A record cut short by a crash is
+    dropped, and the file truncated after the last good one.
+
+    Records are pickles, only load checkpoints you wrote.
+    If path exists it is loaded, the discovery resumes from it
+    """
+
+    def __init__(self, path: Union[str, os.PathLike], sync: bool = False):
+        """
+        path: str      File to append to
+        sync: bool     fsync after every record, slower but survives power loss
+        """
+        self.logger = logging.getLogger(__name__)
+        self.path = os.fspath(path)
+        self.sync = sync
+        # Discovered switches, by host
+        self.switches: Dict[str, Switch] = {}
+        # discovery_status of every host recorded
+        self.status: Dict[str, Any] = {}
+        # What was known about hosts: platform, hops, collect_time
+        self.hosts: Dict[str, dict] = {}
+        self.records = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+        if os.path.isfile(self.path):
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self.status)
+
+    def __getstate__(self):
+        # Locks and open files can't be pickled, the file is opened again on the next record
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_file'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> List[str]:
+        "Hosts queued but not done, in the order they were queued"
+        return [host for host, status in self.status.items() if status == "Queued"]
+
+    def _apply(self, record: dict):
+        self.status.update(record.get('status', {}))
+
+        for host, info in record.get('hosts', {}).items():
+            self.hosts.setdefault(host, {}).update(info)
+
+        switch = record.get('switch')
+        if switch is not None:
+            self.switches[switch.hostname] = switch
+
+    def load(self):
+        "Replay the records in path, dropping a partial one at the end"
+        self.close()
+        with self._lock:
+            self.switches = {}
+            self.status = {}
+            self.hosts = {}
+            self.records = 0
+            good = 0
+
+            with open(self.path, 'rb') as checkfile:
+                try:
+                    if pickle.load(checkfile) != _HEADER:
+                        raise ValueError(f"{self.path} is not a netwalk checkpoint")
+                    good = checkfile.tell()
+
+                    while True:
+                        record = pickle.load(checkfile)
+                        self._apply(record)
+                        self.records += 1
+                        good = checkfile.tell()
+                except EOFError:
+                    pass
+                except (pickle.UnpicklingError, AttributeError, IndexError, ValueError) as exc:
+                    if good == 0:
+                        raise ValueError(f"{self.path} is not a netwalk checkpoint") from exc
+                    self.logger.warning("Dropping the end of %s, cut short: %s", self.path, exc)
+
+            if good < os.path.getsize(self.path):
+                os.truncate(self.path, good)
+
+        self.logger.info("Loaded %d records, %d switches from %s", self.records, len(self.switches), self.path)
+
+    def record(self,
+               status: Dict[str, Any],
+               switch: Optional[Switch] = None,
+               hosts: Optional[Dict[str, dict]] = None):
+        """
+        Append progress to path
+
+        status: dict       {host: discovery_status}
+        switch: Switch     Switch just discovered, if any
+        hosts: dict        {host: {'platform', 'hops', 'collect_time'}}, all optional
+        """
+        record = {'status': status}
+        if switch is not None:
+            record['switch'] = switch
+        if hosts:
+            record['hosts'] = hosts
+
+        data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if self._file is None:
+                new = not os.path.isfile(self.path) or os.path.getsize(self.path) == 0
+                self._file = open(self.path, 'ab')
+                if new:
+                    self._file.write(pickle.dumps(_HEADER))
+
+            self._file.write(data)
+            self._file.flush()
+            if self.sync:
+                os.fsync(self._file.fileno())
+
+            self._apply(record)
+            self.records += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def clear(self):
+        "Forget everything and empty path, to start a new discovery"
+        self.close()
+        with self._lock:
+            self.switches = {}
+            self.status = {}
+            self.hosts = {}
+            self.records = 0
+            if os.path.isfile(self.path):
+                os.remove(self.path)
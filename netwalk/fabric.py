@@ -18,7 +18,13 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 "Define Fabric object"
 
+import asyncio
+import json
 import logging
+import mmap
+import os
+import re
+import time
 
 import concurrent.futures
 from napalm.base.exceptions import ConnectionException
@@ -27,17 +33,182 @@ from netaddr import EUI
 
 from datetime import datetime as dt
 
-from typing import Any
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 from .switch import Switch
 from .interface import Interface
+from .parsecache import ParseCache
+from .mactable import MacTable
+from .asynccli import IOS_COMMANDS, AsyncCLI, HostUnreachable, open_cli, preflight
+from .logincache import LoginCache
+from .failurecache import FailureCache
+from .checkpoint import Checkpoint
+from .paths import PathEngine
+from .topology import Topology
+from .identity import (CDP_NAME_LENGTH, DuplicateSwitch, IdentityIndex, cdp_keys, facts_keys, normalize_hostname,
+                       show_version_keys)
+from .scheduler import DiscoveryScheduler, HostInfo, Ticket
+
+_HOSTNAME_RE = re.compile(r"^hostname (\S+)", re.MULTILINE)
+_DOMAIN_RE = re.compile(r"^ip domain[ -]name (\S+)", re.MULTILINE)
+
+# Switches by normalized name and by first CDP_NAME_LENGTH characters, see Fabric._link_index
+LinkIndex = Tuple[Dict[str, Switch], Dict[str, List[Switch]]]
+
+# Parse cache of the current worker process, see Fabric.load_configs
+_worker_parse_cache = None
+
+
+def _get_worker_parse_cache() -> ParseCache:
+    global _worker_parse_cache
+    if _worker_parse_cache is None:
+        _worker_parse_cache = ParseCache()
+
+    return _worker_parse_cache
+
+
+def _load_config_file(path: str,
+                      parse_cache: Optional[ParseCache] = None) -> Tuple[str, Union[Switch, Exception], float]:
+    """
+    Build a Switch from a show run saved in a file, with parse_cache or
+    the one of the worker process if None
+
+    Returns path, Switch or the exception raised and the time it took to parse
+    """
+    if parse_cache is None:
+        parse_cache = _get_worker_parse_cache()
+
+    start = time.perf_counter()
+    try:
+        switch = _parse_config_file(path, parse_cache)
+    except Exception as exc:
+        return path, exc, time.perf_counter() - start
+
+    return path, switch, time.perf_counter() - start
+
+
+def _parse_config_file(path: str, parse_cache: ParseCache) -> Switch:
+    with open(path, 'rb') as configfile:
+        if os.fstat(configfile.fileno()).st_size == 0:
+            config = ""
+        else:
+            with mmap.mmap(configfile.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                # Decode straight from the mapped pages, no intermediate bytes
+                config = str(mapped, 'utf-8', 'replace')
+
+    match = _HOSTNAME_RE.search(config)
+    hostname = match.groups()[0] if match else os.path.splitext(os.path.basename(path))[0]
+    match = _DOMAIN_RE.search(config)
+    fqdn = f"{hostname}.{match.groups()[0]}" if match else hostname
+
+    switch = Switch(hostname,
+                    config=config,
+                    facts={'hostname': hostname, 'fqdn': fqdn},
+                    parse_cache=parse_cache)
+    # Not needed anymore and would be sent back to the main process
+    switch.parse_cache = None
+
+    return switch
+
+
+class _MissingOutput(Exception):
+    "Output of a command was not collected"
+
+
+def _parse_switch_outputs(host: str,
+                          outputs: Dict[str, str],
+                          prompt: str,
+                          switch_options: dict) -> Union[Switch, str]:
+    """
+    Build a Switch from the outputs collected by the asyncio discovery, in a
+    worker process
+
+    Returns the Switch, or the command NAPALM needs and is missing from outputs
+    """
+    def fetch(command: str) -> str:
+        raise _MissingOutput(command)
+
+    switch = Switch(host, parse_cache=_get_worker_parse_cache(), **switch_options)
+    try:
+        switch.retrieve_data_from_outputs(outputs, fetch, prompt)
+    except _MissingOutput as exc:
+        return exc.args[0]
+
+    # Not needed anymore and would be sent back to the main process
+    switch.session = None
+    switch.parse_cache = None
+
+    return switch
+
 
 class Fabric():
-    def __init__(self):
+    def __init__(self,
+                 login_cache: Optional[LoginCache] = None,
+                 failure_cache: Optional[FailureCache] = None,
+                 **switch_options):
+        """
+        switch_options are passed to every Switch created by add_switch,
+        i.e. Fabric(single_show_interfaces=True)
+
+        login_cache: LoginCache       Learns which credentials and optional_args
+                                      work where, i.e. LoginCache("logins.json")
+                                      to keep them between runs. In memory if None
+        failure_cache: FailureCache   Hosts that could not be discovered, and
+                                      when to try them again. CDP neighbors still
+                                      in backoff are marked Skipped instead of
+                                      queued. In memory if None
+        """
         self.logger = logging.getLogger(__name__)
+        self.switch_options: dict = switch_options
         self.switches: dict[str, Switch] = {}
         self.discovery_status: dict[str, Any[dt, str]] = {}
-        self.mac_table: dict[EUI, dict] = {}
+        self.mac_table: Union[dict[EUI, dict], MacTable] = {}
+        if switch_options.get('columnar_mac_table', False):
+            self.mac_table = MacTable()
+        self.parse_cache = ParseCache()
+        self.parse_times: dict[str, float] = {}
+        # Seconds it took to log in to each host
+        self.login_times: dict[str, float] = {}
+        # Queue and concurrency of the last discovery
+        self.scheduler: Optional[DiscoveryScheduler] = None
+        # Seconds from start to end of the discovery of each host, this
+        # time and in the snapshot discovery started from
+        self.collect_times: dict[str, float] = {}
+        self.previous_collect_times: dict[str, float] = {}
+        # CDP hops from the seeds, and switches having each host as CDP neighbor
+        self.hops: dict[str, int] = {}
+        self.cdp_degree: dict[str, int] = {}
+        self.login_cache = login_cache if login_cache is not None else LoginCache()
+        self.failure_cache = failure_cache if failure_cache is not None else FailureCache()
+        # CDP platform of queued neighbors, by IP
+        self.neighbor_platforms: dict[str, str] = {}
+        # {fqdn: host} of the snapshot discovery started from, and the ones not found again
+        self.snapshot_switches: dict[str, str] = {}
+        self.disappeared: dict[str, str] = {}
+        # Serial numbers, chassis MACs and names of switches being discovered
+        self.identities = IdentityIndex()
+        # Where the progress of the last discovery was written
+        self.checkpoint: Optional[Checkpoint] = None
+        # CDP neighbors the last refresh could not join to a switch, see _find_links
+        self.unresolved_links: List[dict] = []
+        # {name: (Switch, mac_table)} at the last refresh, to only look at what changed
+        self._refreshed: Optional[Dict[str, Tuple[Switch, Any]]] = None
+        # Unresolved CDP neighbors by switch, and switches with some by normalized neighbor name
+        self._unresolved_by_switch: Dict[str, List[dict]] = {}
+        self._unresolved_names: Dict[str, set] = {}
+        # Some MAC table points to interfaces of another switch
+        self._foreign_macs = False
+        # Bumped every time links are joined, Topology and PathEngine are rebuilt when it changes
+        self._topology_version = 0
+        self._topology: Optional[Topology] = None
+        self._topology_built = -1
+        self._path_engine: Optional[PathEngine] = None
+        self._path_engine_version = -1
+
+    def __setstate__(self, state):
+        # Fabrics pickled by older versions lack the attributes added since
+        self.__init__()
+        self.__dict__.update(state)
 
     def add_switch(self,
                    host,
@@ -53,27 +224,56 @@ class Fabric():
         """
 
         self.logger.info("Creating switch %s", host)
-        thisswitch = Switch(host)
-        connected = False
-        for optional_arg in napalm_optional_args:
-            if connected:
-                break
+        thisswitch = Switch(host, parse_cache=self.parse_cache, **self.switch_options)
+        thisswitch.on_facts = self._identity_check(host)
+        platform = self.neighbor_platforms.get(host)
+        methods = self._login_methods(host, credentials, napalm_optional_args)
 
-            for cred in credentials:
-                try:
-                    thisswitch.retrieve_data(cred[0], cred[1],
-                                             napalm_optional_args=optional_arg)
-                    connected = True
-                    self.logger.info("Connection to switch %s successful", host)
-                    break
-                except (ConnectionException, NetMikoAuthenticationException, ConnectionRefusedError):
-                    self.logger.warning("Login failed, trying next method if available")
-                    continue
+        error = None
+        for attempt, (cred, optional_arg) in enumerate(methods):
+            try:
+                thisswitch.retrieve_data(cred[0], cred[1],
+                                         napalm_optional_args=optional_arg)
+            except (ConnectionException, NetMikoAuthenticationException, ConnectionRefusedError) as exc:
+                self.logger.warning("Login failed, trying next method if available")
+                error = exc
+                continue
+
+            self.logger.info("Connection to switch %s successful", host)
+            self.login_times[host] = thisswitch.connect_time
+            self.login_cache.record(host, (cred, optional_arg), attempt, platform, credentials)
+            return self._register_switch(thisswitch)
 
-        if not connected:
-            self.logger.error("Could not login with any of the specified methods")
-            raise ConnectionError("Could not log in with any of the specified methods")
+        self.login_cache.record_failure(len(methods))
+        self.logger.error("Could not login with any of the specified methods")
+        raise ConnectionError("Could not log in with any of the specified methods") from error
+
+    def _identity_check(self, host):
+        "Return an on_facts callback claiming the identity of the switch for host"
+        def check(switch: Switch):
+            self.identities.claim(host, facts_keys(switch.facts))
+        return check
+
+    async def _collect(self, host, cli: AsyncCLI) -> Dict[str, str]:
+        """
+        Collect IOS_COMMANDS, starting with show version to stop at once
+        if the device was already discovered through another host
+        """
+        version = await cli.send_command("show version")
+        self.identities.claim(host, show_version_keys(version))
 
+        outputs = {"show version": version}
+        outputs.update(await cli.collect(x for x in IOS_COMMANDS if x != "show version"))
+        return outputs
+
+    def _login_methods(self, host, credentials, napalm_optional_args) -> List[Tuple[tuple, Optional[dict]]]:
+        "Return (credential, optional_args) pairs to try on host, most likely first"
+        methods = [(cred, optional_arg)
+                   for optional_arg in napalm_optional_args
+                   for cred in credentials]
+        return self.login_cache.order(host, methods, self.neighbor_platforms.get(host), credentials)
+
+    def _register_switch(self, thisswitch: Switch) -> Switch:
         clean_fqdn = thisswitch.facts['fqdn'].replace(".not set", "")
         if clean_fqdn == "Unknown":
             clean_fqdn = thisswitch.facts['hostname']
@@ -82,11 +282,169 @@ class Fabric():
 
         return thisswitch
 
+    async def _async_login(self,
+                           host,
+                           credentials,
+                           napalm_optional_args,
+                           timeout: float) -> AsyncCLI:
+        methods = self._login_methods(host, credentials, napalm_optional_args)
+        error = None
+        for attempt, (cred, optional_arg) in enumerate(methods):
+            cli = open_cli(host, cred[0], cred[1], optional_arg, timeout=timeout)
+            start = time.perf_counter()
+            try:
+                await cli.open()
+            except (OSError, asyncio.TimeoutError) as exc:
+                self.logger.warning("Login failed, trying next method if available")
+                error = exc
+                continue
+
+            self.logger.info("Connection to switch %s successful", host)
+            self.login_times[host] = time.perf_counter() - start
+            self.login_cache.record(host, (cred, optional_arg), attempt,
+                                    self.neighbor_platforms.get(host), credentials)
+            return cli
+
+        self.login_cache.record_failure(len(methods))
+        self.logger.error("Could not login with any of the specified methods")
+        raise ConnectionError("Could not log in with any of the specified methods") from error
+
+    async def async_add_switch(self,
+                               host,
+                               credentials,
+                               napalm_optional_args=[None],
+                               parse_executor: Optional[concurrent.futures.Executor] = None,
+                               timeout: float = 30,
+                               io_slots: Optional[asyncio.Semaphore] = None):
+        """
+        Like add_switch, but talks to the switch through asyncio and parses
+        the outputs in parse_executor, or the default executor if None.
+        With a ProcessPoolExecutor the connection is closed before parsing,
+        the Switch is built in another process and sent back
+
+        host: str,                        IP or hostname of device to connect to
+        credentials: list(tuple(str,str)) List of (username, password) tuples to try
+        napalm_optional_args: list(dict)  transport, port and secret to use, as many as you want
+        timeout: float                    Seconds to wait for every answer of the device
+        io_slots: Semaphore               Held while connected to the switch
+        """
+        self.logger.info("Creating switch %s", host)
+        if io_slots is None:
+            io_slots = asyncio.Semaphore(1)
+
+        loop = asyncio.get_running_loop()
+
+        if isinstance(parse_executor, concurrent.futures.ProcessPoolExecutor):
+            async with io_slots:
+                cli = await self._async_login(host, credentials, napalm_optional_args, timeout)
+                try:
+                    outputs = await self._collect(host, cli)
+                finally:
+                    await cli.close()
+
+            while True:
+                result = await loop.run_in_executor(parse_executor, _parse_switch_outputs,
+                                                    host, outputs, cli.prompt, self.switch_options)
+                if isinstance(result, Switch):
+                    break
+
+                # NAPALM asked for something not collected, get it and start over
+                self.logger.debug("Fetching %s from %s", result, host)
+                async with io_slots:
+                    cli = cli.clone()
+                    await cli.open()
+                    try:
+                        outputs[result] = await cli.send_command(result)
+                    finally:
+                        await cli.close()
+
+            thisswitch = result
+            thisswitch.parse_cache = self.parse_cache
+            self.identities.claim(host, facts_keys(thisswitch.facts))
+            return self._register_switch(thisswitch)
+
+        async with io_slots:
+            cli = await self._async_login(host, credentials, napalm_optional_args, timeout)
+
+            def fetch(command: str) -> str:
+                # Called from the parsing thread for outputs not collected
+                return asyncio.run_coroutine_threadsafe(cli.send_command(command), loop).result()
+
+            try:
+                outputs = await self._collect(host, cli)
+                thisswitch = Switch(host, parse_cache=self.parse_cache, **self.switch_options)
+                thisswitch.on_facts = self._identity_check(host)
+                await loop.run_in_executor(parse_executor,
+                                           thisswitch.retrieve_data_from_outputs,
+                                           outputs, fetch, cli.prompt)
+            finally:
+                await cli.close()
+
+        return self._register_switch(thisswitch)
+
+    def load_configs(self,
+                     configs: Union[str, os.PathLike, Iterable[Union[str, os.PathLike]]],
+                     workers: Optional[int] = None,
+                     chunksize: int = 1) -> dict:
+        """
+        Add switches parsed from show run files, in parallel
+
+        configs: str or list     Directory containing show run files, or list of files
+        workers: int             Processes to use, defaults to the number of CPUs,
+                                 1 parses in this process
+        chunksize: int           Files sent to a process at a time
+
+        Each file becomes a Switch named after the config hostname, or the
+        file name if missing. Parse time of each file is saved in parse_times.
+        Returns self.switches
+        """
+        if isinstance(configs, (str, os.PathLike)) and os.path.isdir(configs):
+            paths = sorted(os.path.join(configs, x) for x in os.listdir(configs)
+                           if os.path.isfile(os.path.join(configs, x)))
+        else:
+            paths = [os.fspath(x) for x in configs]
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        self.logger.info("Loading %d config files with %d workers", len(paths), workers)
+
+        if workers == 1:
+            results = (_load_config_file(x, self.parse_cache) for x in paths)
+            self._add_loaded_switches(results)
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(_load_config_file, paths, chunksize=chunksize)
+                self._add_loaded_switches(results)
+
+        return self.switches
+
+    def _add_loaded_switches(self, results: Iterable[Tuple[str, Switch, float]]):
+        for path, switch, elapsed in results:
+            if isinstance(switch, Exception):
+                self.logger.error("Could not load %s: %s", path, switch)
+                continue
+
+            self.logger.debug("Parsed %s in %.3fs", path, elapsed)
+            self.parse_times[path] = elapsed
+            switch.parse_cache = self.parse_cache
+
+            clean_fqdn = switch.facts['fqdn']
+            if clean_fqdn in self.switches:
+                self.logger.warning("Switch %s loaded more than once, keeping %s", clean_fqdn, path)
+            self.switches[clean_fqdn] = switch
+
     def init_from_seed_device(self,
                               seed_hosts: str,
                               credentials: list,
                               napalm_optional_args=[None],
-                              parallel_threads=10):
+                              parallel_threads=10,
+                              engine="threads",
+                              parse_processes=0,
+                              preflight_timeout: Optional[float] = None,
+                              snapshot: Union[str, os.PathLike, dict, None] = None,
+                              scheduler: Optional[DiscoveryScheduler] = None,
+                              checkpoint: Union[str, os.PathLike, Checkpoint, None] = None):
         """
         Initialise entire fabric from a seed device.
 
@@ -94,133 +452,667 @@ class Fabric():
         credentials: list            List of (username, password) tuples to try
         napalm_optional_args_telnet  optional_args to pass to NAPALM for telnet
         napalm_optional_args_ssh     optional_args to pass to NAPALM for ssh
+        engine: str                  "threads" to use NAPALM, one thread per switch,
+                                     "asyncio" to run async_init_from_seed_device
+                                     with parallel_threads switches in flight
+        parse_processes: int         asyncio engine only, parse in this many processes
+        preflight_timeout: float     Seconds to wait for the ports of napalm_optional_args
+                                     to answer before logging in, 0 to skip the check.
+                                     Hosts with no port open are marked Unreachable.
+                                     Off by default with threads, 1 with asyncio
+        snapshot: str or dict        Warm start: file written by save_snapshot, or its
+                                     content. Switches in it are queued at once with the
+                                     seeds and tried first with the login that worked,
+                                     CDP is still followed. Switches not found again are
+                                     listed in disappeared
+        scheduler: DiscoveryScheduler Decides how many switches to talk to at the same
+                                     time, instead of parallel_threads, i.e. adapting
+                                     to login times and failures. Kept in self.scheduler
+        checkpoint: str or Checkpoint Append every switch to this file as soon as it is
+                                     discovered. If it already holds a discovery, its
+                                     switches are loaded and only the hosts it left
+                                     queued are discovered, then CDP is followed as usual
         """
+        if engine == "asyncio":
+            return asyncio.run(self.async_init_from_seed_device(seed_hosts,
+                                                                credentials,
+                                                                napalm_optional_args,
+                                                                max_in_flight=parallel_threads,
+                                                                parse_processes=parse_processes,
+                                                                preflight_timeout=1 if preflight_timeout is None
+                                                                else preflight_timeout,
+                                                                snapshot=snapshot,
+                                                                scheduler=scheduler,
+                                                                checkpoint=checkpoint))
+        elif engine != "threads":
+            raise ValueError(f"Unknown discovery engine {engine}")
+
+        if preflight_timeout is None:
+            preflight_timeout = 0
+
+
+        self.scheduler = scheduler if scheduler is not None else DiscoveryScheduler.fixed(parallel_threads)
 
         # We can use a with statement to ensure threads are cleaned up promptly
-        with concurrent.futures.ThreadPoolExecutor(max_workers=parallel_threads) as executor:
-            # Start the load operations and mark each future with its URL
-            for x in seed_hosts:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.scheduler.maximum) as executor:
+            future_switch_data = {}
+
+            def submit(hosts):
+                reachable = self._preflight(hosts, napalm_optional_args, preflight_timeout)
+                for host, optional_args in reachable.items():
+                    self.scheduler.push(host, optional_args, self._host_info(host))
+
+                # Start the load operations and mark each future with its ticket
+                for ticket in self.scheduler.ready():
+                    future_switch_data[executor.submit(self.add_switch,
+                                                       ticket.host,
+                                                       credentials,
+                                                       ticket.payload)] = ticket
+
+            start_hosts = self._start_hosts(seed_hosts, snapshot, checkpoint)
+            for x in start_hosts:
                 self.discovery_status[x] = "Queued"
 
             self.logger.debug("Adding seed hosts to loop")
-            future_switch_data = {executor.submit(
-                self.add_switch,
-                x,
-                credentials,
-                napalm_optional_args): x for x in seed_hosts}
+            submit(start_hosts)
 
             while future_switch_data:
-                self.logger.info("Connecting to switches, %d to go", len(future_switch_data))
+                self.logger.info("Connecting to switches, %d in flight, %d queued",
+                                 len(future_switch_data), self.scheduler.queued)
                 done, _ = concurrent.futures.wait(future_switch_data,
                                                   return_when=concurrent.futures.FIRST_COMPLETED)
 
+                queued = []
                 for fut in done:
-                    hostname = future_switch_data.pop(fut)
-                    self.logger.debug("Got data for %s", hostname)
+                    ticket = future_switch_data.pop(fut)
+                    self.logger.debug("Got data for %s", ticket.host)
                     try:
                         swobject = fut.result()
                     except Exception as exc:
-                        self.logger.error('%r generated an exception: %s' %
-                              (hostname, exc))
-                        self.discovery_status[hostname] = "Failed"
+                        queued += self._discovery_done(ticket, None, exc)
                     else:
-                        fqdn = swobject.facts['fqdn'].replace(".not set", "")
-                        self.discovery_status[hostname] = dt.now()
-                        self.logger.info("Completed discovery of %s %s", swobject.facts['fqdn'], swobject.hostname)
-                        # Check if it has cdp neighbors
-
-                        for _, intdata in swobject.interfaces.items():
-                            if hasattr(intdata, "neighbors"):
-                                for nei in intdata.neighbors:
-                                    if not isinstance(nei, Interface):
-                                        self.logger.debug("Evaluating neighbour %s", nei['hostname'])
-                                        if nei['hostname'] not in self.switches and nei['ip'] not in self.discovery_status:
-                                            try:
-                                                assert "AIR" not in nei['platform']
-                                                assert "CAP" not in nei['platform']
-                                                assert "N77" not in nei['platform']
-                                                assert "axis" not in nei['hostname']
-                                            except AssertionError:
-                                                self.logger.debug("Skipping %s, %s", nei['hostname'], nei['platform'])
-                                                continue
-
-                                            self.logger.info("Queueing discover for %s", nei['hostname'])
-                                            self.discovery_status[nei['ip']] = "Queued"
-
-                                            future_switch_data[executor.submit(self.add_switch,
-                                                                               nei['ip'],
-                                                                               credentials,
-                                                                               napalm_optional_args)] = nei['ip']
-                                        else:
-                                            self.logger.debug("Skipping %s, already discovered", nei['hostname'])
+                        queued += self._discovery_done(ticket, swobject)
+
+                submit(queued)
+
+        self._finish_discovery()
+
+    def _host_info(self, host: str) -> HostInfo:
+        return HostInfo(host,
+                        platform=self.neighbor_platforms.get(host),
+                        hops=self.hops.get(host, 0),
+                        degree=self.cdp_degree.get(host, 0),
+                        collect_time=self.previous_collect_times.get(host))
+
+    def _discovery_done(self,
+                        ticket: Ticket,
+                        swobject: Optional[Switch],
+                        error: Optional[Exception] = None) -> List[str]:
+        """
+        Record the outcome of the discovery of ticket.host, return the
+        neighbors to discover next
+        """
+        hostname = ticket.host
+        self.scheduler.done(ticket, error, self.login_times.get(hostname))
+
+        if error is None:
+            self.collect_times[hostname] = time.monotonic() - ticket.started
+            self.discovery_status[hostname] = dt.now()
+            self.failure_cache.record_success(hostname)
+            self.logger.info("Completed discovery of %s %s", swobject.facts['fqdn'], swobject.hostname)
+            queued = self._queue_neighbors(swobject)
+            if self.checkpoint is not None:
+                self._record_progress(hostname, swobject, queued)
+            return queued
+
+        if isinstance(error, HostUnreachable):
+            self.logger.warning("%s", error)
+            # Only a missed port check, not worth skipping the host next time
+            self.discovery_status[hostname] = "Unreachable"
+        elif isinstance(error, DuplicateSwitch):
+            self.logger.info("%s", error)
+            self.discovery_status[hostname] = "Duplicate"
+        else:
+            self.logger.error('%r generated an exception: %s' %
+                              (hostname, error))
+            self.discovery_status[hostname] = "Failed"
+            self.failure_cache.record_failure(hostname, f"Failed: {error}")
+            self.identities.release(hostname)
 
+        if self.checkpoint is not None:
+            self._record_progress(hostname)
+        return []
+
+    def _record_progress(self, hostname: str, swobject: Optional[Switch] = None, queued: Iterable[str] = ()):
+        "Append the outcome of hostname and the neighbors it queued to the checkpoint"
+        status = {hostname: self.discovery_status[hostname]}
+        hosts = {}
+        if swobject is not None:
+            hosts[hostname] = {'collect_time': self.collect_times[hostname]}
+        for host in queued:
+            status[host] = "Queued"
+            hosts[host] = {'platform': self.neighbor_platforms.get(host), 'hops': self.hops.get(host, 0)}
+
+        self.checkpoint.record(status, swobject, hosts)
+
+    def _resume(self, checkpoint: Checkpoint) -> List[str]:
+        "Load the switches and statuses of checkpoint, return the hosts it left queued"
+        for host, switch in checkpoint.switches.items():
+            switch.parse_cache = self.parse_cache
+            self._register_switch(switch)
+            self.identities.claim(host, facts_keys(switch.facts))
+            if switch.connect_time is not None:
+                self.login_times[host] = switch.connect_time
+
+        for host, info in checkpoint.hosts.items():
+            if info.get('platform') is not None:
+                self.neighbor_platforms[host] = info['platform']
+            if 'hops' in info:
+                self.hops[host] = info['hops']
+            if info.get('collect_time') is not None:
+                self.collect_times[host] = info['collect_time']
+
+        self.discovery_status.update(checkpoint.status)
+        pending = checkpoint.pending
+        self.logger.info("Resuming discovery from %s, %d switches done, %d queued",
+                         checkpoint.path, len(checkpoint.switches), len(pending))
+        return pending
+
+    def _start_hosts(self,
+                     seed_hosts: Iterable[str],
+                     snapshot: Union[str, os.PathLike, dict, None],
+                     checkpoint: Union[str, os.PathLike, Checkpoint, None] = None) -> List[str]:
+        """
+        Return seed_hosts followed by the hosts of snapshot, if any. Resuming
+        from checkpoint, the hosts it left queued come first and seeds
+        already done are left out
+        """
+        start_hosts = list(seed_hosts)
+
+        self.checkpoint = None
+        if checkpoint is not None:
+            if not isinstance(checkpoint, Checkpoint):
+                checkpoint = Checkpoint(checkpoint)
+            self.checkpoint = checkpoint
+            pending = self._resume(checkpoint)
+            start_hosts = pending + [x for x in start_hosts if x not in self.discovery_status]
+
+        if snapshot is not None:
+            start_hosts = self._snapshot_hosts(start_hosts, snapshot)
+
+        if self.checkpoint is not None:
+            self.checkpoint.record({x: "Queued" for x in start_hosts})
+        return start_hosts
+
+    def _snapshot_hosts(self,
+                        start_hosts: List[str],
+                        snapshot: Union[str, os.PathLike, dict]) -> List[str]:
+        "Return start_hosts followed by the hosts of snapshot"
+        if isinstance(snapshot, (str, os.PathLike)):
+            with open(snapshot, 'r') as snapshotfile:
+                snapshot = json.load(snapshotfile)
+
+        self.snapshot_switches = {}
+        for fqdn, entry in snapshot['switches'].items():
+            host = entry['host']
+            self.snapshot_switches[fqdn] = host
+            if entry.get('collect_time') is not None:
+                self.previous_collect_times[host] = entry['collect_time']
+            # A persistent login cache may know better
+            if entry.get('login') and self.login_cache.host_method(host) is None:
+                self.login_cache.set_host_method(host, entry['login'])
+
+            if host in start_hosts or host in self.discovery_status:
+                continue
+            if self.failure_cache.should_skip(host):
+                self.logger.info("Skipping %s, failed before: %s", fqdn, self.failure_cache.get(host)['reason'])
+                self.discovery_status[host] = "Skipped"
+                continue
+            start_hosts.append(host)
+
+        self.logger.info("Warm start with %d known switches", len(self.snapshot_switches))
+        return start_hosts
+
+    def _finish_discovery(self):
         self.logger.info("Discovery complete, crunching data")
+        self.disappeared = {fqdn: host for fqdn, host in self.snapshot_switches.items()
+                            if fqdn not in self.switches}
+        for fqdn, host in self.disappeared.items():
+            self.logger.warning("Switch %s (%s) not found again, was in the snapshot", fqdn, host)
+
+        self.login_cache.save()
+        self.failure_cache.save()
+        if self.checkpoint is not None:
+            self.checkpoint.close()
         self.refresh_global_information()
 
-    def refresh_global_information(self):
+    def save_snapshot(self, path: Union[str, os.PathLike]):
+        """
+        Write the switches discovered, the host used to reach each, the
+        key of the login that worked and the seconds discovery took, for
+        a warm start with init_from_seed_device(snapshot=path)
+        """
+        switches = {fqdn: {'host': switch.hostname,
+                           'login': self.login_cache.host_method(switch.hostname),
+                           'collect_time': self.collect_times.get(switch.hostname)}
+                    for fqdn, switch in self.switches.items()}
+        data = json.dumps({'version': 1, 'saved': dt.now().isoformat(), 'switches': switches},
+                          sort_keys=True, indent=1)
+
+        temp = os.fspath(path) + ".tmp"
+        with open(temp, 'w') as snapshotfile:
+            snapshotfile.write(data)
+        os.replace(temp, path)
+
+    def _preflight(self,
+                   hosts: List[str],
+                   napalm_optional_args: list,
+                   timeout: float) -> Dict[str, list]:
+        """
+        Probe the ports of napalm_optional_args on all hosts at the same time.
+        Return {host: optional_args whose port answered}, hosts that did
+        not answer at all are marked Unreachable
+        """
+        if not timeout:
+            return {x: napalm_optional_args for x in hosts}
+
+        async def probe(host):
+            try:
+                return await preflight(host, napalm_optional_args, timeout)
+            except HostUnreachable as exc:
+                return exc
+
+        async def probe_all():
+            return await asyncio.gather(*(probe(x) for x in hosts))
+
+        if not hosts:
+            return {}
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            results = asyncio.run(probe_all())
+        else:
+            # Called from an event loop, i.e. Jupyter: probe on a loop of our own
+            with concurrent.futures.ThreadPoolExecutor(1) as executor:
+                results = executor.submit(asyncio.run, probe_all()).result()
+
+        reachable = {}
+        for host, result in zip(hosts, results):
+            if isinstance(result, HostUnreachable):
+                self.logger.warning("%s", result)
+                self.discovery_status[host] = "Unreachable"
+            else:
+                reachable[host] = result
+
+        return reachable
+
+    def _queue_neighbors(self, swobject: Switch) -> List[str]:
+        """
+        Return the IPs of CDP neighbors of swobject still to discover,
+        marking them as Queued
+        """
+        queued = []
+        seen = set()
+        for _, intdata in swobject.interfaces.items():
+            if hasattr(intdata, "neighbors"):
+                for nei in intdata.neighbors:
+                    if not isinstance(nei, Interface):
+                        self.logger.debug("Evaluating neighbour %s", nei['hostname'])
+                        if nei['ip'] not in seen:
+                            seen.add(nei['ip'])
+                            self.cdp_degree[nei['ip']] = self.cdp_degree.get(nei['ip'], 0) + 1
+                            if self.scheduler is not None and self.discovery_status.get(nei['ip']) == "Queued":
+                                self.scheduler.reprioritize(nei['ip'], self._host_info(nei['ip']))
+
+                        owner = self.identities.owner(cdp_keys(nei['hostname']))
+                        if owner is not None and nei['ip'] not in self.discovery_status:
+                            self.logger.debug("Skipping %s, same device as %s", nei['hostname'], owner)
+                            continue
+
+                        if nei['hostname'] not in self.switches and nei['ip'] not in self.discovery_status:
+                            try:
+                                assert "AIR" not in nei['platform']
+                                assert "CAP" not in nei['platform']
+                                assert "N77" not in nei['platform']
+                                assert "axis" not in nei['hostname']
+                            except AssertionError:
+                                self.logger.debug("Skipping %s, %s", nei['hostname'], nei['platform'])
+                                continue
+
+                            if self.failure_cache.should_skip(nei['ip']):
+                                self.logger.info("Skipping %s, failed before: %s", nei['hostname'],
+                                                 self.failure_cache.get(nei['ip'])['reason'])
+                                self.discovery_status[nei['ip']] = "Skipped"
+                                continue
+
+                            self.logger.info("Queueing discover for %s", nei['hostname'])
+                            self.discovery_status[nei['ip']] = "Queued"
+                            self.neighbor_platforms[nei['ip']] = nei['platform']
+                            self.hops[nei['ip']] = self.hops.get(swobject.hostname, 0) + 1
+                            queued.append(nei['ip'])
+                        else:
+                            self.logger.debug("Skipping %s, already discovered", nei['hostname'])
+
+        return queued
+
+    async def async_init_from_seed_device(self,
+                                          seed_hosts: str,
+                                          credentials: list,
+                                          napalm_optional_args=[None],
+                                          max_in_flight: int = 200,
+                                          parse_threads: int = 4,
+                                          parse_processes: int = 0,
+                                          timeout: float = 30,
+                                          preflight_timeout: float = 1,
+                                          snapshot: Union[str, os.PathLike, dict, None] = None,
+                                          scheduler: Optional[DiscoveryScheduler] = None,
+                                          checkpoint: Union[str, os.PathLike, Checkpoint, None] = None):
+        """
+        Initialise entire fabric from a seed device, with asyncio.
+
+        Same as init_from_seed_device, but up to max_in_flight switches are
+        talked to at the same time from a single thread, and their outputs
+        are parsed by parse_threads threads, or by parse_processes
+        processes if not 0: connections then only collect outputs and are
+        closed before parsing, Switch objects are sent back to this process.
+        napalm_optional_args may set transport ("ssh", the default, needs
+        asyncssh, or "telnet"), port and secret.
+
+        seed_hosts: str              List of IP or hostname of seed devices
+        credentials: list            List of (username, password) tuples to try
+        napalm_optional_args: list   optional_args to try, in order
+        timeout: float               Seconds to wait for every answer of a device
+        preflight_timeout: float     Seconds to wait for the ports of napalm_optional_args
+                                     to answer before logging in, 0 to skip the check
+        snapshot: str or dict        Warm start from a file written by save_snapshot
+        scheduler: DiscoveryScheduler Decides how many switches are in flight, instead
+                                     of max_in_flight
+        checkpoint: str or Checkpoint Write progress to, and resume from, this file
+        """
+        self.scheduler = scheduler if scheduler is not None else DiscoveryScheduler.fixed(max_in_flight)
+
+        if parse_processes:
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=parse_processes)
+        else:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=parse_threads)
+
+        with executor as parse_executor:
+            async def discover(host):
+                optional_args = napalm_optional_args
+                if preflight_timeout:
+                    optional_args = await preflight(host, napalm_optional_args, preflight_timeout)
+
+                return await self.async_add_switch(host,
+                                                   credentials,
+                                                   optional_args,
+                                                   parse_executor=parse_executor,
+                                                   timeout=timeout)
+
+            tasks = {}
+
+            def submit(hosts):
+                for host in hosts:
+                    self.scheduler.push(host, info=self._host_info(host))
+                for ticket in self.scheduler.ready():
+                    tasks[asyncio.ensure_future(discover(ticket.host))] = ticket
+
+            start_hosts = self._start_hosts(seed_hosts, snapshot, checkpoint)
+            for x in start_hosts:
+                self.discovery_status[x] = "Queued"
+
+            self.logger.debug("Adding seed hosts to loop")
+            submit(start_hosts)
+
+            while tasks:
+                self.logger.info("Connecting to switches, %d in flight, %d queued",
+                                 len(tasks), self.scheduler.queued)
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+
+                queued = []
+                for task in done:
+                    ticket = tasks.pop(task)
+                    self.logger.debug("Got data for %s", ticket.host)
+                    try:
+                        swobject = task.result()
+                    except Exception as exc:
+                        queued += self._discovery_done(ticket, None, exc)
+                    else:
+                        queued += self._discovery_done(ticket, swobject)
+
+                submit(queued)
+
+        self._finish_discovery()
+
+    def refresh_global_information(self, full: bool = False, check: bool = False):
         """
         Update global information such as mac address position
         and cdp neighbor adjacency
+
+        Only switches added, replaced or marked dirty since the last refresh
+        are looked at, all of them the first time, if switches were removed
+        or if full is True. check compares the result with what a full
+        refresh would give and raises AssertionError if they differ, for tests
         """
         self.logger.debug("Refreshing information")
-        self._recalculate_macs()
-        self._find_links()
+        dirty = None if full else self._dirty_switches()
+        if dirty is not None:
+            self.logger.debug("Refreshing %d changed switches", len(dirty))
+
+        self._recalculate_macs(dirty)
+        unresolved = self._find_links(dirty)
+        if unresolved:
+            self.logger.info("%d CDP neighbors not joined to a switch, see unresolved_links", len(unresolved))
+
+        for swdata in self.switches.values():
+            if swdata.dirty:
+                swdata.dirty.clear()
+        self._refreshed = {name: (swdata, swdata.mac_table) for name, swdata in self.switches.items()}
 
-    def _find_links(self):
+        if check:
+            errors = self._consistency_errors()
+            if errors:
+                raise AssertionError("Refresh differs from a full one:\n" + "\n".join(errors[:20]))
+
+    def _dirty_switches(self) -> Optional[Dict[str, Optional[Tuple[Switch, Any]]]]:
         """
-        Join switches by CDP neighborship
+        Return {name: (Switch, mac_table) at the last refresh, None if new}
+        of switches to look at again, None if all of them
         """
-        short_fabric = {k[:40]: v for k, v in self.switches.items()}
-        hostname_only_fabric = {v.facts['hostname']: v for k, v in self.switches.items()}
+        if self._refreshed is None or any(x not in self.switches for x in self._refreshed):
+            return None
 
-        for sw, swdata in self.switches.items():
+        dirty = {}
+        for name, swdata in self.switches.items():
+            old = self._refreshed.get(name)
+            if old is None or swdata.dirty or old[0] is not swdata or old[1] is not swdata.mac_table:
+                dirty[name] = old
+        return dirty
+
+    def _link_index(self) -> LinkIndex:
+        """
+        Return switches by normalized name, as CDP neighbors refer to them:
+        their key in switches, or the hostname alone if CDP has no domain.
+        Also the switches with each name of CDP_NAME_LENGTH characters or
+        more by its first CDP_NAME_LENGTH, for Device IDs CDP cut
+        """
+        names = {normalize_hostname(fqdn): swdata for fqdn, swdata in self.switches.items()}
+        for swdata in self.switches.values():
+            try:
+                names.setdefault(normalize_hostname(swdata.facts['hostname']), swdata)
+            except (KeyError, TypeError):
+                continue
+
+        prefixes: Dict[str, List[Switch]] = {}
+        for name, swdata in names.items():
+            if len(name) >= CDP_NAME_LENGTH:
+                found = prefixes.setdefault(name[:CDP_NAME_LENGTH], [])
+                if not any(x is swdata for x in found):
+                    found.append(swdata)
+
+        return names, prefixes
+
+    @staticmethod
+    def _lookup_switch(index: LinkIndex, name: str) -> Tuple[Optional[Switch], Optional[str]]:
+        """
+        Return (switch, None) for the switch with normalized name in index,
+        (None, reason) if there is not exactly one
+        """
+        names, prefixes = index
+        swdata = names.get(name)
+        if swdata is not None:
+            return swdata, None
+
+        # Only a Device ID of exactly CDP_NAME_LENGTH characters may have been cut
+        found = prefixes.get(name, []) if len(name) == CDP_NAME_LENGTH else []
+        if len(found) == 1:
+            return found[0], None
+        return None, "ambiguous switch" if found else "unknown switch"
+
+    def _join_neighbors(self,
+                        index: LinkIndex,
+                        sw: str,
+                        intf: str,
+                        intfdata: Interface,
+                        name: Optional[str] = None) -> List[dict]:
+        """
+        Replace CDP neighbors of intfdata with the Interface they point to,
+        only the ones with normalized hostname name if given. Return the
+        ones that could not be joined
+        """
+        unresolved = []
+        for i, nei in enumerate(intfdata.neighbors):
+            if isinstance(nei, Interface):
+                continue
+
+            nei_name = normalize_hostname(nei['hostname'])
+            if name is not None and nei_name != name:
+                continue
+
+            peer_switch, reason = self._lookup_switch(index, nei_name)
+            if peer_switch is not None:
+                peer_device = peer_switch.interfaces.get(nei['remote_int'])
+                reason = "unknown interface" if peer_device is None else None
+
+            if reason is not None:
+                unresolved.append({'switch': sw,
+                                   'interface': intf,
+                                   'hostname': nei['hostname'],
+                                   'remote_int': nei['remote_int'],
+                                   'reason': reason})
+                continue
+
+            intfdata.neighbors[i] = peer_device
+            if len(peer_device.neighbors) == 0:
+                peer_device.neighbors.append(intfdata)
+            else:
+                peer_device.neighbors[0] = intfdata
+
+        return unresolved
+
+    def _find_links(self, dirty: Optional[dict] = None) -> List[dict]:
+        """
+        Join switches by CDP neighborship, of all switches or only of dirty
+        ones, see _dirty_switches
+
+        Returns the CDP neighbors that could not be joined, as dicts with
+        switch, interface, hostname, remote_int and reason: "unknown switch"
+        if not discovered, "ambiguous switch" if the name CDP cut starts the
+        name of several, "unknown interface" if the switch has no remote_int
+        """
+        index = self._link_index()
+
+        if dirty is None:
+            self._unresolved_by_switch = {}
+            self._unresolved_names = {}
+            rescan = self.switches
+            retry = {}
+        else:
+            rescan = {x: self.switches[x] for x in dirty}
+            # Neighbors of other switches the dirty ones may be
+            retry = {}
+            for name, swdata in rescan.items():
+                names = [normalize_hostname(name)]
+                try:
+                    names.append(normalize_hostname(swdata.facts['hostname']))
+                except (KeyError, TypeError):
+                    pass
+                names += [x[:CDP_NAME_LENGTH] for x in names if len(x) > CDP_NAME_LENGTH]
+                for nei_name in names:
+                    for sw in self._unresolved_names.pop(nei_name, ()):
+                        if sw not in rescan and sw in self.switches:
+                            retry.setdefault(sw, set()).add(nei_name)
+
+        for sw, swdata in rescan.items():
+            unresolved = []
             for intf, intfdata in swdata.interfaces.items():
                 if hasattr(intfdata, "neighbors"):
-                    for i in range(0, len(intfdata.neighbors)):
-                        if isinstance(intfdata.neighbors[i], Interface):
-                            continue
+                    unresolved += self._join_neighbors(index, sw, intf, intfdata)
+            self._set_unresolved(sw, unresolved)
+
+        for sw, names in retry.items():
+            interfaces = self.switches[sw].interfaces
+            unresolved = []
+            # All neighbors with a name on an interface are joined at once
+            done = set()
+            for entry in self._unresolved_by_switch.get(sw, []):
+                nei_name = normalize_hostname(entry['hostname'])
+                if nei_name not in names:
+                    unresolved.append(entry)
+                    continue
+
+                if (entry['interface'], nei_name) in done:
+                    continue
+                done.add((entry['interface'], nei_name))
+
+                intfdata = interfaces.get(entry['interface'])
+                if intfdata is not None:
+                    unresolved += self._join_neighbors(index, sw, entry['interface'], intfdata, nei_name)
+            self._set_unresolved(sw, unresolved)
+
+        self.unresolved_links = [entry for entries in self._unresolved_by_switch.values() for entry in entries]
+        self._topology_version += 1
+        return self.unresolved_links
+
+    def _set_unresolved(self, sw: str, unresolved: List[dict]):
+        if not unresolved:
+            self._unresolved_by_switch.pop(sw, None)
+            return
+
+        self._unresolved_by_switch[sw] = unresolved
+        for entry in unresolved:
+            self._unresolved_names.setdefault(normalize_hostname(entry['hostname']), set()).add(sw)
+
+    def _recalculate_macs(self, dirty: Optional[dict] = None):
+        """
+        Count MACs behind every interface and keep in mac_table the entry of
+        each MAC with the fewest MACs behind its interface, closest to it.
+        Only for MACs of dirty switches if given, see _dirty_switches
+        """
+        if dirty is not None and not self._foreign_macs and not isinstance(self.mac_table, MacTable):
+            if self._recalculate_dirty_macs(dirty):
+                return
 
-                        switch = intfdata.neighbors[i]['hostname']
-                        port = intfdata.neighbors[i]['remote_int']
-
-                        try:
-                            peer_device = self.switches[switch].interfaces[port]
-                            intfdata.neighbors[i] = peer_device
-                            if len(peer_device.neighbors) == 0:
-                                peer_device.neighbors.append(intfdata)
-                            else:
-                                peer_device.neighbors[0] = intfdata
-                            self.logger.debug("Found link between %s %s and %s %s", intfdata.name, intfdata.switch.facts['fqdn'], peer_device.name, peer_device.switch.facts['fqdn'])
-                        except KeyError:
-                            # Hostname over 40 char
-                            try:
-                                peer_device = short_fabric[switch[:40]
-                                                           ].interfaces[port]
-                                self.logger.debug("Found link between %s %s and %s %s", intfdata.name, intfdata.switch.facts['fqdn'], peer_device.name, peer_device.switch.facts['fqdn'])
-                                intfdata.neighbors[i] = peer_device
-                                peer_device.neighbors[0] = intfdata
-                            except KeyError:
-                                try:
-                                    peer_device = hostname_only_fabric[switch].interfaces[port]
-                                    self.logger.debug("Found link between %s %s and %s %s", intfdata.name, intfdata.switch.facts['fqdn'], peer_device.name, peer_device.switch.facts['fqdn'])
-                                    intfdata.neighbors[i] = peer_device
-                                    peer_device.neighbors[0] = intfdata
-                                except KeyError:
-                                    self.logger.debug("Could not find link between %s %s and %s %s", intfdata.name, intfdata.switch.facts['fqdn'], port, switch)
-                                    pass
-
-    def _recalculate_macs(self):
         # Refresh count macs per interface
+        for swname, swdata in self.switches.items():
+            swdata.index_mac_table()
+
+        # Sum the counts, a mac table could point to other switches' interfaces
         for swname, swdata in self.switches.items():
             for intname, intdata in swdata.interfaces.items():
                 intdata.mac_count = 0
-                
-            for _, data in swdata.mac_table.items():
-                try:
-                    data['interface'].mac_count += 1
-                except KeyError:
-                    pass
 
+        self._foreign_macs = False
+        for swname, swdata in self.switches.items():
+            for intdata, count in swdata.mac_counts().items():
+                intdata.mac_count += count
+                if not self._foreign_macs and swdata.interfaces.get(intdata.name) is not intdata:
+                    self._foreign_macs = True
+
+        if isinstance(self.mac_table, MacTable):
+            tables = [self.mac_table] + [x.mac_table for x in self.switches.values()]
+            self.mac_table = MacTable.closest(tables)
+            return
 
         for swname, swdata in self.switches.items():
             for mac, macdata in swdata.mac_table.items():
@@ -231,42 +1123,159 @@ class Fabric():
                 except KeyError:
                     self.mac_table[mac] = macdata
 
-    def find_paths(self, start_sw, end_sw):
+    def _recalculate_dirty_macs(self, dirty: dict) -> bool:
         """
-        Return a list of all interfaces from 'start' Switch to 'end' Switch
+        _recalculate_macs for the MACs of dirty switches, old and new.
+        Return False if it can't be done without a full recalculation
+        """
+        changed = [self.switches[x] for x in dirty]
+        interfaces = set()
+        for swdata, old in zip(changed, dirty.values()):
+            interfaces.update(swdata.interfaces.values())
+            if old is not None:
+                interfaces.update(old[0].interfaces.values())
+        # Before they change
+        counts = {x: x.mac_count for x in interfaces}
+
+        for swdata in changed:
+            swdata.index_mac_table()
+            for intdata in swdata.mac_index:
+                if swdata.interfaces.get(intdata.name) is not intdata:
+                    return False
+
+        # Closest entry of every MAC among changed switches
+        best = {}
+        for swdata in changed:
+            for mac, macdata in swdata.mac_table.items():
+                other = best.get(mac)
+                if other is None or other['interface'].mac_count > macdata['interface'].mac_count:
+                    best[mac] = macdata
+
+        # MACs they do not see anymore
+        gone = []
+        for swdata, old in zip(changed, dirty.values()):
+            if old is not None and old[1] is not swdata.mac_table:
+                gone.extend(mac for mac in old[1] if mac not in best)
+
+        clean = [x for name, x in self.switches.items() if name not in dirty]
+
+        def update(mac, candidate):
+            current = self.mac_table.get(mac)
+            if current is not None:
+                intdata = current['interface']
+                if intdata not in counts:
+                    # Other switches did not change, none has it closer than before
+                    if candidate is None or candidate['interface'].mac_count >= intdata.mac_count:
+                        return
+                elif candidate is None or candidate['interface'].mac_count > counts[intdata]:
+                    # It was on a changed switch and got further, look at the others too
+                    for swdata in clean:
+                        macdata = swdata.mac_table.get(mac)
+                        if macdata is not None and (candidate is None or
+                                                    candidate['interface'].mac_count > macdata['interface'].mac_count):
+                            candidate = macdata
+
+            if candidate is None:
+                self.mac_table.pop(mac, None)
+            else:
+                self.mac_table[mac] = candidate
+
+        for mac, macdata in best.items():
+            update(mac, macdata)
+        for mac in gone:
+            update(mac, None)
+
+        return True
+
+    def _consistency_errors(self) -> List[str]:
+        "Return how MAC counts, mac_table and links differ from a full refresh"
+        errors = []
+
+        counts: Dict[Interface, int] = {}
+        best: Dict[Any, int] = {}
+        for swdata in self.switches.values():
+            for mac, macdata in swdata.mac_table.items():
+                intdata = macdata['interface']
+                counts[intdata] = counts.get(intdata, 0) + 1
+        for swdata in self.switches.values():
+            for intname, intdata in swdata.interfaces.items():
+                if intdata.mac_count != counts.get(intdata, 0):
+                    errors.append(f"{intname} of {swdata.hostname}: mac_count {intdata.mac_count}, "
+                                  f"expected {counts.get(intdata, 0)}")
+            for mac, macdata in swdata.mac_table.items():
+                count = counts.get(macdata['interface'], 0)
+                best[mac] = min(best.get(mac, count), count)
+
+        for mac, count in best.items():
+            macdata = self.mac_table.get(mac)
+            if macdata is None or counts.get(macdata['interface'], 0) != count:
+                errors.append(f"{mac}: not on an interface with {count} MACs")
+
+        index = self._link_index()
+        unresolved = set()
+        for sw, swdata in self.switches.items():
+            for intf, intfdata in swdata.interfaces.items():
+                for nei in getattr(intfdata, "neighbors", ()):
+                    if isinstance(nei, Interface):
+                        continue
+                    peer_switch, _ = self._lookup_switch(index, normalize_hostname(nei['hostname']))
+                    if peer_switch is not None and nei['remote_int'] in peer_switch.interfaces:
+                        errors.append(f"{intf} of {sw}: {nei['hostname']} {nei['remote_int']} not joined")
+                    unresolved.add((sw, intf, nei['hostname'], nei['remote_int']))
+
+        reported = {(x['switch'], x['interface'], x['hostname'], x['remote_int']) for x in self.unresolved_links}
+        for entry in unresolved - reported:
+            errors.append(f"{entry} not in unresolved_links")
+
+        return errors
+
+    @property
+    def topology(self) -> Topology:
+        "Topology of the current links, built again after every refresh"
+        if self._topology is None or self._topology_built != self._topology_version:
+            self._topology = Topology(self.switches.values())
+            self._topology_built = self._topology_version
+        return self._topology
+
+    @property
+    def path_engine(self) -> PathEngine:
+        "PathEngine of the current links, built again after every refresh"
+        if self._path_engine is None or self._path_engine_version != self._topology_version:
+            self._path_engine = PathEngine(self.topology)
+            self._path_engine_version = self._topology_version
+        return self._path_engine
+
+    def find_paths(self, start_sw: Switch, end_sw: List[Switch]) -> List[List[Interface]]:
+        """
+        Return a list of all paths from 'start' Switch to 'end' Switch, each
+        a list of interfaces, see PathEngine
 
         start_sw: Switch
         end_sw: list[Switch]
         """
-        def _inside_recursive(start_int, end_sw, path = []):
-            switch = start_int.neighbors[0].switch
-            path = path + [start_int.neighbors[0]]
-            if switch in end_sw:
-                return [path]
-            paths = []
-            for _, intdata in switch.interfaces.items():
-                if hasattr(intdata, 'neighbors'):
-                    if len(intdata.neighbors) == 1:
-                        if type(intdata.neighbors[0]) == Interface:
-                            neigh_int = intdata.neighbors[0]
-                            if type(neigh_int) == Interface:
-                                if intdata not in path:
-                                    this_path = path + [intdata]
-                                    newpaths = _inside_recursive(intdata, end_sw, this_path)
-                                    for newpath in newpaths:
-                                        paths.append(newpath)
-
-            return paths
-
-
-        all_possible_paths = []
-        for intname, intdata in start_sw.interfaces.items():
-            if hasattr(intdata, 'neighbors'):
-                if len(intdata.neighbors) == 1:
-                    if type(intdata.neighbors[0]) == Interface:
-                        assert len(end_sw) > 0
-                        thispath = _inside_recursive(intdata, end_sw, path=[intdata])
-                        for path in thispath:
-                            all_possible_paths.append(path)
-        
-        return all_possible_paths
+        if not end_sw:
+            raise ValueError("No end switch given")
+        return list(self.path_engine.paths(start_sw, end_sw))
+
+    def iter_paths(self,
+                   start_sw: Switch,
+                   end_sw: List[Switch],
+                   max_hops: Optional[int] = None,
+                   limit: Optional[int] = None,
+                   timeout: Optional[float] = None) -> Iterator[List[Interface]]:
+        """
+        Yield paths from start_sw to end_sw like find_paths, as they are found
+
+        max_hops: int        Skip paths longer than this many links
+        limit: int           Stop after this many paths
+        timeout: float       Stop after this many seconds
+        """
+        return self.path_engine.paths(start_sw, end_sw, max_hops, limit, timeout)
+
+    def shortest_path(self, start_sw: Switch, end_sw: List[Switch]) -> Optional[List[Interface]]:
+        "Return a path from start_sw to end_sw with the fewest hops, None if there is none"
+        return self.path_engine.shortest_path(start_sw, end_sw)
+
+    def k_shortest_paths(self, start_sw: Switch, end_sw: List[Switch], k: int) -> List[List[Interface]]:
+        "Return up to k paths from start_sw to end_sw, fewest hops first"
+        return self.path_engine.k_shortest_paths(start_sw, end_sw, k)
@@ -0,0 +1,153 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"Define FailureCache object"
+
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+
+class FailureCache():
+    """
+    Remember hosts discovery could not get to, and when to try them again
+
+    After n failures in a row a host is skipped for
+    min(backoff * 2 ** (n - 1), max_backoff) seconds. Hosts that did not
+    fail for ttl seconds are forgotten, a success forgets them at once.
+    Times are seconds since the epoch, backoff is computed with the current
+    settings so changing them applies to hosts already in the cache.
+
+    If path is given the cache is loaded from it, and written by save()
+    """
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 backoff: float = 3600,
+                 max_backoff: float = 7 * 86400,
+                 ttl: float = 30 * 86400):
+        self.path = path
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.ttl = ttl
+        # Hosts not queued because of the cache
+        self.skipped = 0
+        self._hosts: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+        if path is not None and os.path.isfile(path):
+            self.load(path)
+
+    def __len__(self) -> int:
+        return len(self._hosts)
+
+    def __getstate__(self):
+        # Locks can't be pickled
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __contains__(self, host: str) -> bool:
+        return host in self._hosts
+
+    def get(self, host: str) -> Optional[dict]:
+        """
+        Return a copy of what is known about host: failures, reason,
+        first_failure, last_failure and retry_after. None if nothing
+        """
+        with self._lock:
+            entry = self._hosts.get(host)
+            if entry is None:
+                return None
+            return dict(entry, retry_after=self._retry_after(entry))
+
+    def _retry_after(self, entry: dict) -> float:
+        return entry['last_failure'] + min(self.backoff * 2 ** (entry['failures'] - 1), self.max_backoff)
+
+    def record_failure(self, host: str, reason: str, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._hosts.get(host)
+            if entry is None or now - entry['last_failure'] > self.ttl:
+                entry = self._hosts[host] = {'failures': 0, 'first_failure': now}
+
+            entry['failures'] += 1
+            entry['reason'] = reason
+            entry['last_failure'] = now
+
+    def record_success(self, host: str):
+        with self._lock:
+            self._hosts.pop(host, None)
+
+    def should_skip(self, host: str, now: Optional[float] = None) -> bool:
+        "Return True if host failed and its backoff did not expire yet"
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._hosts.get(host)
+            if entry is None:
+                return False
+
+            if now - entry['last_failure'] > self.ttl:
+                del self._hosts[host]
+                return False
+
+            if now < self._retry_after(entry):
+                self.skipped += 1
+                return True
+
+            return False
+
+    def expire(self, now: Optional[float] = None):
+        "Forget hosts that did not fail for ttl seconds"
+        now = time.time() if now is None else now
+        with self._lock:
+            self._hosts = {host: entry for host, entry in self._hosts.items()
+                           if now - entry['last_failure'] <= self.ttl}
+
+    def clear(self):
+        with self._lock:
+            self._hosts = {}
+            self.skipped = 0
+
+    def load(self, path: str):
+        with open(path, 'r') as cachefile:
+            data = json.load(cachefile)
+
+        with self._lock:
+            self._hosts = data.get('hosts', {})
+
+    def save(self, path: Optional[str] = None):
+        "Write the cache to path, or the one given at creation. Does nothing without either"
+        path = path or self.path
+        if path is None:
+            return
+
+        self.expire()
+        with self._lock:
+            data = json.dumps({'version': 1, 'hosts': self._hosts}, sort_keys=True, indent=1)
+
+        temp = path + ".tmp"
+        with open(temp, 'w') as cachefile:
+            cachefile.write(data)
+        os.replace(temp, path)
@@ -0,0 +1,193 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"Define IdentityIndex object"
+
+import re
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from netaddr import EUI, AddrFormatError
+
+# CDP truncates Device IDs to 40 characters on many IOS releases
+CDP_NAME_LENGTH = 40
+
+# Nexus and some others advertise hostname(SERIAL)
+_CDP_SERIAL_RE = re.compile(r"^(.+)\((\w+)\)$")
+_SERIAL_RE = re.compile(r"^Processor board ID (\S+)", re.M)
+_CHASSIS_MAC_RE = re.compile(r"^Base [Ee]thernet MAC [Aa]ddress\s*:\s*(\S+)", re.M)
+
+# Keys that identify a device on their own
+_STRONG_KEYS = ("serial:", "mac:")
+
+
+class DuplicateSwitch(Exception):
+    "Device was already discovered through another address"
+
+    def __init__(self, host: str, owner: str, key: str):
+        super().__init__(f"{host} is the same device as {owner} ({key})")
+        self.host = host
+        self.owner = owner
+        self.key = key
+
+
+def normalize_hostname(name: str) -> str:
+    "Lower case, without (SERIAL)"
+    if name.endswith(")"):
+        match = _CDP_SERIAL_RE.match(name)
+        if match:
+            name = match.group(1)
+    return name.strip().lower()
+
+
+def identity_keys(hostname: Optional[str] = None,
+                  serial: Optional[str] = None,
+                  chassis_mac: Optional[str] = None) -> List[str]:
+    "Return the keys identifying a device, from what is known about it"
+    keys = []
+    if serial and serial.lower() not in ("unknown", "none"):
+        keys.append("serial:" + serial.upper())
+
+    if chassis_mac:
+        try:
+            keys.append("mac:" + str(EUI(chassis_mac)))
+        except AddrFormatError:
+            pass
+
+    if hostname and hostname != "Unknown":
+        name = normalize_hostname(hostname)
+        keys.append("name:" + name)
+        # What CDP would advertise if it cut the name
+        if len(name) >= CDP_NAME_LENGTH:
+            keys.append("prefix:" + name[:CDP_NAME_LENGTH])
+
+    return keys
+
+
+def cdp_keys(device_id: str) -> List[str]:
+    """
+    Return the keys of a CDP neighbor, from its Device ID. A Device ID of
+    CDP_NAME_LENGTH characters without serial may have been cut, it also
+    matches the longer names starting with it
+    """
+    match = _CDP_SERIAL_RE.match(device_id)
+    keys = identity_keys(hostname=device_id, serial=match.group(2) if match else None)
+    if match or len(device_id.strip()) != CDP_NAME_LENGTH:
+        keys = [x for x in keys if not x.startswith("prefix:")]
+    return keys
+
+
+def show_version_keys(show_version: str) -> List[str]:
+    """
+    Return serial number and chassis MAC keys found in show version.
+    The hostname is left out, show version has no domain
+    """
+    serial = _SERIAL_RE.search(show_version)
+    mac = _CHASSIS_MAC_RE.search(show_version)
+    return identity_keys(serial=serial.group(1) if serial else None,
+                         chassis_mac=mac.group(1) if mac else None)
+
+
+def facts_keys(facts: dict) -> List[str]:
+    "Return the keys of NAPALM get_facts output"
+    fqdn = facts.get('fqdn', "Unknown").replace(".not set", "")
+    if fqdn == "Unknown":
+        fqdn = facts.get('hostname')
+    return identity_keys(hostname=fqdn, serial=facts.get('serial_number'))
+
+
+class IdentityIndex():
+    """
+    Map identity keys of devices to the host they are being discovered on
+
+    claim() is called as soon as something is known about the device, the
+    first host to claim a key owns it and the next ones are duplicates.
+    Serial numbers and chassis MACs decide: a name only matches a host if
+    one of the two has neither, and the name prefix of a cut CDP Device ID
+    only if a single host has it.
+    Can be shared between threads
+    """
+
+    def __init__(self):
+        # None for prefixes of several hosts
+        self._owners: Dict[str, Optional[str]] = {}
+        # Serial and MAC keys of every host
+        self._strong: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._owners)
+
+    def __getstate__(self):
+        # Locks can't be pickled
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._owners
+
+    def _match(self, host: Optional[str], keys: List[str]) -> Optional[Tuple[str, str]]:
+        "Return (owner, key) of the first of keys identifying another host than host, None if none does"
+        strong = {x for x in keys if x.startswith(_STRONG_KEYS)}
+        for key in keys:
+            owner = self._owners.get(key)
+            if owner is None or owner == host:
+                continue
+            if key.startswith(_STRONG_KEYS):
+                return owner, key
+            # A name is no match for a device with another serial or MAC
+            if strong and self._strong.get(owner):
+                continue
+            return owner, key
+        return None
+
+    def owner(self, keys: List[str]) -> Optional[str]:
+        "Return the host owning keys, None if none is known"
+        with self._lock:
+            match = self._match(None, keys)
+        return match[0] if match is not None else None
+
+    def claim(self, host: str, keys: List[str]):
+        "Record keys as host's, raise DuplicateSwitch if they identify another host"
+        # Prefixes only stand for names CDP cut, full names tell hosts apart
+        with self._lock:
+            match = self._match(host, [x for x in keys if not x.startswith("prefix:")])
+            if match is not None:
+                raise DuplicateSwitch(host, *match)
+
+            for key in keys:
+                if key.startswith(_STRONG_KEYS):
+                    self._strong.setdefault(host, set()).add(key)
+                if self._owners.setdefault(key, host) != host:
+                    self._owners[key] = None
+
+    def release(self, host: str):
+        "Forget the keys of host, i.e. if its discovery failed"
+        with self._lock:
+            self._owners = {key: owner for key, owner in self._owners.items() if owner != host}
+            self._strong.pop(host, None)
+
+    def clear(self):
+        with self._lock:
+            self._owners = {}
+            self._strong = {}
@@ -19,11 +19,80 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 "Define Interface object"
 
 from datetime import datetime
+import copy
 import logging
 import re
+import sys
 import ipaddress
 
-from typing import List, Optional, Any
+from typing import List, Optional, Union, TYPE_CHECKING
+
+from .vlanset import VlanSet
+
+if TYPE_CHECKING:
+    from .switch import Switch
+
+
+_INTERFACE_RE = re.compile(r"^interface ([A-Za-z\-]*(\/*\d*)+)")
+_MODE_RE = re.compile(r"switchport mode (.*)$")
+
+# Interface configuration rules, in order of precedence.
+# (handler method, compiled regex or plain substring, depends on port mode)
+_DESCRIPTION = ('_parse_description', re.compile(r"description (.*)$"), False)
+_CHANNEL_GROUP = ('_parse_channel_group', re.compile(r"channel-group (\d*) mode (\w*)"), False)
+_ACCESS_VLAN = ('_parse_access_vlan', re.compile(r"switchport access vlan (.*)$"), True)
+_VOICE_VLAN = ('_parse_voice_vlan', re.compile(r"switchport voice vlan (.*)$"), True)
+_TRUNK_NATIVE_VLAN = ('_parse_trunk_native_vlan', re.compile(r"switchport trunk native vlan (.*)$"), True)
+_ALLOWED_VLAN = ('_parse_allowed_vlan', re.compile(r"switchport trunk allowed vlan ([0-9\-\,]*)$"), True)
+_ALLOWED_VLAN_ADD = ('_parse_allowed_vlan_add', re.compile(r"switchport trunk allowed vlan add ([0-9\-\,]*)$"), True)
+_PORTFAST = ('_parse_portfast', "spanning-tree portfast", True)
+_BPDUGUARD = ('_parse_bpduguard', "spanning-tree bpduguard", False)
+_NO_SHUTDOWN = ('_parse_no_shutdown', "no shutdown", False)
+_SHUTDOWN = ('_parse_shutdown', "shutdown", False)
+_ENCAPSULATION = ('_parse_encapsulation', "switchport trunk encapsulation", False)
+_VRF = ('_parse_vrf', re.compile(r'vrf forwarding (.*)'), False)
+_IPV4 = ('_parse_ipv4', re.compile(r'ip address (\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}) (\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\s?(secondary)?'), False)
+_HSRP = ('_parse_hsrp', re.compile(r"standby (\d{1,3})?\s?(ip|priority|preempt|version)\s?(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}|\d*)?\s?(secondary)?"), False)
+
+_ALL_RULES = (_DESCRIPTION, _CHANNEL_GROUP, _ACCESS_VLAN, _VOICE_VLAN,
+              _TRUNK_NATIVE_VLAN, _ALLOWED_VLAN, _ALLOWED_VLAN_ADD, _PORTFAST,
+              _BPDUGUARD, _NO_SHUTDOWN, _SHUTDOWN, _ENCAPSULATION, _VRF,
+              _IPV4, _HSRP)
+
+
+def _candidates(*kinds):
+    """
+    Rules to try for lines starting with a given word, in order of precedence.
+    Shutdown is matched anywhere in the line so it is always a candidate
+    """
+    handlers = ['_parse_' + x for x in kinds + ('no_shutdown', 'shutdown')]
+    return tuple(rule for rule in _ALL_RULES if rule[0] in handlers)
+
+
+# Candidate rules by first word of the line
+_DISPATCH = {
+    'description': _candidates('description'),
+    'channel-group': _candidates('channel_group'),
+    'switchport': _candidates('access_vlan', 'voice_vlan', 'trunk_native_vlan',
+                              'allowed_vlan', 'allowed_vlan_add', 'encapsulation'),
+    'spanning-tree': _candidates('portfast', 'bpduguard'),
+    'shutdown': _candidates(),
+    'vrf': _candidates('vrf'),
+    'ip': _candidates('vrf', 'ipv4'),
+    'standby': _candidates('hsrp'),
+}
+
+# Lines starting with any other word only need the full rule list if
+# they contain one of the keywords somewhere
+_KEYWORD_FILTER = re.compile(
+    r"description |channel-group |switchport |spanning-tree |shutdown|vrf forwarding |ip address |standby")
+
+# Mutable attributes, and how to copy them
+_CONTAINERS = {'address': copy.deepcopy,
+               'allowed_vlan': VlanSet.copy,
+               'unparsed_lines': list.copy,
+               'neighbors': list.copy,
+               'child_interfaces': list.copy}
 
 
 class Interface():
@@ -33,216 +102,357 @@ class Interface():
     an array containing each line of the interface configuration
     """
 
+    # Attributes not passed to __init__ take their value from _DEFAULTS the
+    # first time they are read, containers in _LAZY are only created when
+    # used. __dict__ is only allocated if someone attaches extra attributes.
+    __slots__ = ('name', 'description', 'address', 'vrf', 'mode',
+                 'channel_group', 'channel_protocol', 'allowed_vlan',
+                 'native_vlan', 'voice_vlan', 'switch', 'parent_interface',
+                 'is_up', 'is_enabled', 'config', 'unparsed_lines',
+                 'mac_count', 'type_edge', 'bpduguard', 'routed_port',
+                 'neighbors', 'last_in', 'last_out', 'last_clearing',
+                 'counters', 'device', 'speed', 'child_interfaces', '__dict__')
+
+    _DEFAULTS = {'name': None,
+                 'description': "",
+                 'vrf': "default",
+                 'mode': 'access',
+                 'channel_group': None,
+                 'channel_protocol': None,
+                 'allowed_vlan': None,
+                 'native_vlan': 1,
+                 'voice_vlan': None,
+                 'switch': None,
+                 'parent_interface': None,
+                 'is_up': True,
+                 'is_enabled': True,
+                 'config': None,
+                 'mac_count': 0,
+                 'type_edge': False,
+                 'bpduguard': False,
+                 'routed_port': False,
+                 'last_in': None,
+                 'last_out': None,
+                 'last_clearing': None,
+                 'counters': None,
+                 'device': None,
+                 'speed': None}
+
+    _LAZY = {'address': dict,
+             'unparsed_lines': list,
+             'neighbors': list,
+             'child_interfaces': list}
+
+    logger = logging.getLogger(__name__)
+
+    name: Optional[str]
+    description: Optional[str]
+    address: dict
+    vrf: str
+    mode: str
+    channel_group: Optional[int]
+    channel_protocol: Optional[str]
+    allowed_vlan: Optional[VlanSet]
+    native_vlan: int
+    voice_vlan: Optional[int]
+    switch: Optional['Switch']
+    parent_interface: Optional['Interface']
+    is_up: bool
+    is_enabled: bool
+    config: Optional[List[str]]
+    unparsed_lines: List[str]
+    mac_count: int
+    type_edge: bool
+    bpduguard: bool
+    routed_port: bool
+    neighbors: List[Union['Interface', dict]]
+    last_in: Optional[datetime]
+    last_out: Optional[datetime]
+    last_clearing: Optional[datetime]
+    counters: Optional[dict]
+    device: Optional['Switch']
+    speed: Optional[int]
+    child_interfaces: List['Interface']
+
     def __init__(self, **kwargs):
-        from netwalk.switch import Switch
-        self.logger = logging.getLogger(__name__)
-        self.name: str = kwargs.get('name', None)
-        self.description: Optional[str] = kwargs.get('description', "")
-        self.address: dict = kwargs.get('address', {})
-        self.vrf: str = kwargs.get('vrf', "default")
-        self.mode: str = kwargs.get('mode', 'access')
-        self.channel_group: Optional[int] = kwargs.get('channel_group', None)
-        self.channel_protocol: Optional[str] = kwargs.get(
-            'channel_protocol', None)
-        self.allowed_vlan: set = kwargs.get('allowed_vlan', None)
-        self.native_vlan: int = kwargs.get('native_vlan', 1)
-        self.voice_vlan: Optional[int] = kwargs.get('voice_vlan', None)
-        self.switch: Optional[Switch] = kwargs.get('switch', None)
-        self.parent_interface: Optional[Interface] = kwargs.get('parent_interface', None)
-        self.is_up: bool = kwargs.get('is_up', True)
-        self.is_enabled: bool = kwargs.get('is_enabled', True)
-        self.config: List[str] = kwargs.get('config', None)
-        self.unparsed_lines: List[str] = kwargs.get('unparsed_lines', [])
-        self.mac_count: int = 0
-        self.type_edge: bool = kwargs.get('type_edge', False)
-        self.bpduguard: bool = kwargs.get('bpduguard', False)
-        self.routed_port: bool = kwargs.get('routed_port', False)
-        self.neighbors: List[Any[Interface, dict]] = kwargs.get('neighbors', [])
-        self.last_in: Optional[datetime] = kwargs.get('last_in', None)
-        self.last_out: Optional[datetime] = kwargs.get('last_out', None)
-        self.last_clearing: Optional[datetime] = kwargs.get('last_clearing', None)
-        self.counters: Optional[dict] = kwargs.get('counters', None)
-        self.device: Optional[Switch] = kwargs.get('switch', None)
-        self.speed: Optional[int] = kwargs.get('speed', None)
-
-        if self.config is not None:
+        for key, value in kwargs.items():
+            if key in self._DEFAULTS or key in self._LAZY:
+                setattr(self, key, value)
+
+        # mac_count is always calculated, device is a synonym of switch
+        self.mac_count = 0
+        if 'switch' in kwargs:
+            self.device = kwargs['switch']
+
+        if 'allowed_vlan' in kwargs and self.allowed_vlan is not None \
+                and not isinstance(self.allowed_vlan, VlanSet):
+            self.allowed_vlan = VlanSet(self.allowed_vlan)
+
+        if 'config' in kwargs and self.config is not None:
             self.parse_config()
 
-    def parse_config(self):
-        "Parse configuration from show run"
-        if isinstance(self.config, str):
-            self.config = self.config.split("\n")
-        
-        # Parse port mode first. Some switches have it first, some last, so check it first thing
-        for line in self.config:
-            cleanline = line.strip()
-            match = re.search(r"switchport mode (.*)$", cleanline)
-            if match is not None:
-                self.mode = match.groups()[0].strip()
-                if self.mode == 'trunk' and self.allowed_vlan is None:
-                    self.allowed_vlan = set([x for x in range(1, 4095)])
-                continue
+    def __getattr__(self, name):
+        # Only called for slots not assigned yet
+        try:
+            value = self._DEFAULTS[name]
+        except KeyError:
+            try:
+                value = self._LAZY[name]()
+            except KeyError:
+                raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'") from None
 
-        for line in self.config:
-            cleanline = line.strip()
-            
-            # L2 data
-            # Find interface name
-            match = re.search(r"^interface ([A-Za-z\-]*(\/*\d*)+)", cleanline)
-            if match is not None:
-                self.name = match.groups()[0]
-                if "vlan" in self.name.lower():
-                    self.routed_port = True
-                    self.mode = 'access'
-                    self.native_vlan = int(self.name.lower().replace("vlan",""))
-                continue
+        setattr(self, name, value)
+        return value
 
-            # Port mode. Already parsed, skip and do not add to unparsed lines
-            match = re.search(r"switchport mode (.*)$", cleanline)
-            if match is not None:
+    def __setstate__(self, state):
+        """
+        Restore a pickled Interface: (__dict__, slots) as pickled now, or
+        the plain __dict__ of Interfaces pickled before they had slots
+        """
+        if isinstance(state, tuple):
+            dictstate, slotstate = state
+            state = dict(dictstate or {})
+            state.update(slotstate or {})
+
+        for attr, value in state.items():
+            # Old pickles carry their own logger, the class one does
+            if attr == 'logger':
                 continue
+            setattr(self, attr, value)
 
-            # Find description
-            match = re.search(r"description (.*)$", cleanline)
-            if match is not None:
-                self.description = match.groups()[0]
-                continue
+        allowed_vlan = state.get('allowed_vlan')
+        if allowed_vlan is not None and not isinstance(allowed_vlan, VlanSet):
+            self.allowed_vlan = VlanSet(allowed_vlan)
 
-            # Find port-channel properties
-            match = re.search(r"channel-group (\d*) mode (\w*)", cleanline)
-            if match is not None:
-                self.channel_group = int(match.groups()[0])
-                self.channel_protocol = match.groups()[1]
+    def _state(self) -> tuple:
+        "Attributes assigned so far, as (name, value) tuples"
+        state = []
+        for attr in self.__slots__:
+            if attr == '__dict__':
                 continue
-
-            # Native vlan
-            match = re.search(r"switchport access vlan (.*)$", cleanline)
-            if match is not None and self.mode != 'trunk':
-                self.native_vlan = int(match.groups()[0])
+            try:
+                state.append((attr, object.__getattribute__(self, attr)))
+            except AttributeError:
                 continue
+        return tuple(state)
 
-            # Voice native vlan
-            match = re.search(r"switchport voice vlan (.*)$", cleanline)
-            if match is not None and self.mode == 'access':
-                self.voice_vlan = int(match.groups()[0])
-                continue
+    @classmethod
+    def _from_state(cls, state: tuple, **kwargs) -> 'Interface':
+        """
+        Build an Interface from _state() output with its own containers,
+        overriding attributes with kwargs
+        """
+        interface = cls.__new__(cls)
+        for attr, value in state:
+            if attr in _CONTAINERS and value is not None:
+                value = _CONTAINERS[attr](value) if value else type(value)()
+            setattr(interface, attr, value)
 
-            # Trunk native vlan
-            match = re.search(r"switchport trunk native vlan (.*)$", cleanline)
-            if match is not None and self.mode == 'trunk':
-                self.native_vlan = int(match.groups()[0])
-                continue
+        for key, value in kwargs.items():
+            setattr(interface, key, value)
 
-            # Trunk allowed vlan
-            match = re.search(
-                r"switchport trunk allowed vlan ([0-9\-\,]*)$", cleanline)
-            if match is not None:
-                self.allowed_vlan = self._allowed_vlan_to_list(
-                    match.groups()[0])
-                continue
+        return interface
 
-            # Trunk allowed vlan add
-            match = re.search(
-                r"switchport trunk allowed vlan add ([0-9\-\,]*)$", cleanline)
-            if match is not None:
-                new_vlans = self._allowed_vlan_to_list(match.groups()[0])
-                self.allowed_vlan.update(list(new_vlans))
-                continue
+    def parse_config(self):
+        """
+        Parse configuration from show run
 
-            # Portfast
-            match = re.search(
-                r"spanning-tree portfast", cleanline)
-            if match is not None:
-                if "trunk" in cleanline and self.mode == "trunk":
-                    self.type_edge = True
-                elif "trunk" not in cleanline and self.mode == "access":
-                    self.type_edge = True
-                
-                continue
+        Every line is classified once: the first word selects the candidate
+        rules from _DISPATCH, in the same precedence order as the original
+        regex chain. Lines whose meaning depends on the port mode are kept
+        aside and resolved once the whole block has been read, so the mode
+        can appear anywhere in the block without a second pass.
+        """
+        if isinstance(self.config, str):
+            self.config = self.config.split("\n")
 
-            match = re.search(
-                r"spanning-tree bpduguard", cleanline)
-            if match is not None:
-                self.bpduguard = True
-                continue
+        # Unparsed lines and mode-dependent lines, in config order
+        pending = []
+        is_svi = False
 
-            if "no shutdown" in line:
-                self.is_enabled = True
-                continue
-            elif "shutdown" in line:
-                self.is_enabled = False
+        for line in self.config:
+            cleanline = line.strip()
+            if cleanline == '' or cleanline == '!':
                 continue
 
-            # Legacy syntax, ignore
-            if "switchport trunk encapsulation" in line:
+            if cleanline.startswith("interface "):
+                match = _INTERFACE_RE.search(cleanline)
+                self.name = match.groups()[0]
+                if "vlan" in self.name.lower():
+                    is_svi = True
+                    self.routed_port = True
+                    self.mode = 'access'
+                    self.native_vlan = int(self.name.lower().replace("vlan", ""))
                 continue
 
-            # L3 parsing
-            # Parse VRF
-            match = re.search(
-                r'vrf forwarding (.*)', cleanline)
-            if match is not None:
-                self.vrf = match.groups()[0]
+            # Port mode can be anywhere in the block, apply it straight away
+            if "switchport mode " in cleanline:
+                match = _MODE_RE.search(cleanline)
+                self.mode = match.groups()[0].strip()
+                if self.mode == 'trunk' and self.allowed_vlan is None:
+                    self.allowed_vlan = VlanSet.all()
                 continue
 
-            # Parse 'normal' ipv4 address
-            match = re.search(
-                r'ip address (\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}) (\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\s?(secondary)?', cleanline)
-            if match is not None:
-                address, netmask, secondary = match.groups()
-                addrobj = ipaddress.ip_interface(f"{address}/{netmask}")
-
-                addr_type = 'primary' if secondary is None else 'secondary'
-
-                try:
-                    assert 'ipv4' in self.address
-                except AssertionError:
-                    self.address['ipv4'] = {}
-                
-                self.address['ipv4'][addrobj] = {'type': addr_type}
-                self.routed_port = True
-                continue
+            keyword = cleanline.split(None, 1)[0]
+            rules = _DISPATCH.get(keyword)
+            if rules is None:
+                if _KEYWORD_FILTER.search(cleanline) is None:
+                    pending.append(cleanline)
+                    continue
+                rules = _ALL_RULES
 
-            # Parse HSRP addresses
-            match = re.search(
-                r"standby (\d{1,3})?\s?(ip|priority|preempt|version)\s?(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}|\d*)?\s?(secondary)?", cleanline)
-            if match is not None:
-                grpid, command, argument, secondary = match.groups()
-                if grpid is None:
-                    grpid = 0
-                else:
-                    grpid = int(grpid)
+            self._apply_rules(cleanline, rules, pending)
 
-                try:
-                    assert 'hsrp' in self.address
-                except AssertionError:
-                    self.address['hsrp'] = {'version': 1, 'groups': {}}
+        # SVIs are always access ports, no matter what the block says
+        if is_svi:
+            self.mode = 'access'
 
-                if command == 'version':
-                    self.address['hsrp']['version'] = int(argument)
+        for item in pending:
+            if isinstance(item, str):
+                # The same lines repeat on most ports, keep one copy
+                self.unparsed_lines.append(sys.intern(item))
+            else:
+                cleanline, rules = item
+                self._apply_rules(cleanline, rules)
+
+    def _apply_rules(self, cleanline: str, rules: tuple, pending: list = None):
+        """
+        Apply the first matching rule to a line, falling back to unparsed.
+
+        If pending is given, rules depending on the port mode are not applied
+        but appended to it together with the remaining candidates
+        """
+        for index, rule in enumerate(rules):
+            handler, pattern, mode_dependent = rule
+            if pattern.__class__ is str:
+                if pattern not in cleanline:
+                    continue
+                match = None
+            else:
+                match = pattern.search(cleanline)
+                if match is None:
                     continue
 
-                try:
-                    assert grpid in self.address['hsrp']['groups']
-                except AssertionError:
-                    self.address['hsrp']['groups'][grpid] = {'priority': 100, 'preempt': False, 'secondary': []}
-
-                if command == 'ip':
-                    if secondary is not None:
-                        self.address['hsrp']['groups'][grpid]['secondary'].append(ipaddress.ip_address(argument))
-                    else:
-                        self.address['hsrp']['groups'][grpid]['address'] = ipaddress.ip_address(argument)
-                elif command == 'priority':
-                    self.address['hsrp']['groups'][grpid]['priority'] = int(argument)
-                elif command == 'preempt':
-                    self.address['hsrp']['groups'][grpid]['preempt'] = True
-                continue
+            if mode_dependent and pending is not None:
+                pending.append((cleanline, rules[index:]))
+                return
+
+            if getattr(self, handler)(match, cleanline):
+                return
+
+        if pending is not None:
+            pending.append(cleanline)
+        else:
+            self.unparsed_lines.append(sys.intern(cleanline))
+
+    # Line handlers. Return False if the line does not apply to this
+    # interface and the next candidate rule should be tried.
+
+    def _parse_description(self, match, cleanline):
+        self.description = match.groups()[0]
+        return True
+
+    def _parse_channel_group(self, match, cleanline):
+        self.channel_group = int(match.groups()[0])
+        self.channel_protocol = match.groups()[1]
+        return True
+
+    def _parse_access_vlan(self, match, cleanline):
+        if self.mode == 'trunk':
+            return False
+        self.native_vlan = int(match.groups()[0])
+        return True
+
+    def _parse_voice_vlan(self, match, cleanline):
+        if self.mode != 'access':
+            return False
+        self.voice_vlan = int(match.groups()[0])
+        return True
+
+    def _parse_trunk_native_vlan(self, match, cleanline):
+        if self.mode != 'trunk':
+            return False
+        self.native_vlan = int(match.groups()[0])
+        return True
+
+    def _parse_allowed_vlan(self, match, cleanline):
+        self.allowed_vlan = self._allowed_vlan_to_list(match.groups()[0])
+        return True
+
+    def _parse_allowed_vlan_add(self, match, cleanline):
+        new_vlans = self._allowed_vlan_to_list(match.groups()[0])
+        self.allowed_vlan.update(new_vlans)
+        return True
+
+    def _parse_portfast(self, match, cleanline):
+        if "trunk" in cleanline and self.mode == "trunk":
+            self.type_edge = True
+        elif "trunk" not in cleanline and self.mode == "access":
+            self.type_edge = True
+        return True
+
+    def _parse_bpduguard(self, match, cleanline):
+        self.bpduguard = True
+        return True
+
+    def _parse_no_shutdown(self, match, cleanline):
+        self.is_enabled = True
+        return True
+
+    def _parse_shutdown(self, match, cleanline):
+        self.is_enabled = False
+        return True
+
+    def _parse_encapsulation(self, match, cleanline):
+        # Legacy syntax, ignore
+        return True
+
+    def _parse_vrf(self, match, cleanline):
+        self.vrf = match.groups()[0]
+        return True
+
+    def _parse_ipv4(self, match, cleanline):
+        address, netmask, secondary = match.groups()
+        addrobj = ipaddress.ip_interface(f"{address}/{netmask}")
+
+        addr_type = 'primary' if secondary is None else 'secondary'
+
+        if 'ipv4' not in self.address:
+            self.address['ipv4'] = {}
+
+        self.address['ipv4'][addrobj] = {'type': addr_type}
+        self.routed_port = True
+        return True
+
+    def _parse_hsrp(self, match, cleanline):
+        grpid, command, argument, secondary = match.groups()
+        if grpid is None:
+            grpid = 0
+        else:
+            grpid = int(grpid)
 
-            if cleanline != '' and cleanline != '!':
-                self.unparsed_lines.append(cleanline)
+        if 'hsrp' not in self.address:
+            self.address['hsrp'] = {'version': 1, 'groups': {}}
 
+        if command == 'version':
+            self.address['hsrp']['version'] = int(argument)
+            return True
 
-    def _allowed_vlan_to_list(self, vlanlist: str) -> set:
+        if grpid not in self.address['hsrp']['groups']:
+            self.address['hsrp']['groups'][grpid] = {'priority': 100, 'preempt': False, 'secondary': []}
+
+        if command == 'ip':
+            if secondary is not None:
+                self.address['hsrp']['groups'][grpid]['secondary'].append(ipaddress.ip_address(argument))
+            else:
+                self.address['hsrp']['groups'][grpid]['address'] = ipaddress.ip_address(argument)
+        elif command == 'priority':
+            self.address['hsrp']['groups'][grpid]['priority'] = int(argument)
+        elif command == 'preempt':
+            self.address['hsrp']['groups'][grpid]['preempt'] = True
+        return True
+
+    def _allowed_vlan_to_list(self, vlanlist: str) -> VlanSet:
         """
         Expands vlan ranges
 
@@ -250,19 +460,10 @@ class Interface():
           - vlanlist (str): String of vlans from config, i.e. 1,2,3-5
 
         Returns:
-          - set
+          - VlanSet
         """
 
-        split = vlanlist.split(",")
-        out = set()
-        for vlan in split:
-            if "-" in vlan:
-                begin, end = vlan.split("-")
-                out.update(range(int(begin), int(end)+1))
-            else:
-                out.add(int(vlan))
-
-        return out
+        return VlanSet.from_string(vlanlist)
 
     def __str__(self) -> str:
         if self.name is None:
@@ -284,9 +485,7 @@ class Interface():
                 if self.allowed_vlan is None:
                     fullconfig = fullconfig + " switchport trunk allowed vlan all\n"
                 elif len(self.allowed_vlan) != 4094:
-                    sorted_allowed_vlan = list(self.allowed_vlan)
-                    sorted_allowed_vlan.sort()
-                    vlan_str = ",".join(map(str, sorted_allowed_vlan))
+                    vlan_str = str(VlanSet(self.allowed_vlan))
                     fullconfig = fullconfig + f" switchport trunk allowed vlan {vlan_str}\n"
                 else:
                     fullconfig = fullconfig + " switchport trunk allowed vlan all\n"
@@ -0,0 +1,216 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"Define LoginCache object"
+
+import hashlib
+import ipaddress
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# (username, password), optional_args
+Method = Tuple[Tuple[str, str], Optional[dict]]
+
+# optional_args left out of method keys
+SECRET_ARGS = ('secret', 'password')
+
+
+class LoginCache():
+    """
+    Remember which credentials and optional_args logged in to which device
+
+    Successes are counted by exact host, by CDP platform and by subnet of
+    the host. order() puts first the method that worked on the same host,
+    then the ones that worked most on the same platform, then in the same
+    subnet, keeping the given order otherwise.
+
+    Methods are keyed by username, the position of the credential among
+    the ones with the same username and optional_args without their
+    secrets, nothing derived from passwords is kept. Give order() and
+    record() the same credentials list to tell apart credentials with the
+    same username.
+    If path is given the cache is loaded from it, and written by save()
+    """
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 ipv4_prefixlen: int = 24,
+                 ipv6_prefixlen: int = 64):
+        self.path = path
+        self.ipv4_prefixlen = ipv4_prefixlen
+        self.ipv6_prefixlen = ipv6_prefixlen
+        # Successful logins at the first attempt, with a learned method
+        self.hits = 0
+        # Learned method failed, another one worked
+        self.misses = 0
+        # Nothing learned for the host, its platform or subnet
+        self.cold = 0
+        # Logins that failed before one worked
+        self.failed_attempts = 0
+        self._scopes: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+        if path is not None and os.path.isfile(path):
+            self.load(path)
+
+    def __len__(self) -> int:
+        return len(self._scopes)
+
+    def __getstate__(self):
+        # Locks can't be pickled
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'cold': self.cold,
+                'failed_attempts': self.failed_attempts}
+
+    @staticmethod
+    def method_id(method: Method, credentials: Optional[List[Tuple[str, str]]] = None) -> str:
+        """
+        Return the key of a (credential, optional_args) pair from its
+        username, its position among the credentials with the same username
+        and optional_args without secrets
+        """
+        cred, optional_args = method
+        same_user = [tuple(x) for x in credentials or [] if x[0] == cred[0]]
+        position = same_user.index(tuple(cred)) if tuple(cred) in same_user else 0
+        args = {k: v for k, v in (optional_args or {}).items() if k not in SECRET_ARGS}
+        data = json.dumps([cred[0], position, args], sort_keys=True, default=str)
+        return hashlib.blake2b(data.encode(), digest_size=8).hexdigest()
+
+    def _subnet(self, host: str) -> Optional[str]:
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return None
+
+        prefixlen = self.ipv4_prefixlen if address.version == 4 else self.ipv6_prefixlen
+        return str(ipaddress.ip_network(f"{address}/{prefixlen}", strict=False))
+
+    def _scope_keys(self, host: str, platform: Optional[str]) -> List[str]:
+        "Return scope keys for host, most specific first"
+        keys = ["host:" + host]
+        if platform:
+            keys.append("platform:" + platform)
+        subnet = self._subnet(host)
+        if subnet is not None:
+            keys.append("subnet:" + subnet)
+        return keys
+
+    def order(self,
+              host: str,
+              methods: List[Method],
+              platform: Optional[str] = None,
+              credentials: Optional[List[Tuple[str, str]]] = None) -> List[Method]:
+        "Return methods, made of credentials, in the order to try them on host"
+        with self._lock:
+            scopes = [self._scopes.get(x, {}) for x in self._scope_keys(host, platform)]
+
+        if not any(scopes):
+            return list(methods)
+
+        def score(method):
+            key = self.method_id(method, credentials)
+            return tuple(-x.get(key, 0) for x in scopes)
+
+        return sorted(methods, key=score)
+
+    def record(self,
+               host: str,
+               method: Method,
+               attempt: int,
+               platform: Optional[str] = None,
+               credentials: Optional[List[Tuple[str, str]]] = None):
+        """
+        Record that method logged in to host, after attempt failed ones, in
+        the order given by order() with the same credentials
+        """
+        key = self.method_id(method, credentials)
+        scope_keys = self._scope_keys(host, platform)
+
+        with self._lock:
+            if not any(self._scopes.get(x) for x in scope_keys):
+                self.cold += 1
+            elif attempt == 0:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.failed_attempts += attempt
+
+            # Only the last method counts for the host itself
+            self._scopes[scope_keys[0]] = {key: 1}
+            for scope_key in scope_keys[1:]:
+                counts = self._scopes.setdefault(scope_key, {})
+                counts[key] = counts.get(key, 0) + 1
+
+    def host_method(self, host: str) -> Optional[str]:
+        "Return the key of the last method that logged in to host, None if unknown"
+        with self._lock:
+            methods = self._scopes.get("host:" + host)
+        return next(iter(methods)) if methods else None
+
+    def set_host_method(self, host: str, key: str):
+        "Make method key, from method_id(), the first to try on host"
+        with self._lock:
+            self._scopes["host:" + host] = {key: 1}
+
+    def record_failure(self, attempts: int):
+        "Record that none of attempts methods logged in"
+        with self._lock:
+            self.failed_attempts += attempts
+
+    def clear(self):
+        with self._lock:
+            self._scopes = {}
+            self.hits = self.misses = self.cold = self.failed_attempts = 0
+
+    def load(self, path: str):
+        with open(path, 'r') as cachefile:
+            data = json.load(cachefile)
+
+        with self._lock:
+            # Keys of older versions hashed passwords, they can't match any method
+            if data.get('version') == 3:
+                self._scopes = data.get('scopes', {})
+            else:
+                self._scopes = {}
+
+    def save(self, path: Optional[str] = None):
+        "Write the cache to path, or the one given at creation. Does nothing without either"
+        path = path or self.path
+        if path is None:
+            return
+
+        with self._lock:
+            data = json.dumps({'version': 3, 'scopes': self._scopes}, sort_keys=True)
+
+        temp = path + ".tmp"
+        with open(temp, 'w') as cachefile:
+            cachefile.write(data)
+        os.replace(temp, path)
@@ -0,0 +1,344 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"Define MacTable object"
+
+from collections.abc import ItemsView, Mapping, MutableMapping, ValuesView
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+from netaddr import EUI
+
+from .vlanset import VlanSet
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Interface id of deleted rows
+_DELETED = -1
+
+
+class _MacTableItems(ItemsView):
+    def __iter__(self):
+        return self._mapping._iter_items()
+
+
+class _MacTableValues(ValuesView):
+    def __iter__(self):
+        for _, value in self._mapping._iter_items():
+            yield value
+
+
+class MacTable(MutableMapping):
+    """
+    MAC address table stored in columns
+
+    Keeps MACs, VLANs and interfaces in three numpy arrays instead of a dict
+    per MAC, and behaves like the dict of {EUI: {'interface': Interface,
+    'vlan': int}} it replaces. Values are built on access: assign them back
+    to change an entry. Other keys in the values are not kept.
+
+    Requires numpy
+    """
+
+    def __init__(self, entries: Optional[Mapping] = None):
+        if np is None:
+            raise ImportError("MacTable requires numpy, install netwalk[numpy]")
+
+        self._macs = np.zeros(0, dtype=np.uint64)
+        self._vlans = np.zeros(0, dtype=np.uint16)
+        self._ints = np.zeros(0, dtype=np.int32)
+        self._size = 0  # Rows used, deleted ones included
+        self._count = 0  # Live rows
+        self._interfaces: list = []
+        self._interface_ids: dict = {}
+        # Rows below _sorted_size are found by binary search on _sorted_macs,
+        # later ones through _tail
+        self._sorted = np.zeros(0, dtype=np.intp)
+        self._sorted_macs = np.zeros(0, dtype=np.uint64)
+        self._sorted_size = 0
+        self._tail: Dict[int, int] = {}
+
+        if entries is not None:
+            self.update(entries)
+
+    @staticmethod
+    def _key(mac: Union[EUI, int, str]) -> int:
+        if isinstance(mac, int):
+            return mac
+        if isinstance(mac, EUI):
+            return int(mac)
+        return int(EUI(mac))
+
+    def _interface_id(self, interface) -> int:
+        try:
+            return self._interface_ids[interface]
+        except KeyError:
+            self._interface_ids[interface] = len(self._interfaces)
+            self._interfaces.append(interface)
+            return self._interface_ids[interface]
+
+    def _find(self, key: int) -> int:
+        "Return the row of key, deleted or not, -1 if missing"
+        try:
+            return self._tail[key]
+        except KeyError:
+            pass
+
+        if self._sorted_size:
+            pos = int(np.searchsorted(self._sorted_macs, key))
+            if pos < self._sorted_size and self._sorted_macs[pos] == key:
+                return int(self._sorted[pos])
+
+        return -1
+
+    def _grow(self, needed: int):
+        capacity = max(1024, len(self._macs))
+        while capacity < needed:
+            capacity *= 2
+
+        if capacity != len(self._macs):
+            for name in ('_macs', '_vlans', '_ints'):
+                old = getattr(self, name)
+                new = np.zeros(capacity, dtype=old.dtype)
+                new[:self._size] = old[:self._size]
+                setattr(self, name, new)
+
+    def _reindex(self):
+        "Drop deleted rows and sort all rows by MAC"
+        live = np.flatnonzero(self._ints[:self._size] != _DELETED)
+        if len(live) != self._size:
+            for name in ('_macs', '_vlans', '_ints'):
+                column = getattr(self, name)
+                column[:len(live)] = column[live]
+            self._size = len(live)
+
+        self._sorted = np.argsort(self._macs[:self._size], kind='stable')
+        self._sorted_macs = self._macs[:self._size][self._sorted]
+        self._sorted_size = self._size
+        self._tail = {}
+
+    def _entry(self, row: int) -> dict:
+        entry = {}
+        interface = self._interfaces[self._ints[row]]
+        if interface is not None:
+            entry['interface'] = interface
+        vlan = int(self._vlans[row])
+        if vlan != 0:
+            entry['vlan'] = vlan
+        return entry
+
+    def __getitem__(self, mac) -> dict:
+        row = self._find(self._key(mac))
+        if row < 0 or self._ints[row] == _DELETED:
+            raise KeyError(mac)
+        return self._entry(row)
+
+    def __setitem__(self, mac, value: dict):
+        key = self._key(mac)
+        row = self._find(key)
+        if row < 0:
+            if len(self._tail) > max(4096, self._sorted_size // 4):
+                self._reindex()
+            self._grow(self._size + 1)
+            row = self._size
+            self._size += 1
+            self._macs[row] = key
+            self._tail[key] = row
+            self._count += 1
+        elif self._ints[row] == _DELETED:
+            self._count += 1
+
+        self._vlans[row] = value.get('vlan') or 0
+        self._ints[row] = self._interface_id(value.get('interface'))
+
+    def __delitem__(self, mac):
+        row = self._find(self._key(mac))
+        if row < 0 or self._ints[row] == _DELETED:
+            raise KeyError(mac)
+        self._ints[row] = _DELETED
+        self._count -= 1
+
+    def __contains__(self, mac) -> bool:
+        try:
+            row = self._find(self._key(mac))
+        except Exception:
+            return False
+        return row >= 0 and self._ints[row] != _DELETED
+
+    def _live_rows(self):
+        return np.flatnonzero(self._ints[:self._size] != _DELETED)
+
+    def __iter__(self) -> Iterator[EUI]:
+        for row in self._live_rows():
+            yield EUI(int(self._macs[row]))
+
+    def _iter_items(self):
+        for row in self._live_rows():
+            yield EUI(int(self._macs[row])), self._entry(row)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def items(self):
+        return _MacTableItems(self)
+
+    def values(self):
+        return _MacTableValues(self)
+
+    def update(self, other=(), **kwargs):
+        "Like dict.update, loads a Mapping in one go if the table is empty"
+        if self._size == 0 and isinstance(other, Mapping) and not kwargs:
+            self._load(other)
+        else:
+            super().update(other, **kwargs)
+
+    def _load(self, entries: Mapping):
+        count = len(entries)
+        self._grow(count)
+        if count == 0:
+            return
+
+        macs = np.fromiter((self._key(x) for x in entries.keys()), dtype=np.uint64, count=count)
+        self._macs[:count] = macs
+        self._vlans[:count] = np.fromiter((x.get('vlan') or 0 for x in entries.values()),
+                                          dtype=np.uint16, count=count)
+        self._ints[:count] = np.fromiter((self._interface_id(x.get('interface')) for x in entries.values()),
+                                         dtype=np.int32, count=count)
+        self._size = count
+        self._count = count
+        # Keys of a mapping are unique, unless given as both int and EUI
+        self._reindex()
+        if len(np.unique(self._sorted_macs)) != count:
+            raise ValueError("Duplicate MAC addresses")
+
+    def clear(self):
+        self.__init__()
+
+    def columns(self):
+        """
+        Return the live rows as three arrays: MACs as uint64, VLANs as
+        uint16 (0 if unknown), interface ids as int32, to be looked up in
+        interfaces()
+        """
+        rows = self._live_rows()
+        return self._macs[rows], self._vlans[rows], self._ints[rows]
+
+    def interfaces(self) -> list:
+        "Return the interfaces referenced by the id column"
+        return list(self._interfaces)
+
+    def counts(self) -> Dict[object, int]:
+        "Return the number of MACs on each interface"
+        ints = self._ints[:self._size]
+        counts = np.bincount(ints[ints != _DELETED], minlength=len(self._interfaces))
+        return {interface: int(count)
+                for interface, count in zip(self._interfaces, counts)
+                if count and interface is not None}
+
+    def by_interface(self) -> Dict[object, List[EUI]]:
+        "Return the MACs learned on each interface"
+        rows = self._live_rows()
+        ints = self._ints[rows]
+        order = np.argsort(ints, kind='stable')
+        bounds = np.flatnonzero(np.diff(ints[order])) + 1
+
+        out = {}
+        for group in np.split(rows[order], bounds):
+            if len(group) == 0:
+                continue
+            interface = self._interfaces[self._ints[group[0]]]
+            if interface is not None:
+                out[interface] = [EUI(int(x)) for x in self._macs[group]]
+
+        return out
+
+    def vlans_by_interface(self) -> Dict[object, VlanSet]:
+        "Return the VLANs of the MACs learned on each interface"
+        _, vlans, ints = self.columns()
+        pairs = np.unique(ints.astype(np.int64) << 12 | vlans)
+
+        out: Dict[object, VlanSet] = {}
+        for pair in pairs.tolist():
+            vlan = pair & 0xfff
+            interface = self._interfaces[pair >> 12]
+            if vlan == 0 or interface is None:
+                continue
+            try:
+                out[interface].add(vlan)
+            except KeyError:
+                out[interface] = VlanSet([vlan])
+
+        return out
+
+    @classmethod
+    def closest(cls, tables: Iterable[Mapping]) -> 'MacTable':
+        """
+        Merge tables keeping, for each MAC, the entry whose interface has the
+        lowest mac_count. On ties the entry found first wins
+        """
+        interfaces: list = []
+        interface_ids: dict = {}
+        macs, vlans, ints = [], [], []
+
+        for table in tables:
+            if not isinstance(table, MacTable):
+                table = MacTable(table)
+            table_macs, table_vlans, table_ints = table.columns()
+
+            remap = np.zeros(len(table._interfaces), dtype=np.int32)
+            for local_id, interface in enumerate(table._interfaces):
+                try:
+                    remap[local_id] = interface_ids[interface]
+                except KeyError:
+                    remap[local_id] = interface_ids[interface] = len(interfaces)
+                    interfaces.append(interface)
+
+            macs.append(table_macs)
+            vlans.append(table_vlans)
+            ints.append(remap[table_ints])
+
+        out = cls()
+        if not interfaces:
+            return out
+
+        macs = np.concatenate(macs)
+        vlans = np.concatenate(vlans)
+        ints = np.concatenate(ints)
+
+        # Entries without an interface lose against any other
+        mac_counts = np.array([getattr(x, 'mac_count', 0) if x is not None else np.iinfo(np.int64).max
+                               for x in interfaces], dtype=np.int64)
+        row_counts = mac_counts[ints]
+
+        # Sort by MAC, then count, then position and keep the first of each MAC
+        order = np.lexsort((np.arange(len(macs)), row_counts, macs))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = macs[order][1:] != macs[order][:-1]
+        best = np.sort(order[first])
+
+        out._grow(len(best))
+        out._macs[:len(best)] = macs[best]
+        out._vlans[:len(best)] = vlans[best]
+        out._ints[:len(best)] = ints[best]
+        out._size = out._count = len(best)
+        out._interfaces = interfaces
+        out._interface_ids = interface_ids
+        out._reindex()
+        return out
@@ -0,0 +1,108 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"Define ParseCache object"
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Union
+
+from .interface import Interface, _INTERFACE_RE
+
+
+class ParseCache():
+    """
+    Cache of parsed interface configurations
+
+    Interfaces with the same configuration, apart from their name, are only
+    parsed once: following ones are copied from the first and renamed.
+    Keeps at most maxsize configurations, dropping the least recently used.
+    Can be shared between switches and threads.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._templates: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def __getstate__(self):
+        # Parsed templates are easy to rebuild, locks can't be pickled
+        return {'maxsize': self.maxsize}
+
+    def __setstate__(self, state):
+        self.__init__(state['maxsize'])
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def interface(self, config: Union[str, List[str]]) -> Interface:
+        """
+        Return an Interface parsed from config, reusing a previous parse of
+        an identical configuration if available
+        """
+        if isinstance(config, str):
+            config = config.split("\n")
+
+        # The interface line is usually the first
+        first = 0 if config and config[0].startswith("interface ") else None
+        if first is None:
+            for index, line in enumerate(config):
+                if line.strip().startswith("interface "):
+                    first = index
+                    break
+            else:
+                return Interface(config=config)
+
+        name = _INTERFACE_RE.search(config[first].strip()).groups()[0]
+
+        # SVI attributes depend on the name, do not share them
+        if "vlan" in name.lower():
+            return Interface(config=config)
+
+        body = "\n".join(config[:first] + config[first + 1:])
+        key = hashlib.blake2b(body.encode(), digest_size=16).digest()
+
+        with self._lock:
+            state = self._templates.get(key)
+            if state is not None:
+                self._templates.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if state is not None:
+            return Interface._from_state(state, name=name, config=config)
+
+        interface = Interface(config=config)
+        state = tuple(x for x in interface._state() if x[0] not in ('name', 'config'))
+
+        with self._lock:
+            self._templates[key] = state
+            if len(self._templates) > self.maxsize:
+                self._templates.popitem(last=False)
+
+        return interface
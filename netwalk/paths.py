@@ -0,0 +1,265 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"Define PathEngine object"
+
+import heapq
+import itertools
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import TYPE_CHECKING, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .interface import Interface
+from .topology import Topology
+
+if TYPE_CHECKING:
+    from .switch import Switch
+
+# Local interface, interface on the other side, switch on the other side
+Link = Tuple[Interface, Interface, 'Switch']
+
+
+class PathEngine():
+    """
+    Paths between switches joined by CDP, see Fabric.refresh_global_information
+
+    A path is a list of interfaces: the one leaving the start switch, the
+    one it arrives on, the one leaving that switch and so on, ending on an
+    interface of one of the end switches. Paths never go through the same
+    switch twice and stop at the first end switch reached. Only interfaces
+    with a single neighbor are followed, like find_paths always did.
+    Links of Port-channel members are one link between the Port-channels,
+    unless given a Topology built without collapse_lags.
+
+    Results are kept for up to maxsize (start, ends) queries, build a new
+    engine when links change: Fabric.path_engine does
+    """
+
+    def __init__(self, switches: Union[Iterable['Switch'], Topology], maxsize: int = 1024):
+        """
+        switches: list      Switches to find paths between, or their Topology
+        maxsize: int        Queries to keep results of
+        """
+        self.logger = logging.getLogger(__name__)
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._links: Dict['Switch', List[Link]] = {}
+        self._reverse: Dict['Switch', List['Switch']] = {}
+        self._cache: OrderedDict = OrderedDict()
+
+        topology = switches if isinstance(switches, Topology) else Topology(switches)
+        for switch in topology.switches:
+            links = self._links[switch] = list(topology.links(switch))
+            for _, _, peer in links:
+                self._reverse.setdefault(peer, []).append(switch)
+
+    def __len__(self) -> int:
+        return len(self._links)
+
+    @property
+    def links(self) -> int:
+        return sum(len(x) for x in self._links.values())
+
+    def _cached(self, key):
+        try:
+            value = self._cache[key]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        self._cache.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def _store(self, key, value):
+        self._cache[key] = value
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def _distances(self, ends: FrozenSet['Switch']) -> Dict['Switch', int]:
+        "Return the fewest hops from every switch to ends"
+        key = ('distances', ends)
+        distances = self._cached(key)
+        if distances is not None:
+            return distances
+
+        distances = {x: 0 for x in ends}
+        queue = deque(ends)
+        while queue:
+            switch = queue.popleft()
+            for previous in self._reverse.get(switch, ()):
+                if previous not in distances:
+                    distances[previous] = distances[switch] + 1
+                    queue.append(previous)
+
+        self._store(key, distances)
+        return distances
+
+    def _bfs(self,
+             start: 'Switch',
+             ends: FrozenSet['Switch'],
+             banned_switches: Iterable['Switch'] = (),
+             banned_links: Iterable[Interface] = ()) -> Optional[List[Link]]:
+        "Return the links of a shortest path from start to ends, None if there is none"
+        parents: Dict['Switch', Optional[Link]] = {start: None}
+        parents.update((x, None) for x in banned_switches)
+        banned_links = set(banned_links)
+        queue = deque([start])
+
+        while queue:
+            switch = queue.popleft()
+            for link in self._links.get(switch, ()):
+                peer = link[2]
+                if peer in parents or link[0] in banned_links:
+                    continue
+                parents[peer] = (switch, link)
+                if peer in ends:
+                    path = []
+                    while peer is not start:
+                        peer, link = parents[peer]
+                        path.append(link)
+                    path.reverse()
+                    return path
+                queue.append(peer)
+
+        return None
+
+    @staticmethod
+    def _interfaces(links: Iterable[Link]) -> List[Interface]:
+        path = []
+        for local, remote, _ in links:
+            path.append(local)
+            path.append(remote)
+        return path
+
+    def shortest_path(self, start: 'Switch', ends: Iterable['Switch']) -> Optional[List[Interface]]:
+        "Return a path from start to ends with the fewest hops, None if there is none"
+        paths = self.k_shortest_paths(start, ends, 1)
+        return paths[0] if paths else None
+
+    def k_shortest_paths(self, start: 'Switch', ends: Iterable['Switch'], k: int) -> List[List[Interface]]:
+        """
+        Return up to k paths from start to ends, fewest hops first, with
+        Yen's algorithm: parallel links give different paths
+        """
+        ends = frozenset(ends)
+        key = ('k_shortest', start, ends)
+        found = self._cached(key)
+        if found is not None and (len(found[0]) >= k or found[1]):
+            return [self._interfaces(x) for x in found[0][:k]]
+
+        paths: List[List[Link]] = []
+        shortest = self._bfs(start, ends)
+        if shortest is not None:
+            paths.append(shortest)
+
+        candidates: list = []
+        seen = {tuple(x[0] for x in shortest)} if shortest is not None else set()
+        counter = itertools.count()
+        while paths and len(paths) < k:
+            previous = paths[-1]
+            for spur in range(len(previous)):
+                root = previous[:spur]
+                spur_switch = previous[spur - 1][2] if spur else start
+                banned_links = [path[spur][0] for path in paths
+                                if len(path) > spur and path[:spur] == root]
+                banned_switches = [start] + [x[2] for x in root[:-1]] if spur else []
+
+                tail = self._bfs(spur_switch, ends, banned_switches, banned_links)
+                if tail is None:
+                    continue
+                path = root + tail
+                signature = tuple(x[0] for x in path)
+                if signature not in seen:
+                    seen.add(signature)
+                    heapq.heappush(candidates, (len(path), next(counter), path))
+
+            if not candidates:
+                break
+            paths.append(heapq.heappop(candidates)[2])
+
+        self._store(key, (paths, len(paths) < k))
+        return [self._interfaces(x) for x in paths]
+
+    def paths(self,
+              start: 'Switch',
+              ends: Iterable['Switch'],
+              max_hops: Optional[int] = None,
+              limit: Optional[int] = None,
+              timeout: Optional[float] = None) -> Iterator[List[Interface]]:
+        """
+        Yield all paths from start to ends, depth first in the order of the
+        interfaces of each switch
+
+        max_hops: int        Skip paths longer than this many links
+        limit: int           Stop after this many paths
+        timeout: float       Stop after this many seconds
+        """
+        ends = frozenset(ends)
+        key = ('paths', start, ends, max_hops)
+        found = self._cached(key)
+        if found is not None:
+            for path in found[:limit]:
+                yield list(path)
+            return
+
+        distances = self._distances(ends)
+        if start not in self._links or not any(x[2] in distances for x in self._links[start]):
+            self._store(key, [])
+            return
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        found = []
+        visited = {start}
+        path: List[Interface] = []
+        # Switches in path and iterators over their links
+        stack = [(start, iter(self._links[start]))]
+        steps = 0
+
+        while stack:
+            steps += 1
+            if deadline is not None and steps % 1024 == 0 and time.monotonic() > deadline:
+                self.logger.info("Path search from %s stopped after %d paths, timed out",
+                                 start.hostname, len(found))
+                return
+
+            for local, remote, peer in stack[-1][1]:
+                if peer in visited:
+                    continue
+                hops = len(stack) + distances.get(peer, len(self._links))
+                if peer not in distances or (max_hops is not None and hops > max_hops):
+                    continue
+
+                if peer in ends:
+                    found.append((*path, local, remote))
+                    yield list(found[-1])
+                    if limit is not None and len(found) >= limit:
+                        return
+                    continue
+
+                visited.add(peer)
+                path += [local, remote]
+                stack.append((peer, iter(self._links.get(peer, ()))))
+                break
+            else:
+                visited.discard(stack.pop()[0])
+                del path[-2:]
+
+        self._store(key, found)
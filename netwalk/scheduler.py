@@ -0,0 +1,291 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"Define DiscoveryScheduler object"
+
+import asyncio
+import concurrent.futures
+import heapq
+import ipaddress
+import itertools
+import logging
+import re
+import socket
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from netmiko.ssh_exception import NetMikoAuthenticationException, NetMikoTimeoutException
+
+from .asynccli import AuthenticationError
+
+# asyncio and concurrent.futures have their own TimeoutError before Python 3.11
+_TIMEOUTS = (TimeoutError, asyncio.TimeoutError, concurrent.futures.TimeoutError,
+             socket.timeout, NetMikoTimeoutException)
+_AUTH_FAILURES = (AuthenticationError, NetMikoAuthenticationException)
+
+
+class Ticket(NamedTuple):
+    "A host started by the scheduler, to give back to done()"
+    host: str
+    group: str
+    epoch: int
+    payload: Any
+    started: float
+
+
+class HostInfo(NamedTuple):
+    "What discovery knows about a host before logging in, for priority functions"
+    host: str
+    platform: Optional[str] = None  # From CDP
+    hops: int = 0  # From the seeds
+    degree: int = 0  # Switches seen so far with it as CDP neighbor
+    collect_time: Optional[float] = None  # Seconds it took last time
+
+
+def by_platform(weights: Dict[str, float]) -> Callable[[HostInfo], float]:
+    """
+    Return a priority function scoring hosts by CDP platform, with the
+    weight of the first regex in weights found in it, 0 if none
+    """
+    patterns = [(re.compile(x), y) for x, y in weights.items()]
+
+    def priority(info: HostInfo) -> float:
+        for pattern, weight in patterns:
+            if info.platform and pattern.search(info.platform):
+                return weight
+        return 0
+    return priority
+
+
+def longest_first(info: HostInfo) -> float:
+    "Start the switches that took longest last time first"
+    return info.collect_time or 0
+
+
+def closest_first(info: HostInfo) -> float:
+    "Start the switches closest to the seeds first"
+    return -info.hops
+
+
+def most_connected(info: HostInfo) -> float:
+    "Start the switches most neighbors point to first"
+    return info.degree
+
+
+def combine(*weighted: Tuple[float, Callable[[HostInfo], float]]) -> Callable[[HostInfo], float]:
+    "Return a priority function summing (weight, priority function) pairs"
+    def priority(info: HostInfo) -> float:
+        return sum(weight * function(info) for weight, function in weighted)
+    return priority
+
+
+def subnet_of(host: str, ipv4_prefixlen: int = 24, ipv6_prefixlen: int = 64) -> str:
+    "Return the subnet of host, or host itself if not an IP address"
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return host
+
+    prefixlen = ipv4_prefixlen if address.version == 4 else ipv6_prefixlen
+    return str(ipaddress.ip_network(f"{address}/{prefixlen}", strict=False))
+
+
+def congestion(exc: Optional[BaseException]) -> Optional[str]:
+    """
+    Return "timeout" or "auth" if exc, or what caused it, tells the
+    devices or the AAA servers behind them are overloaded, None otherwise
+    """
+    seen = 0
+    while exc is not None and seen < 8:
+        if isinstance(exc, _TIMEOUTS):
+            return "timeout"
+        if isinstance(exc, _AUTH_FAILURES):
+            return "auth"
+        exc = exc.__cause__ or exc.__context__
+        seen += 1
+
+    return None
+
+
+class DiscoveryScheduler():
+    """
+    Queue of hosts to discover, and how many to talk to at the same time
+
+    The limit follows AIMD: every successful switch adds 1 / limit, so about
+    one per round of switches, up to maximum. A timeout, a login failure or
+    a login slower than latency_target seconds multiplies it by decrease,
+    down to minimum, once per round: switches started before the last
+    decrease do not decrease it again.
+
+    group_limit caps the switches in flight in each group, the subnet of the
+    host by default or what group_of returns, i.e. a site name.
+
+    Queued hosts start in order of priority(HostInfo), highest first, then
+    in the order they were queued. Without priority the queue is FIFO.
+    Not thread safe, use it from the thread running the discovery loop
+    """
+
+    def __init__(self,
+                 initial: int = 10,
+                 minimum: int = 1,
+                 maximum: int = 100,
+                 latency_target: Optional[float] = 10,
+                 decrease: float = 0.5,
+                 group_limit: Optional[int] = None,
+                 group_of: Optional[Callable[[str], str]] = None,
+                 priority: Optional[Callable[[HostInfo], float]] = None):
+        if not minimum <= initial <= maximum:
+            raise ValueError("initial must be between minimum and maximum")
+
+        self.logger = logging.getLogger(__name__)
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.decrease = decrease
+        self.group_limit = group_limit
+        self.group_of = group_of if group_of is not None else subnet_of
+        self.priority = priority
+        self.in_flight = 0
+        self.increases = 0
+        self.decreases = 0
+        # [-score, sequence, host or None if stale, payload, info]
+        self._heap: List[list] = []
+        self._entries: Dict[str, list] = {}
+        self._sequence = itertools.count()
+        self._groups: Dict[str, int] = {}
+        self._epoch = 0
+
+    @classmethod
+    def fixed(cls, limit: int, **kwargs) -> 'DiscoveryScheduler':
+        "Return a scheduler always running limit hosts at a time"
+        return cls(initial=limit, minimum=limit, maximum=limit, latency_target=None, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def queued(self) -> int:
+        return len(self._entries)
+
+    @property
+    def stats(self) -> dict:
+        return {'limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'queued': len(self._entries),
+                'increases': self.increases,
+                'decreases': self.decreases,
+                'groups': {x: y for x, y in self._groups.items() if y}}
+
+    def _score(self, info: Optional[HostInfo]) -> float:
+        if self.priority is None or info is None:
+            return 0
+        return self.priority(info)
+
+    def push(self, host: str, payload: Any = None, info: Optional[HostInfo] = None):
+        """
+        Queue host, payload is given back in its Ticket, info is scored by priority.
+        A host already queued keeps its place, with the new payload and info
+        """
+        score = self._score(info)
+        old = self._entries.get(host)
+        if old is not None and -score == old[0]:
+            old[3] = payload
+            old[4] = info
+            return
+
+        if old is not None:
+            # Leave the old entry in the heap, it is skipped when popped
+            old[2] = None
+        sequence = old[1] if old is not None else next(self._sequence)
+        entry = [-score, sequence, host, payload, info]
+        self._entries[host] = entry
+        heapq.heappush(self._heap, entry)
+
+    def reprioritize(self, host: str, info: HostInfo):
+        "Score host again with new info, if still queued"
+        old = self._entries.get(host)
+        if old is None or self.priority is None:
+            return
+
+        score = self._score(info)
+        if -score == old[0]:
+            old[4] = info
+            return
+
+        # Leave the old entry in the heap, it is skipped when popped
+        entry = [-score, old[1], host, old[3], info]
+        old[2] = None
+        self._entries[host] = entry
+        heapq.heappush(self._heap, entry)
+
+    def ready(self) -> List[Ticket]:
+        "Return the queued hosts that can start now, counting them in flight"
+        started = []
+        skipped = []
+        while self._heap and self.in_flight < int(self.limit):
+            entry = heapq.heappop(self._heap)
+            host = entry[2]
+            if host is None:
+                continue
+
+            group = self.group_of(host)
+            if self.group_limit is not None and self._groups.get(group, 0) >= self.group_limit:
+                skipped.append(entry)
+                continue
+
+            del self._entries[host]
+            self._groups[group] = self._groups.get(group, 0) + 1
+            self.in_flight += 1
+            started.append(Ticket(host, group, self._epoch, entry[3], time.monotonic()))
+
+        # Keep their place in the queue
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+        return started
+
+    def done(self,
+             ticket: Ticket,
+             error: Optional[BaseException] = None,
+             latency: Optional[float] = None):
+        """
+        Record the end of a host started by ready()
+
+        error: exception     Why the host failed, None if discovered
+        latency: float       Seconds it took to log in, if known
+        """
+        self.in_flight -= 1
+        self._groups[ticket.group] -= 1
+
+        reason = congestion(error)
+        if reason is None and self.latency_target is not None and latency is not None \
+                and latency > self.latency_target:
+            reason = f"login took {latency:.1f}s"
+
+        if reason is not None:
+            if ticket.epoch == self._epoch:
+                self._epoch += 1
+                self.decreases += 1
+                self.limit = max(self.minimum, self.limit * self.decrease)
+                self.logger.info("Concurrency down to %d, %s on %s", self.limit, reason, ticket.host)
+        elif error is None and self.limit < self.maximum:
+            before = int(self.limit)
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            if int(self.limit) > before:
+                self.increases += 1
+                self.logger.debug("Concurrency up to %d", self.limit)
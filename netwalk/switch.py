@@ -20,16 +20,36 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import ipaddress
 import logging
-import os
+import re
+import time
 from io import StringIO
 import datetime as dt
-from typing import Dict, Optional
+from typing import Callable, Dict, Iterator, List, Optional, Union
 from netaddr import EUI
 
 import napalm
 import ciscoconfparse
-import textfsm
 from .interface import Interface
+from .vlanset import VlanSet
+from .parsecache import ParseCache
+from .mactable import MacTable
+from .asynccli import ReplaySession
+from . import templates
+
+# show interfaces
+_SHINT_HEADER_RE = re.compile(r"^(\S+?)\s+is\s+(.+?),\s+line\s+protocol\s+is\s+(\S+)")
+_SHINT_HEADER_SHORT_RE = re.compile(r"^(\S+)\s+is\s+(up|down)")
+_SHINT_BW_RE = re.compile(r"^\s+MTU\s+(\d+).+BW\s+(\d+)\s+([KMG]?b)")
+_SHINT_LAST_INOUT_RE = re.compile(r"Last input (.*), output (.*), output hang")
+_SHINT_LAST_CLEARING_RE = re.compile(r"Last clearing of .* counters (.*)")
+_SHINT_QUEUE_RE = re.compile(r"Input queue: \d+/\d+/(\d+)/\d+.*Total output drops: (\d+)")
+_SHINT_INPUT_RE = re.compile(r"(\d+) packets input.* (\d+) bytes")
+_SHINT_OUTPUT_RE = re.compile(r"(\d+) packets output.* (\d+) bytes")
+_SHINT_BROADCAST_RE = re.compile(r"Received (\d+) broadcasts(?: \((\d+)(?: IP)? multicasts?\))?")
+_SHINT_INPUT_ERRORS_RE = re.compile(r"(\d+) input errors")
+_SHINT_OUTPUT_ERRORS_RE = re.compile(r"(\d+) output errors")
+_LAST_INOUT_TYPES_RE = re.compile(r"([Pp]ort-channel|\w*Ethernet).")
+_PORT_CHANNEL_RE = re.compile(r"^[Pp]ort-channel(\d+)$")
 
 
 class Switch():
@@ -43,6 +63,16 @@ class Switch():
     INTERFACE_TYPES = r"([Pp]ort-channel|\w*Ethernet|Vlan|Loopback)."
     INTERFACE_FILTER = r"^interface " + INTERFACE_TYPES
 
+    __slots__ = ('logger', 'hostname', 'interfaces', 'config', 'timeout',
+                 'napalm_optional_args', 'init_time', '_mac_table', '_mac_index', 'vtp',
+                 'arp_table', 'interfaces_ip', 'vlans', 'vlans_set', 'facts',
+                 '_parsed_conf', 'session', 'parse_cache', 'fast_parse',
+                 'single_show_interfaces', 'columnar_mac_table', 'on_facts', 'connect_time',
+                 'dirty', '__dict__')
+
+    # What can change global information of a Fabric, see mark_dirty
+    DIRTY_ALL = frozenset(("config", "mac_table", "neighbors"))
+
     def __init__(self,
                  hostname: str,
                  **kwargs):
@@ -54,17 +84,51 @@ class Switch():
         self.timeout = 30
         self.napalm_optional_args = kwargs.get('napalm_optional_args', None)
         self.init_time = dt.datetime.now()
-        self.mac_table: Dict[EUI, dict] = {}
+        self._mac_table: Union[Dict[EUI, dict], MacTable] = {}
+        self._mac_index: Optional[Dict[Interface, List[EUI]]] = None
         self.vtp: Optional[str] = None
         self.arp_table: Dict[ipaddress.IPv4Interface, dict] = {}
         self.interfaces_ip = {}
         self.vlans: Optional[Dict[int, dict]] = None
-        self.vlans_set = {x for x in range(1,4095)} # VLANs configured on the switch
+        self.vlans_set = VlanSet.all() # VLANs configured on the switch
         self.facts: dict = kwargs.get('facts', None)
+        self.parse_cache: Optional[ParseCache] = kwargs.get('parse_cache', None)
+        self.fast_parse: bool = kwargs.get('fast_parse', True)
+        # Get status, counters and last in/out from a single show interfaces
+        self.single_show_interfaces: bool = kwargs.get('single_show_interfaces', False)
+        # Store the MAC table in a numpy backed MacTable
+        self.columnar_mac_table: bool = kwargs.get('columnar_mac_table', False)
+        self._parsed_conf: Optional[ciscoconfparse.CiscoConfParse] = None
+        # Called with the switch once facts are known, may raise to stop collecting
+        self.on_facts: Optional[Callable[['Switch'], None]] = kwargs.get('on_facts', None)
+        # Seconds the last connect() took to log in
+        self.connect_time: Optional[float] = None
+        # Changed since the last Fabric.refresh_global_information
+        self.dirty: set = set(self.DIRTY_ALL)
 
         if self.config is not None:
             self._parse_config()
 
+    def __getstate__(self):
+        # Sessions and callbacks can't be pickled, the parsed config is rebuilt when needed
+        state = dict(self.__dict__)
+        for attr in self.__slots__:
+            if attr in ('__dict__', 'session', 'on_facts', '_parsed_conf'):
+                continue
+            try:
+                state[attr] = object.__getattribute__(self, attr)
+            except AttributeError:
+                continue
+        return state
+
+    def __setstate__(self, state):
+        self.session = None
+        self.on_facts = None
+        self._parsed_conf = None
+        self.dirty = set(self.DIRTY_ALL)
+        for attr, value in state.items():
+            setattr(self, attr, value)
+
     def retrieve_data(self,
                       username: str,
                       password: str,
@@ -74,8 +138,28 @@ class Switch():
 
         self.connect(username, password, napalm_optional_args)
 
-        self._get_switch_data()
-        self.session.close()
+        try:
+            self._get_switch_data()
+        finally:
+            self.session.close()
+
+    def retrieve_data_from_outputs(self,
+                                   outputs: Dict[str, str],
+                                   fetch: Optional[Callable[[str], str]] = None,
+                                   prompt: str = "#"):
+        """
+        Populate the switch from show command outputs collected elsewhere,
+        i.e. by the asyncio discovery
+
+        outputs: dict       {command: output}, see asynccli.IOS_COMMANDS
+        fetch: callable     Called with commands missing from outputs, returns their output
+        prompt: str         Device prompt
+        """
+        self.session = ReplaySession(self.hostname, outputs, fetch, prompt)
+        try:
+            self._get_switch_data()
+        finally:
+            self.session.close()
 
     def connect(self, username: str, password: str, napalm_optional_args: dict = None) -> None:
         driver = napalm.get_network_driver('ios')
@@ -90,20 +174,26 @@ class Switch():
                               optional_args=self.napalm_optional_args)
 
         self.logger.info("Connecting to %s", self.hostname)
+        start = time.perf_counter()
         self.session.open()
+        self.connect_time = time.perf_counter() - start
 
-    def get_active_vlans(self):
-        vlans = set([1])
+    def get_active_vlans(self) -> VlanSet:
+        vlans = VlanSet([1])
         for _, intdata in self.interfaces.items():
             vlans.add(intdata.native_vlan)
             try:
                 if len(intdata.allowed_vlan) != 4094:
-                    vlans = vlans.union(intdata.allowed_vlan)
+                    vlans.update(intdata.allowed_vlan)
             except (AttributeError, TypeError):
                 continue
 
         # Find trunk interfaces with no neighbors
         noneightrunks = []
+        if isinstance(self._mac_table, MacTable):
+            mac_vlans = self._mac_table.vlans_by_interface()
+        else:
+            mac_index = self.mac_index
         for intname, intdata in self.interfaces.items():
             if intdata.mode == "trunk":
                 try:
@@ -115,12 +205,15 @@ class Switch():
                 noneightrunks.append(intdata)
 
                 # Find if interface has mac addresses
-                activevlans = set()
-                for mac, macdata in self.mac_table.items():
-                    if macdata['interface'] == intdata:
-                        activevlans.add(macdata['vlan'])
+                if isinstance(self._mac_table, MacTable):
+                    vlans.update(mac_vlans.get(intdata, ()))
+                    continue
+
+                activevlans = VlanSet()
+                for mac in mac_index.get(intdata, ()):
+                    activevlans.add(self._mac_table[mac]['vlan'])
 
-                vlans = vlans.union(activevlans)
+                vlans.update(activevlans)
 
         # Add vlans with layer3 configured
         for intname, intdata in self.interfaces.items():
@@ -134,30 +227,180 @@ class Switch():
         return vlans
 
     def add_interface(self, intobject: Interface):
+        """
+        Add intobject to interfaces. Port-channel members and their
+        Port-channel are linked through parent_interface and
+        child_interfaces, whichever is added first
+        """
         intobject.device = self
         self.interfaces[intobject.name] = intobject
+        self.dirty.add("neighbors")
+
+        if intobject.channel_group is not None:
+            for name in (f"Port-channel{intobject.channel_group}", f"port-channel{intobject.channel_group}"):
+                parent = self.interfaces.get(name)
+                if parent is not None:
+                    self._link_member(intobject, parent)
+                    break
+
+        match = _PORT_CHANNEL_RE.match(intobject.name or "")
+        if match:
+            group = int(match.group(1))
+            for member in self.interfaces.values():
+                if member.channel_group == group:
+                    self._link_member(member, intobject)
+
+    @staticmethod
+    def _link_member(member: Interface, parent: Interface):
+        old = member.parent_interface
+        if old is not None and old is not parent and member in old.child_interfaces:
+            old.child_interfaces.remove(member)
+
+        member.parent_interface = parent
+        # Replace an interface of the same name added before
+        parent.child_interfaces[:] = [x for x in parent.child_interfaces
+                                      if x is not member and x.name != member.name]
+        parent.child_interfaces.append(member)
+
+    def mark_dirty(self, *what: str):
+        """
+        Tell the Fabric to look at this switch again at the next
+        refresh_global_information, after changing config, mac_table in
+        place or CDP neighbors of interfaces. All of them if none given.
+        Assigning mac_table or adding interfaces marks it already
+        """
+        self.dirty.update(what or self.DIRTY_ALL)
+
+    @property
+    def mac_table(self) -> Union[Dict[EUI, dict], MacTable]:
+        return self._mac_table
+
+    @mac_table.setter
+    def mac_table(self, value: Union[Dict[EUI, dict], MacTable]):
+        self._mac_table = value
+        self._mac_index = None
+        self.dirty.add("mac_table")
+
+    @property
+    def mac_index(self) -> Dict[Interface, List[EUI]]:
+        """
+        MACs learned on each interface, built from mac_table the first time
+        it is needed. Call index_mac_table() after changing mac_table in place
+        """
+        if self._mac_index is None:
+            self.index_mac_table()
+
+        if self._mac_index is None:
+            # Only built on request for MacTable
+            self._mac_index = self._mac_table.by_interface()
+
+        return self._mac_index
+
+    def mac_counts(self) -> Dict[Interface, int]:
+        "Return the number of MACs learned on each interface"
+        if isinstance(self._mac_table, MacTable):
+            return self._mac_table.counts()
+
+        return {intdata: len(macs) for intdata, macs in self.mac_index.items()}
+
+    def index_mac_table(self):
+        "Rebuild mac_index and the mac_count of interfaces from mac_table"
+        if isinstance(self._mac_table, MacTable):
+            self._mac_index = None
+        else:
+            index: Dict[Interface, List[EUI]] = {}
+            for mac, macdata in self._mac_table.items():
+                try:
+                    intdata = macdata['interface']
+                except KeyError:
+                    continue
 
-    def _parse_config(self):
-        if isinstance(self.config, str):
+                try:
+                    index[intdata].append(mac)
+                except KeyError:
+                    index[intdata] = [mac]
+
+            self._mac_index = index
+
+        for _, intdata in self.interfaces.items():
+            intdata.mac_count = 0
+
+        for intdata, count in self.mac_counts().items():
+            intdata.mac_count = count
+
+    @property
+    def parsed_conf(self) -> Optional[ciscoconfparse.CiscoConfParse]:
+        "CiscoConfParse object of the config, only built when needed"
+        if self._parsed_conf is None and isinstance(self.config, str):
             running = StringIO()
             running.write(self.config)
 
             # Be kind rewind
             running.seek(0)
 
+            self._parsed_conf = ciscoconfparse.CiscoConfParse(running)
+
+        return self._parsed_conf
+
+    @parsed_conf.setter
+    def parsed_conf(self, value: Optional[ciscoconfparse.CiscoConfParse]):
+        self._parsed_conf = value
+
+    def _interface_blocks(self) -> Iterator[List[str]]:
+        """
+        Yield the lines of each interface matching INTERFACE_FILTER
+
+        Same blocks as CiscoConfParse.find_objects(INTERFACE_FILTER).ioscfg,
+        without building the whole configuration tree: an interface takes all
+        following indented lines, blank lines and comments are dropped.
+        """
+        interface_filter = re.compile(self.INTERFACE_FILTER)
+        block = None
+        for line in self.config.splitlines():
+            if line == "" or line.isspace():
+                continue
+
+            if line[0].isspace():
+                if block is not None:
+                    block.append(line)
+                continue
+
+            if line[0] == "!":
+                continue
+
+            if block is not None:
+                yield block
+
+            block = [line] if interface_filter.match(line) else None
+
+        if block is not None:
+            yield block
+
+    def _parse_config(self):
+        if isinstance(self.config, str):
+            # Rebuild on next access, config may have changed
+            self._parsed_conf = None
+
             # Get show run an interface access/trunk status
-            self.parsed_conf = ciscoconfparse.CiscoConfParse(running)
-            interface_config_list: list = self.parsed_conf.find_objects(
-                self.INTERFACE_FILTER)
+            if self.fast_parse:
+                interface_config_list = self._interface_blocks()
+            else:
+                interface_config_list = (x.ioscfg for x in self.parsed_conf.find_objects(
+                    self.INTERFACE_FILTER))
 
             for intf in interface_config_list:
-                thisint = Interface(config=intf.ioscfg)
+                if self.parse_cache is not None:
+                    thisint = self.parse_cache.interface(intf)
+                else:
+                    thisint = Interface(config=intf)
                 self.add_interface(thisint)
         else:
             TypeError("No interface loaded, cannot parse")
 
     def _get_switch_data(self):
         self.facts = self.session.get_facts()
+        if self.on_facts is not None:
+            self.on_facts(self)
 
         self.init_time = dt.datetime.now()
 
@@ -196,34 +439,37 @@ class Switch():
                 #print("Interface {} not found".format(v['interface']))
                 continue
 
-        # Count macs per interface
-        for _, data in self.mac_table.items():
-            try:
-                data['interface'].mac_count += 1
-            except KeyError:
-                pass
+        if self.columnar_mac_table:
+            self.mac_table = MacTable(self.mac_table)
 
-        # Get interface status
-        int_status = self.session.get_interfaces()
+        # Index and count macs per interface
+        self.index_mac_table()
 
-        for intname, intstatus in int_status.items():
-            try:
-                self.interfaces[intname].is_enabled = intstatus['is_enabled']
-                self.interfaces[intname].is_up = intstatus['is_up']
-                self.interfaces[intname].speed = intstatus['speed']
-                self.interfaces[intname].switch = self
-            except KeyError:
-                continue
+        if self.single_show_interfaces:
+            commandout = self.session.cli(['show interfaces'])['show interfaces']
+            self._parse_show_interfaces(commandout)
+        else:
+            # Get interface status
+            int_status = self.session.get_interfaces()
 
-        int_counters = self.session.get_interfaces_counters()
-        for intname, intstatus in int_counters.items():
-            try:
-                self.interfaces[intname].counters = intstatus
-            except KeyError:
-                continue
+            for intname, intstatus in int_status.items():
+                try:
+                    self.interfaces[intname].is_enabled = intstatus['is_enabled']
+                    self.interfaces[intname].is_up = intstatus['is_up']
+                    self.interfaces[intname].speed = intstatus['speed']
+                    self.interfaces[intname].switch = self
+                except KeyError:
+                    continue
+
+            int_counters = self.session.get_interfaces_counters()
+            for intname, intstatus in int_counters.items():
+                try:
+                    self.interfaces[intname].counters = intstatus
+                except KeyError:
+                    continue
 
-        # Add last in/out status
-        self._parse_int_last_inout()
+            # Add last in/out status
+            self._parse_int_last_inout()
 
         self._parse_cdp_neighbors()
 
@@ -235,12 +481,102 @@ class Switch():
 
         # Get VLANs
         self.vlans = self.session.get_vlans()
-        self.vlans_set = set([int(k) for k, v in self.vlans.items()])
+        self.vlans_set = VlanSet([int(k) for k, v in self.vlans.items()])
 
         # Get l3 interfaces
         self.interfaces_ip = self.session.get_interfaces_ip()
         self.arp_table = self.session.get_arp_table()
 
+    def _parse_show_interfaces(self, commandout: str):
+        """
+        Get status, speed, counters, last in/out and last counter clearing
+        from show interfaces, the same data as NAPALM get_interfaces,
+        get_interfaces_counters and _parse_int_last_inout
+        """
+        intdata = None
+        counters: dict = {}
+
+        for line in commandout.splitlines():
+            if line == "" or line.isspace():
+                continue
+
+            if not line[0].isspace():
+                match = _SHINT_HEADER_RE.search(line) or _SHINT_HEADER_SHORT_RE.search(line)
+                if match is None:
+                    continue
+
+                name, status = match.group(1), match.group(2)
+                protocol = match.group(3) if match.re is _SHINT_HEADER_RE else ""
+                counters = {}
+                intdata = self.interfaces.get(name)
+                if intdata is None:
+                    continue
+
+                intdata.is_enabled = "admin" not in status.lower()
+                intdata.is_up = "up" in (protocol or status)
+                intdata.switch = self
+                intdata.counters = counters
+                continue
+
+            if intdata is None:
+                continue
+
+            # Free text, may contain any of the words below
+            if line.lstrip().startswith("Description:"):
+                continue
+
+            if "BW" in line:
+                match = _SHINT_BW_RE.search(line)
+                if match is not None:
+                    speed = float(match.group(2))
+                    if match.group(3).startswith("Kb"):
+                        speed = speed / 1000.0
+                    elif match.group(3).startswith("Gb"):
+                        speed = speed * 1000
+                    intdata.speed = speed
+            elif "Last input" in line:
+                match = _SHINT_LAST_INOUT_RE.search(line)
+                if match is not None and _LAST_INOUT_TYPES_RE.match(intdata.name):
+                    intdata.last_in = self._cisco_time_to_dt(match.group(1))
+                    intdata.last_out = self._cisco_time_to_dt(match.group(2))
+            elif "Last clearing of" in line:
+                match = _SHINT_LAST_CLEARING_RE.search(line)
+                if match is not None and _LAST_INOUT_TYPES_RE.match(intdata.name):
+                    intdata.last_clearing = self._cisco_time_to_dt(match.group(1))
+            elif "Input queue" in line:
+                match = _SHINT_QUEUE_RE.search(line)
+                if match is not None:
+                    counters['rx_discards'] = int(match.group(1))
+                    counters['tx_discards'] = int(match.group(2))
+            elif "packets input" in line:
+                match = _SHINT_INPUT_RE.search(line)
+                if match is not None:
+                    counters['rx_unicast_packets'] = int(match.group(1))
+                    counters['rx_octets'] = int(match.group(2))
+            elif "broadcasts" in line:
+                match = _SHINT_BROADCAST_RE.search(line)
+                if match is not None:
+                    counters['rx_broadcast_packets'] = int(match.group(1))
+                    counters['rx_multicast_packets'] = int(match.group(2)) if match.group(2) else -1
+                else:
+                    counters['rx_broadcast_packets'] = -1
+                    counters['rx_multicast_packets'] = -1
+            elif "packets output" in line:
+                match = _SHINT_OUTPUT_RE.search(line)
+                if match is not None:
+                    counters['tx_unicast_packets'] = int(match.group(1))
+                    counters['tx_octets'] = int(match.group(2))
+                    counters['tx_broadcast_packets'] = -1
+                    counters['tx_multicast_packets'] = -1
+            elif "input errors" in line:
+                match = _SHINT_INPUT_ERRORS_RE.search(line)
+                if match is not None:
+                    counters['rx_errors'] = int(match.group(1))
+            elif "output errors" in line:
+                match = _SHINT_OUTPUT_ERRORS_RE.search(line)
+                if match is not None:
+                    counters['tx_errors'] = int(match.group(1))
+
     def _parse_int_last_inout(self):
         "Get last in and last out as well as last coutner clearing"
         interface_types = r"([Pp]ort-channel|\w*Ethernet)."
@@ -278,18 +614,17 @@ class Switch():
                 except KeyError:
                     pass
 
-    def _parse_cdp_neighbors(self):
+    def _parse_cdp_neighbors(self, neighdetail: Optional[str] = None):
         # Return parsed cdp neighbours
         # [[empty, hostname, ip, platform, local interface, remote interface, version]]
         # [['', 'SMba03_1_Piking', '10.19.6.15', 'cisco WS-C3560G-48TS', 'GigabitEthernet0/49', 'GigabitEthernet0/2', 'Cisco IOS Software, C3560 Software (C3560-IPBASE-M), Version 12.2(35)SE5, RELEASE SOFTWARE (fc1)']]
-        self.session.device.write_channel("show cdp neigh detail")
-        self.session.device.write_channel("\n")
-        self.session.device.timeout = 30  # Could take ages...
-        neighdetail = self.session.device.read_until_prompt(max_loops=3000)
-        fsmpath = os.path.dirname(os.path.realpath(__file__)) + "/textfsm_templates/show_cdp_neigh_detail.textfsm"
-        with open(fsmpath, 'r') as fsmfile:
-            re_table = textfsm.TextFSM(fsmfile)
-            fsm_results = re_table.ParseText(neighdetail)
+        if neighdetail is None:
+            self.session.device.write_channel("show cdp neigh detail")
+            self.session.device.write_channel("\n")
+            self.session.device.timeout = 30  # Could take ages...
+            neighdetail = self.session.device.read_until_prompt(max_loops=3000)
+
+        fsm_results = templates.parse("show_cdp_neigh_detail", neighdetail)
 
         for result in fsm_results:
             self.logger.debug("Found CDP neighbor %s IP %s local int %s, remote int %s", result[1], result[2], result[5], result[4])
@@ -306,35 +641,35 @@ class Switch():
 
             self.interfaces[nei[5]].neighbors.append(neigh_data)
 
-    def _cisco_time_to_dt(self, time: str) -> dt.datetime:
+    def _cisco_time_to_dt(self, timestr: str) -> dt.datetime:
         weeks = 0
         days = 0
         hours = 0
         minutes = 0
         seconds = 0
 
-        if time == 'never':
+        if timestr == 'never':
             # TODO: return uptime
             return dt.datetime(1970, 1, 1, 0, 0, 0)
 
-        if ':' in time:
-            hours, minutes, seconds = time.split(':')
+        if ':' in timestr:
+            hours, minutes, seconds = timestr.split(':')
             hours = int(hours)
             minutes = int(minutes)
             seconds = int(seconds)
 
-        elif 'y' in time:
+        elif 'y' in timestr:
             # 2y34w
-            years, weeks = time.split('y')
+            years, weeks = timestr.split('y')
             weeks = weeks.replace('w', '')
             years = int(years)
             weeks = int(weeks)
 
             weeks = years*54 + weeks
 
-        elif 'h' in time:
+        elif 'h' in timestr:
             # 3d05h
-            days, hours = time.split('d')
+            days, hours = timestr.split('d')
             hours = hours.replace('h', '')
 
             days = int(days)
@@ -342,7 +677,7 @@ class Switch():
 
         else:
             # 24w2d
-            weeks, days = time.split('w')
+            weeks, days = timestr.split('w')
             days = days.replace('d', '')
 
             weeks = int(weeks)
@@ -0,0 +1,127 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"Define TemplateRegistry object"
+
+import copy
+import io
+import os
+import threading
+from typing import Dict, List, TextIO, Tuple, Union
+
+import textfsm
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "textfsm_templates")
+
+
+class TemplateRegistry():
+    """
+    Load and compile each TextFSM template once
+
+    TextFSM objects keep the parsing state, so every thread gets its own copy
+    of the compiled template, reset before each use.
+    Templates not registered are looked up in template_dir as <name>.textfsm
+    """
+
+    def __init__(self, template_dir: str = TEMPLATE_DIR):
+        self.template_dir = template_dir
+        self._templates: Dict[str, Tuple[int, textfsm.TextFSM]] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._version = 0
+
+    def register(self, name: str, template: Union[str, os.PathLike, TextIO]):
+        """
+        Add or replace a template
+
+        name: str                   Name to use with get() and parse()
+        template: path or file      TextFSM template
+        """
+        if isinstance(template, (str, os.PathLike)):
+            with open(template, 'r') as fsmfile:
+                compiled = textfsm.TextFSM(fsmfile)
+        else:
+            compiled = textfsm.TextFSM(io.StringIO(template.read()))
+
+        with self._lock:
+            self._version += 1
+            self._templates[name] = (self._version, compiled)
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return list(self._templates)
+
+    def _compiled(self, name: str) -> Tuple[int, textfsm.TextFSM]:
+        try:
+            return self._templates[name]
+        except KeyError:
+            pass
+
+        path = os.path.join(self.template_dir, name + ".textfsm")
+        if not os.path.isfile(path):
+            raise KeyError(f"No TextFSM template named {name}")
+
+        with self._lock:
+            if name not in self._templates:
+                with open(path, 'r') as fsmfile:
+                    self._version += 1
+                    self._templates[name] = (self._version, textfsm.TextFSM(fsmfile))
+
+            return self._templates[name]
+
+    def get(self, name: str) -> textfsm.TextFSM:
+        """
+        Return a TextFSM parser for this thread, ready to use.
+        Do not keep it after parsing, next call will reset it
+        """
+        version, compiled = self._compiled(name)
+
+        try:
+            parsers = self._local.parsers
+        except AttributeError:
+            parsers = self._local.parsers = {}
+
+        cached = parsers.get(name)
+        if cached is None or cached[0] != version:
+            # Share the compiled states, copy the values holding the state
+            parser = copy.copy(compiled)
+            parser.values = copy.deepcopy(compiled.values, {id(compiled): parser})
+            parsers[name] = (version, parser)
+        else:
+            parser = cached[1]
+
+        parser.Reset()
+        return parser
+
+    def parse(self, name: str, text: str) -> List[list]:
+        "Parse text with template name"
+        return self.get(name).ParseText(text)
+
+
+# Default registry, used by Switch
+registry = TemplateRegistry()
+
+
+def register_template(name: str, template: Union[str, os.PathLike, TextIO]):
+    "Add or replace a template in the default registry"
+    registry.register(name, template)
+
+
+def parse(name: str, text: str) -> List[list]:
+    "Parse text with template name from the default registry"
+    return registry.parse(name, text)
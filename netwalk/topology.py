@@ -0,0 +1,220 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"Define Topology object"
+
+import logging
+from array import array
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .interface import Interface
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if TYPE_CHECKING:
+    from .switch import Switch
+
+
+def _ints(values: List[int]):
+    "Return values as a numpy array if numpy is installed, an array of ints otherwise"
+    if np is not None:
+        return np.array(values, dtype=np.int32)
+    return array('i', values)
+
+
+class Topology():
+    """
+    Index of the links between switches joined by CDP, see
+    Fabric.refresh_global_information
+
+    Switches are numbered 0 to len - 1 in the order given, links 0 to
+    edge_count - 1. A link is a pair of interfaces, (local, remote), and
+    is a single edge even if both sides point to each other.
+    Only interfaces with a single neighbor are followed, like PathEngine.
+
+    With collapse_lags, links of Port-channel members, see
+    Interface.parent_interface, are a single edge between the
+    Port-channels, members[edge] lists the links it is made of.
+    A Port-channel with members on two switches (vPC) is an edge to each.
+
+    Adjacency is kept in CSR form: the arcs leaving node n are
+    indptr[n] to indptr[n + 1], going to node indices[i] over edge
+    edge_ids[i] through interface arc_interfaces[i].
+    Arrays are numpy arrays if numpy is installed.
+
+    Built once, build a new one when links change: Fabric.topology does
+    """
+
+    def __init__(self, switches: Iterable['Switch'], collapse_lags: bool = True):
+        """
+        switches: list          Switches to index, links to others are left out
+        collapse_lags: bool     One edge per Port-channel instead of one per member
+        """
+        self.logger = logging.getLogger(__name__)
+        self.collapse_lags = collapse_lags
+        self.switches: List['Switch'] = list(switches)
+        self.node_id: Dict['Switch', int] = {x: i for i, x in enumerate(self.switches)}
+        # (local, remote) of every edge
+        self.edges: List[Tuple[Interface, Interface]] = []
+        # (local, remote) of the physical links of every edge
+        self.members: List[List[Tuple[Interface, Interface]]] = []
+        # Edge of every interface in a link, the first one for vPC Port-channels
+        self.edge_id: Dict[Interface, int] = {}
+        self.arc_interfaces: List[Interface] = []
+        self.arc_remotes: List[Interface] = []
+
+        indptr = [0]
+        indices = []
+        edge_ids = []
+        pairs: Dict[Tuple[Interface, Interface], int] = {}
+        for switch in self.switches:
+            arcs = set()
+            for intdata in switch.interfaces.values():
+                neighbors = getattr(intdata, 'neighbors', None)
+                if not neighbors or len(neighbors) != 1 or not isinstance(neighbors[0], Interface):
+                    continue
+                remote = neighbors[0]
+                try:
+                    peer = self.node_id[remote.device]
+                except KeyError:
+                    self.logger.debug("%s %s links to a switch not in the fabric",
+                                      switch.hostname, intdata.name)
+                    continue
+
+                local_end, remote_end = self._end(intdata), self._end(remote)
+                edge = pairs.get((remote_end, local_end))
+                if edge is None:
+                    edge = pairs.get((local_end, remote_end))
+                if edge is None:
+                    edge = len(self.edges)
+                    pairs[(local_end, remote_end)] = edge
+                    self.edges.append((local_end, remote_end))
+                    self.members.append([])
+
+                # The other side of this link may have been seen already
+                if (remote, intdata) not in self.members[edge]:
+                    self.members[edge].append((intdata, remote))
+                for interface in (intdata, local_end, remote, remote_end):
+                    self.edge_id.setdefault(interface, edge)
+
+                if (local_end, remote_end) in arcs:
+                    continue
+                arcs.add((local_end, remote_end))
+                indices.append(peer)
+                edge_ids.append(edge)
+                self.arc_interfaces.append(local_end)
+                self.arc_remotes.append(remote_end)
+            indptr.append(len(indices))
+
+        self.indptr = _ints(indptr)
+        self.indices = _ints(indices)
+        self.edge_ids = _ints(edge_ids)
+
+    def _end(self, interface: Interface) -> Interface:
+        "Return the interface an edge through interface ends on"
+        if self.collapse_lags and interface.parent_interface is not None:
+            return interface.parent_interface
+        return interface
+
+    def __len__(self) -> int:
+        return len(self.switches)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.edges)
+
+    @property
+    def arc_count(self) -> int:
+        "Links counted once per side pointing to the other"
+        return len(self.arc_interfaces)
+
+    def degree(self, switch: 'Switch') -> int:
+        "Return the number of links leaving switch"
+        node = self.node_id[switch]
+        return int(self.indptr[node + 1] - self.indptr[node])
+
+    def links(self, switch: 'Switch') -> Iterator[Tuple[Interface, Interface, 'Switch']]:
+        "Yield (local interface, remote interface, remote switch) of every link leaving switch"
+        node = self.node_id.get(switch)
+        if node is None:
+            return
+        for arc in range(int(self.indptr[node]), int(self.indptr[node + 1])):
+            yield self.arc_interfaces[arc], self.arc_remotes[arc], self.switches[int(self.indices[arc])]
+
+    def speed(self, edge: int) -> Optional[float]:
+        """
+        Return the sum of the speed of the links of edge, or the speed of
+        its local end if none is known, i.e. a Port-channel
+        """
+        speeds = [x.speed for x, _ in self.members[edge] if x.speed is not None]
+        return sum(speeds) if speeds else self.edges[edge][0].speed
+
+    @property
+    def speeds(self) -> List[Optional[float]]:
+        "Speed of every edge, see speed"
+        return [self.speed(x) for x in range(len(self.edges))]
+
+    def to_networkx(self, multigraph: bool = True):
+        """
+        Return a networkx MultiGraph, or Graph, with a node per switch id
+        and an edge per link id. Nodes have switch and hostname attributes,
+        edges have local and remote interfaces, members and speed.
+
+        Requires networkx
+        """
+        try:
+            import networkx as nx
+        except ImportError as exc:
+            raise ImportError("Topology.to_networkx requires networkx, install netwalk[networkx]") from exc
+
+        graph = nx.MultiGraph() if multigraph else nx.Graph()
+        graph.add_nodes_from((i, {'switch': x, 'hostname': x.hostname}) for i, x in enumerate(self.switches))
+        for edge, (local, remote) in enumerate(self.edges):
+            attrs = {'local': local, 'remote': remote, 'members': self.members[edge], 'speed': self.speed(edge)}
+            if multigraph:
+                graph.add_edge(self.node_id[local.device], self.node_id[remote.device], key=edge, **attrs)
+            else:
+                graph.add_edge(self.node_id[local.device], self.node_id[remote.device], **attrs)
+        return graph
+
+    def to_scipy(self, weights: Optional[Iterable[float]] = None):
+        """
+        Return a len x len scipy.sparse csr_matrix, with the number of
+        links from each switch to each other, or the sum of their weights
+
+        weights: list      A weight per edge id, i.e. speeds
+
+        Requires scipy
+        """
+        try:
+            from scipy.sparse import csr_matrix
+        except ImportError as exc:
+            raise ImportError("Topology.to_scipy requires scipy, install netwalk[scipy]") from exc
+
+        if weights is None:
+            data = np.ones(len(self.arc_interfaces))
+        else:
+            data = np.asarray(list(weights), dtype=float)[np.asarray(self.edge_ids, dtype=np.intp)]
+
+        matrix = csr_matrix((data, np.asarray(self.indices), np.asarray(self.indptr)),
+                            shape=(len(self.switches), len(self.switches)))
+        matrix.sum_duplicates()
+        return matrix
@@ -0,0 +1,259 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"Define VlanSet object"
+
+from collections.abc import MutableSet, Iterable
+from typing import Iterator, Tuple
+
+MAX_VLAN = 4095
+ALL_VLANS_BITS = ((1 << 4095) - 1) ^ 1  # VLAN 1-4094
+
+
+class VlanSet(MutableSet):
+    """
+    Set of VLAN ids stored as a 4096 bit bitmap
+
+    Behaves like a set() of int, but takes the same amount of memory
+    whatever the number of VLANs and set operations between two VlanSet
+    are done on the whole bitmap at once.
+    Printing it yields VLAN ranges like the Cisco CLI, i.e. 1-10,20
+    """
+
+    __slots__ = ('_bits',)
+
+    def __init__(self, vlans: Iterable = ()):
+        if isinstance(vlans, VlanSet):
+            self._bits = vlans._bits
+        elif isinstance(vlans, range) and vlans.step == 1:
+            self._bits = 0
+            if len(vlans) > 0:
+                self._check(vlans.start)
+                self._check(vlans.stop - 1)
+                self._bits = ((1 << vlans.stop) - 1) ^ ((1 << vlans.start) - 1)
+        else:
+            self._bits = 0
+            for vlan in vlans:
+                self.add(vlan)
+
+    @classmethod
+    def all(cls) -> 'VlanSet':
+        "Return a VlanSet with all usable VLANs, 1 to 4094"
+        out = cls()
+        out._bits = ALL_VLANS_BITS
+        return out
+
+    @classmethod
+    def from_string(cls, vlanlist: str) -> 'VlanSet':
+        """
+        Expands vlan ranges
+
+        Args:
+          - vlanlist (str): String of vlans from config, i.e. 1,2,3-5
+
+        Returns:
+          - VlanSet
+        """
+        out = cls()
+        for vlan in vlanlist.split(","):
+            if "-" in vlan:
+                begin, end = vlan.split("-")
+                out._bits |= cls(range(int(begin), int(end)+1))._bits
+            else:
+                out.add(int(vlan))
+
+        return out
+
+    @classmethod
+    def _from_iterable(cls, it):
+        return cls(it)
+
+    @staticmethod
+    def _check(vlan: int):
+        if not 0 <= vlan <= MAX_VLAN:
+            raise ValueError(f"VLAN {vlan} out of range")
+
+    @staticmethod
+    def _bits_of(other) -> int:
+        if isinstance(other, VlanSet):
+            return other._bits
+        return VlanSet(other)._bits
+
+    def __contains__(self, vlan) -> bool:
+        try:
+            return 0 <= vlan <= MAX_VLAN and bool(self._bits >> vlan & 1)
+        except TypeError:
+            return False
+
+    def __iter__(self) -> Iterator[int]:
+        bits = self._bits
+        while bits:
+            lowest = bits & -bits
+            yield lowest.bit_length() - 1
+            bits ^= lowest
+
+    def __len__(self) -> int:
+        return bin(self._bits).count("1")
+
+    def __bool__(self) -> bool:
+        return self._bits != 0
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, VlanSet):
+            return self._bits == other._bits
+        if isinstance(other, (set, frozenset)):
+            try:
+                return self._bits == VlanSet(other)._bits
+            except (TypeError, ValueError):
+                return False
+        return NotImplemented
+
+    __hash__ = None
+
+    def __le__(self, other) -> bool:
+        if isinstance(other, VlanSet):
+            return self._bits & ~other._bits == 0
+        return super().__le__(other)
+
+    def __ge__(self, other) -> bool:
+        if isinstance(other, VlanSet):
+            return other._bits & ~self._bits == 0
+        return super().__ge__(other)
+
+    def __or__(self, other) -> 'VlanSet':
+        if not isinstance(other, Iterable):
+            return NotImplemented
+        out = VlanSet()
+        out._bits = self._bits | self._bits_of(other)
+        return out
+
+    __ror__ = __or__
+
+    def __and__(self, other) -> 'VlanSet':
+        if not isinstance(other, Iterable):
+            return NotImplemented
+        out = VlanSet()
+        out._bits = self._bits & self._bits_of(other)
+        return out
+
+    __rand__ = __and__
+
+    def __sub__(self, other) -> 'VlanSet':
+        if not isinstance(other, Iterable):
+            return NotImplemented
+        out = VlanSet()
+        out._bits = self._bits & ~self._bits_of(other)
+        return out
+
+    def __xor__(self, other) -> 'VlanSet':
+        if not isinstance(other, Iterable):
+            return NotImplemented
+        out = VlanSet()
+        out._bits = self._bits ^ self._bits_of(other)
+        return out
+
+    __rxor__ = __xor__
+
+    def __ior__(self, other) -> 'VlanSet':
+        self._bits |= self._bits_of(other)
+        return self
+
+    def __iand__(self, other) -> 'VlanSet':
+        self._bits &= self._bits_of(other)
+        return self
+
+    def __isub__(self, other) -> 'VlanSet':
+        self._bits &= ~self._bits_of(other)
+        return self
+
+    def __ixor__(self, other) -> 'VlanSet':
+        self._bits ^= self._bits_of(other)
+        return self
+
+    def add(self, vlan: int):
+        self._check(vlan)
+        self._bits |= 1 << vlan
+
+    def discard(self, vlan: int):
+        if vlan in self:
+            self._bits ^= 1 << vlan
+
+    def copy(self) -> 'VlanSet':
+        return VlanSet(self)
+
+    def union(self, *others) -> 'VlanSet':
+        out = self.copy()
+        out.update(*others)
+        return out
+
+    def intersection(self, *others) -> 'VlanSet':
+        out = self.copy()
+        out.intersection_update(*others)
+        return out
+
+    def difference(self, *others) -> 'VlanSet':
+        out = self.copy()
+        out.difference_update(*others)
+        return out
+
+    def update(self, *others):
+        for other in others:
+            self._bits |= self._bits_of(other)
+
+    def intersection_update(self, *others):
+        for other in others:
+            self._bits &= self._bits_of(other)
+
+    def difference_update(self, *others):
+        for other in others:
+            self._bits &= ~self._bits_of(other)
+
+    def issubset(self, other) -> bool:
+        return self._bits & ~self._bits_of(other) == 0
+
+    def issuperset(self, other) -> bool:
+        return self._bits_of(other) & ~self._bits == 0
+
+    def ranges(self) -> Iterator[Tuple[int, int]]:
+        "Yield (first, last) tuples of consecutive VLANs"
+        bits = self._bits
+        offset = 0
+        while bits:
+            # Skip zeroes, then measure the run of ones
+            zeroes = (bits & -bits).bit_length() - 1
+            bits >>= zeroes
+            offset += zeroes
+            ones = (~bits & (bits + 1)).bit_length() - 1
+            yield offset, offset + ones - 1
+            bits >>= ones
+            offset += ones
+
+    def __str__(self) -> str:
+        out = []
+        for first, last in self.ranges():
+            if last - first >= 2:
+                out.append(f"{first}-{last}")
+            elif last == first:
+                out.append(str(first))
+            else:
+                out.append(f"{first},{last}")
+
+        return ",".join(out)
+
+    def __repr__(self) -> str:
+        return f"VlanSet('{self}')"
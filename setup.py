@@ -24,5 +24,11 @@ setuptools.setup(
         "ciscoconfparse>=1.5.30",
         "napalm>=3.2.0"
     ],
+    extras_require={
+        "numpy": ["numpy"],
+        "asyncssh": ["asyncssh"],
+        "networkx": ["networkx"],
+        "scipy": ["scipy", "numpy"]
+    },
     include_package_data=True
 )
\ No newline at end of file
@@ -0,0 +1,371 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Fake IOS switches answering on telnet and SSH, for discovery tests.
+
+Every FakeDevice listens on its own loopback address, 127.0.0.x, so CDP
+neighbors can point at each other like real switches.
+FakeCLI talks to FakeDevices without sockets, as transport "fake".
+"""
+
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from netwalk.asynccli import TRANSPORTS, AsyncCLI, AuthenticationError
+
+try:
+    import asyncssh
+except ImportError:
+    asyncssh = None
+
+INVALID = "                       ^\n% Invalid input detected at '^' marker.\n"
+
+IAC, WILL, ECHO, SGA = 255, 251, 1, 3
+
+SHOW_VERSION = """Cisco IOS Software, C2960X Software (C2960X-UNIVERSALK9-M), Version 15.2(2)E7, RELEASE SOFTWARE (fc3)
+Technical Support: http://www.cisco.com/techsupport
+Copyright (c) 1986-2017 by Cisco Systems, Inc.
+
+ROM: Bootstrap program is C2960X boot loader
+
+{hostname} uptime is 1 year, 2 weeks, 3 days, 4 hours, 5 minutes
+System returned to ROM by power-on
+System image file is "flash:c2960x-universalk9-mz.152-2.E7.bin"
+
+cisco WS-C2960X-48FPD-L (APM86XXX) processor (revision B0) with 524288K bytes of memory.
+Processor board ID {serial}
+Base ethernet MAC Address       : {mac}
+"""
+
+CDP_ENTRY = """-------------------------
+Device ID: {hostname}
+Entry address(es):
+  IP address: {address}
+Platform: {platform},  Capabilities: Switch IGMP
+Interface: {local_port},  Port ID (outgoing port): {remote_port}
+Holdtime : 150 sec
+
+Version :
+Cisco IOS Software, C2960X Software (C2960X-UNIVERSALK9-M), Version 15.2(2)E7, RELEASE SOFTWARE (fc3)
+
+advertisement version: 2
+Native VLAN: 1
+Duplex: full
+
+"""
+
+SHOW_INTERFACE = """{name} is up, line protocol is up (connected)
+  Hardware is Gigabit Ethernet, address is 0011.2233.{num:04x} (bia 0011.2233.{num:04x})
+  MTU 1500 bytes, BW 1000000 Kbit/sec, DLY 10 usec,
+  Full-duplex, 1000Mb/s, media type is 10/100/1000BaseTX
+  Last input 00:00:01, output 00:00:02, output hang never
+  Last clearing of "show interface" counters never
+  Input queue: 0/75/0/0 (size/max/drops/flushes); Total output drops: 0
+     1000 packets input, 64000 bytes, 0 no buffer
+     Received 10 broadcasts (5 multicasts)
+     0 input errors, 0 CRC, 0 frame, 0 overrun, 0 ignored
+     2000 packets output, 128000 bytes, 0 underruns
+     0 output errors, 0 collisions, 0 interfaces resets
+"""
+
+
+class FakeDevice():
+    """
+    An IOS switch with ports GigabitEthernet1/0/1 to ports
+
+    neighbors: list of (local port, FakeDevice, remote port)
+    """
+
+    def __init__(self,
+                 hostname: str,
+                 address: str,
+                 ports: int = 4,
+                 username: str = "cisco",
+                 password: str = "cisco",
+                 domain: str = "example.com",
+                 platform: str = "cisco WS-C2960X-48FPD-L",
+                 delay: float = 0.0,
+                 serial: Optional[str] = None):
+        self.hostname = hostname
+        self.address = address
+        self.ports = ports
+        self.username = username
+        self.password = password
+        self.domain = domain
+        self.platform = platform
+        self.serial = serial or "FOC" + hostname.upper()
+        # Seconds taken by every command
+        self.delay = delay
+        self.neighbors: List[Tuple[str, 'FakeDevice', str]] = []
+        self.commands: List[str] = []
+        self.logins = 0
+
+    @property
+    def fqdn(self) -> str:
+        return f"{self.hostname}.{self.domain}"
+
+    @property
+    def prompt(self) -> str:
+        return self.hostname + "#"
+
+    def port(self, num: int) -> str:
+        return f"GigabitEthernet1/0/{num}"
+
+    def connect(self, local: int, other: 'FakeDevice', remote: int):
+        "Cable port local to port remote of other, both ways"
+        self.neighbors.append((self.port(local), other, other.port(remote)))
+        other.neighbors.append((other.port(remote), self, self.port(local)))
+
+    def outputs(self) -> Dict[str, str]:
+        ports = [self.port(x) for x in range(1, self.ports + 1)]
+        config = ["Building configuration...", "", "Current configuration : 1234 bytes", "!",
+                  f"hostname {self.hostname}", "!"]
+        for port in ports:
+            config += [f"interface {port}", " switchport mode trunk", "!"]
+        config += ["interface Vlan1", f" ip address {self.address} 255.0.0.0", "!", "end"]
+
+        ip_brief = ["Interface              IP-Address      OK? Method Status                Protocol",
+                    f"Vlan1                  {self.address:<15} YES NVRAM  up                    up"]
+        ip_brief += [f"{x:<22} unassigned      YES unset  up                    up" for x in ports]
+
+        mac_table = ["          Mac Address Table",
+                     "-------------------------------------------",
+                     "",
+                     "Vlan    Mac Address       Type        Ports",
+                     "----    -----------       --------    -----"]
+        for num, port in enumerate(ports, 1):
+            mac_table.append(f"   1    00aa.{self.address.split('.')[-1]:0>4}.{num:04x}    DYNAMIC     "
+                             + port.replace("GigabitEthernet", "Gi"))
+        mac_table.append(f"Total Mac Addresses for this criterion: {len(ports)}")
+
+        chassis_mac = "001122" + "".join(f"{int(x):02x}" for x in self.address.split('.')[1:])
+        chassis_mac = ".".join(chassis_mac[x:x + 4] for x in range(0, 12, 4))
+        interfaces = "".join(SHOW_INTERFACE.format(name=x, num=num) for num, x in enumerate(ports, 1))
+        cdp = "".join(CDP_ENTRY.format(hostname=other.fqdn, address=other.address, platform=other.platform,
+                                       local_port=local, remote_port=remote)
+                      for local, other, remote in self.neighbors)
+
+        return {
+            "terminal length 0": "",
+            "terminal width 511": "",
+            "show version": SHOW_VERSION.format(hostname=self.hostname, serial=self.serial, mac=chassis_mac),
+            "show hosts": f"Default domain is {self.domain}\nName/address lookup uses static mappings\n",
+            "show ip interface brief": "\n".join(ip_brief),
+            "show run": "\n".join(config),
+            "show mac-address-table": INVALID,
+            "show mac address-table": "\n".join(mac_table),
+            "show interfaces": interfaces,
+            "show interface summary": INVALID,
+            "show cdp neigh detail": cdp,
+            "show vtp status": "VTP Version capable             : 1 to 3\nVTP Operating Mode                : Transparent\n",
+            "show vlan all-ports": ("VLAN Name                             Status    Ports\n"
+                                    "---- -------------------------------- --------- -------------------------------\n"
+                                    "1    default                          active    \n"),
+            "show ip interface": f"Vlan1 is up, line protocol is up\n  Internet address is {self.address}/8\n",
+            "show ipv6 interface": INVALID,
+            "show arp | exclude Incomplete": "Protocol  Address          Age (min)  Hardware Addr   Type   Interface\n",
+        }
+
+    def run(self, command: str) -> str:
+        self.commands.append(command)
+        try:
+            return self.outputs()[command]
+        except KeyError:
+            return INVALID
+
+
+class FakeCLI(AsyncCLI):
+    """
+    Transport talking to the FakeDevices in devices, by address, in memory
+
+    Only the command delay is simulated
+    """
+
+    devices: Dict[str, FakeDevice] = {}
+
+    async def _connect(self):
+        try:
+            self.device = self.devices[self.host]
+        except KeyError:
+            raise ConnectionRefusedError(f"No fake device at {self.host}")
+
+        if (self.username, self.password) != (self.device.username, self.device.password):
+            raise AuthenticationError(f"Authentication failed on {self.host}")
+
+        self.device.logins += 1
+
+    async def _login(self) -> str:
+        return self.device.prompt
+
+    async def _read(self) -> str:
+        raise ConnectionError("Fake devices answer send_command directly")
+
+    def _write(self, text: str):
+        pass
+
+    async def _disconnect(self):
+        pass
+
+    async def send_command(self, command: str) -> str:
+        if self.device.delay:
+            await asyncio.sleep(self.device.delay)
+        return self.device.run(command).rstrip("\n")
+
+
+TRANSPORTS['fake'] = FakeCLI
+
+
+class FakeNetwork():
+    """
+    Serve FakeDevices on telnet and, if asyncssh is installed, SSH
+
+    All devices listen on the same ports, on their own address
+    """
+
+    def __init__(self, devices: List[FakeDevice]):
+        self.devices = devices
+        self.telnet_port: Optional[int] = None
+        self.ssh_port: Optional[int] = None
+        self._servers = []
+
+    async def start(self, telnet: bool = True, ssh: bool = False):
+        if telnet:
+            for device in self.devices:
+                server = await asyncio.start_server(lambda r, w, d=device: self._telnet(d, r, w),
+                                                    device.address, self.telnet_port or 0)
+                self.telnet_port = server.sockets[0].getsockname()[1]
+                self._servers.append(server)
+
+        if ssh:
+            key = asyncssh.generate_private_key('ssh-ed25519')
+            for device in self.devices:
+                server = await asyncssh.create_server(lambda d=device: _SSHServer(d),
+                                                      device.address, self.ssh_port or 0,
+                                                      server_host_keys=[key],
+                                                      process_factory=lambda p, d=device: self._ssh(d, p))
+                self.ssh_port = server.sockets[0].getsockname()[1]
+                self._servers.append(server)
+
+    async def stop(self):
+        for server in self._servers:
+            server.close()
+        for server in self._servers:
+            await server.wait_closed()
+        self._servers = []
+
+    async def __aenter__(self) -> 'FakeNetwork':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.stop()
+
+    @staticmethod
+    async def _readline(reader: asyncio.StreamReader) -> Optional[str]:
+        line = b""
+        while True:
+            byte = await reader.read(1)
+            if not byte:
+                return None
+            if byte[0] == IAC:
+                await reader.read(2)
+                continue
+            if byte == b"\n":
+                return line.decode().strip("\r\x00")
+            line += byte
+
+    async def _cli(self, device: FakeDevice, readline, write):
+        write(f"\n{device.prompt}")
+        while True:
+            command = await readline()
+            if command is None or command.strip() in ("exit", "quit"):
+                return
+            if device.delay:
+                await asyncio.sleep(device.delay)
+            output = device.run(command.strip())
+            write(output + ("\n" if output and not output.endswith("\n") else "") + device.prompt)
+
+    async def _telnet(self, device: FakeDevice, reader, writer):
+        def write(text):
+            writer.write(text.replace("\n", "\r\n").encode())
+
+        try:
+            writer.write(bytes((IAC, WILL, ECHO, IAC, WILL, SGA)))
+            for _ in range(3):
+                write("\nUser Access Verification\n\nUsername: ")
+                username = await self._readline(reader)
+                write((username or "") + "\nPassword: ")
+                password = await self._readline(reader)
+                if username is None or password is None:
+                    return
+                if (username, password) == (device.username, device.password):
+                    break
+                write("\n% Login invalid\n")
+            else:
+                return
+
+            device.logins += 1
+
+            async def readline():
+                line = await self._readline(reader)
+                if line is not None:
+                    # The device echoes what it reads
+                    write(line + "\n")
+                return line
+
+            await self._cli(device, readline, write)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _ssh(self, device: FakeDevice, process):
+        device.logins += 1
+
+        async def readline():
+            try:
+                line = await process.stdin.readline()
+            except (asyncssh.BreakReceived, asyncssh.TerminalSizeChanged):
+                return None
+            return line if line else None
+
+        def write(text):
+            process.stdout.write(text.replace("\n", "\r\n"))
+
+        try:
+            await self._cli(device, readline, write)
+        except (ConnectionError, asyncssh.Error):
+            pass
+        finally:
+            process.exit(0)
+
+
+if asyncssh is not None:
+    class _SSHServer(asyncssh.SSHServer):
+        def __init__(self, device: FakeDevice):
+            self.device = device
+
+        def begin_auth(self, username: str) -> bool:
+            return True
+
+        def password_auth_supported(self) -> bool:
+            return True
+
+        def validate_password(self, username: str, password: str) -> bool:
+            return (username, password) == (self.device.username, self.device.password)
@@ -0,0 +1,356 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import datetime as dt
+import os
+import socket
+import tempfile
+import time
+import unittest
+from unittest import mock
+from netwalk import Fabric, Interface, Switch
+from netwalk.asynccli import (IOS_COMMANDS, AsyncCLI, AuthenticationError, HostUnreachable, SSHCLI, TelnetCLI,
+                              asyncssh, preflight, transport_port)
+from netwalk.fabric import _parse_switch_outputs
+
+from .fakedevice import FakeCLI, FakeDevice, FakeNetwork
+
+
+def build_network():
+    """
+        sw1 --- sw2 --- sw3
+         |       |
+        sw4     ap5 (AIR, not discovered)
+    """
+    devices = [FakeDevice(f"sw{x}", f"127.0.0.{100 + x}") for x in range(1, 5)]
+    sw1, sw2, sw3, sw4 = devices
+    ap5 = FakeDevice("ap5", "127.0.0.105", platform="cisco AIR-AP2802I-E-K9")
+    sw1.connect(1, sw2, 1)
+    sw2.connect(2, sw3, 1)
+    sw1.connect(2, sw4, 1)
+    sw2.neighbors.append((sw2.port(3), ap5, "GigabitEthernet0"))
+    return devices
+
+
+class TestAsyncCLI(unittest.TestCase):
+    def test_incomplete_transport(self):
+        class NoRead(AsyncCLI):
+            async def _connect(self):
+                pass
+
+            def _write(self, text):
+                pass
+
+            async def _disconnect(self):
+                pass
+
+        with self.assertRaises(TypeError):
+            NoRead("127.0.0.1", "cisco", "cisco")
+
+
+class TestTelnetCLI(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.device = FakeDevice("sw1", "127.0.0.101")
+        self.network = FakeNetwork([self.device])
+        await self.network.start()
+
+    async def asyncTearDown(self):
+        await self.network.stop()
+
+    async def test_send_command(self):
+        async with TelnetCLI("127.0.0.101", "cisco", "cisco", port=self.network.telnet_port) as cli:
+            assert cli.prompt == "sw1#"
+            output = await cli.send_command("show hosts")
+
+        assert output == self.device.outputs()["show hosts"].rstrip("\n")
+        assert self.device.commands == ["terminal length 0", "terminal width 511", "show hosts"]
+
+    async def test_collect(self):
+        async with TelnetCLI("127.0.0.101", "cisco", "cisco", port=self.network.telnet_port) as cli:
+            outputs = await cli.collect(["show run", "show version"])
+
+        assert outputs["show run"].endswith("end")
+        assert "sw1 uptime is" in outputs["show version"]
+
+    async def test_wrong_password(self):
+        cli = TelnetCLI("127.0.0.101", "cisco", "wrong", port=self.network.telnet_port)
+        with self.assertRaises(AuthenticationError):
+            await cli.open()
+
+    def test_negotiate(self):
+        class Writer():
+            data = b""
+
+            def write(self, data):
+                self.data += data
+
+        cli = TelnetCLI("127.0.0.101", "cisco", "cisco")
+        cli._writer = Writer()
+        cli._pending = b""
+
+        # Option split between two reads
+        assert cli._negotiate(b"ab\xff\xfb\x01c\xff\xfd") == b"abc"
+        assert cli._negotiate(b"\x18d\xff\xffe") == b"d\xffe"
+        assert cli._writer.data == b"\xff\xfd\x01\xff\xfc\x18"
+
+
+@unittest.skipIf(asyncssh is None, "asyncssh not installed")
+class TestSSHCLI(unittest.IsolatedAsyncioTestCase):
+    async def test_send_command(self):
+        device = FakeDevice("sw1", "127.0.0.101")
+        network = FakeNetwork([device])
+        await network.start(telnet=False, ssh=True)
+        try:
+            async with SSHCLI("127.0.0.101", "cisco", "cisco", port=network.ssh_port) as cli:
+                output = await cli.send_command("show version")
+
+            assert "sw1 uptime is" in output
+            assert not output.startswith("show version")
+
+            with self.assertRaises(AuthenticationError):
+                await SSHCLI("127.0.0.101", "cisco", "wrong", port=network.ssh_port).open()
+        finally:
+            await network.stop()
+
+
+class TestAsyncDiscovery(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.devices = build_network()
+        self.network = FakeNetwork(self.devices)
+        await self.network.start()
+        self.args = [{'transport': 'telnet', 'port': self.network.telnet_port}]
+
+    async def asyncTearDown(self):
+        await self.network.stop()
+
+    async def test_discovery(self):
+        fabric = Fabric()
+        await fabric.async_init_from_seed_device(["127.0.0.101"],
+                                                 [("cisco", "cisco")],
+                                                 self.args,
+                                                 timeout=5)
+
+        assert sorted(fabric.switches) == [f"sw{x}.example.com" for x in range(1, 5)]
+        assert all(isinstance(fabric.discovery_status[x.address], dt.datetime) for x in self.devices)
+        assert "127.0.0.105" not in fabric.discovery_status
+        assert all(x.logins == 1 for x in self.devices)
+
+        sw1 = fabric.switches["sw1.example.com"]
+        assert isinstance(sw1, Switch)
+        assert sw1.facts['hostname'] == "sw1"
+        assert sw1.interfaces["GigabitEthernet1/0/1"].mac_count == 1
+
+        # Links are found like with the threaded discovery
+        peer = sw1.interfaces["GigabitEthernet1/0/1"].neighbors[0]
+        assert isinstance(peer, Interface)
+        assert peer.switch is fabric.switches["sw2.example.com"]
+        assert peer.name == "GigabitEthernet1/0/1"
+
+    async def test_failures(self):
+        # Neighbor sw4 does not accept the credentials
+        self.devices[3].password = "other"
+        fabric = Fabric()
+        await fabric.async_init_from_seed_device(["127.0.0.101", "127.0.0.199"],
+                                                 [("cisco", "wrong"), ("cisco", "cisco")],
+                                                 self.args,
+                                                 timeout=5)
+
+        assert sorted(fabric.switches) == [f"sw{x}.example.com" for x in range(1, 4)]
+        assert fabric.discovery_status["127.0.0.104"] == "Failed"
+        # Nothing listening, no login attempted
+        assert fabric.discovery_status["127.0.0.199"] == "Unreachable"
+        assert "127.0.0.199" not in fabric.failure_cache
+
+    async def test_preflight(self):
+        args = [{'transport': 'ssh', 'port': self.network.telnet_port + 1}] + self.args
+        fabric = Fabric()
+        await fabric.async_init_from_seed_device(["127.0.0.101"], [("cisco", "cisco")], args, timeout=5)
+
+        assert len(fabric.switches) == 4
+        # SSH port closed, telnet tried first
+        assert fabric.login_cache.stats['failed_attempts'] == 0
+
+    def test_engine_option(self):
+        with self.assertRaises(ValueError):
+            Fabric().init_from_seed_device(["127.0.0.101"], [("cisco", "cisco")], engine="fibers")
+
+
+class TestPipelinedDiscovery(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.devices = build_network()
+        FakeCLI.devices = {x.address: x for x in self.devices}
+        self.args = [{'transport': 'fake'}]
+
+    async def asyncTearDown(self):
+        FakeCLI.devices = {}
+
+    def summary(self, fabric):
+        return {name: (switch.facts['hostname'],
+                       sorted(switch.interfaces),
+                       [x.mac_count for x in switch.interfaces.values()],
+                       sorted(str(x) for x in switch.mac_table))
+                for name, switch in fabric.switches.items()}
+
+    async def test_same_as_threads(self):
+        threads = Fabric()
+        await threads.async_init_from_seed_device(["127.0.0.101"], [("cisco", "cisco")], self.args)
+
+        processes = Fabric()
+        await processes.async_init_from_seed_device(["127.0.0.101"], [("cisco", "cisco")], self.args,
+                                                    parse_processes=2)
+
+        assert sorted(processes.switches) == [f"sw{x}.example.com" for x in range(1, 5)]
+        assert self.summary(processes) == self.summary(threads)
+
+        sw1 = processes.switches["sw1.example.com"]
+        assert sw1.parse_cache is processes.parse_cache
+        peer = sw1.interfaces["GigabitEthernet1/0/1"].neighbors[0]
+        assert peer.switch is processes.switches["sw2.example.com"]
+
+    async def test_missing_output(self):
+        commands = tuple(x for x in IOS_COMMANDS if x != "show vtp status")
+        with mock.patch('netwalk.fabric.IOS_COMMANDS', commands):
+            fabric = Fabric()
+            await fabric.async_init_from_seed_device(["127.0.0.101"], [("cisco", "cisco")], self.args,
+                                                     parse_processes=1)
+
+        assert len(fabric.switches) == 4
+        # Logged in again to get the missing output
+        assert all(x.logins == 2 for x in self.devices[:4])
+        assert all(x.commands.count("show vtp status") == 1 for x in self.devices[:4])
+
+    def test_parse_switch_outputs(self):
+        outputs = self.devices[0].outputs()
+        del outputs["show vtp status"]
+        assert _parse_switch_outputs("127.0.0.101", outputs, "sw1#", {}) == "show vtp status"
+
+        outputs["show vtp status"] = self.devices[0].run("show vtp status")
+        switch = _parse_switch_outputs("127.0.0.101", outputs, "sw1#", {})
+        assert switch.facts['hostname'] == "sw1"
+        assert switch.session is None
+
+
+class TestWarmStart(unittest.TestCase):
+    def setUp(self):
+        # sw1 - sw2 - sw3 - sw4 - sw5, 4 hops of CDP from the seed
+        self.devices = [FakeDevice(f"sw{x}", f"127.0.0.{100 + x}", delay=0.02) for x in range(1, 6)]
+        for left, right in zip(self.devices, self.devices[1:]):
+            left.connect(2, right, 1)
+        FakeCLI.devices = {x.address: x for x in self.devices}
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "snapshot.json")
+
+    def tearDown(self):
+        FakeCLI.devices = {}
+        self.tmp.cleanup()
+
+    def discover(self, credentials, **kwargs):
+        fabric = Fabric()
+        start = time.perf_counter()
+        fabric.init_from_seed_device(["127.0.0.101"], credentials, [{'transport': 'fake'}],
+                                     engine="asyncio", **kwargs)
+        return fabric, time.perf_counter() - start
+
+    def test_warm_start(self):
+        credentials = [("cisco", "wrong"), ("cisco", "cisco")]
+        fabric, cold = self.discover(credentials)
+        assert len(fabric.switches) == 5
+        fabric.save_snapshot(self.path)
+
+        fabric, warm = self.discover(credentials, snapshot=self.path)
+        assert len(fabric.switches) == 5
+        assert fabric.disappeared == {}
+        # All switches at once, with the right login
+        assert warm < cold / 2
+        assert set(fabric.previous_collect_times) == {x.address for x in self.devices}
+        assert fabric.login_cache.stats['failed_attempts'] == 0
+
+    def test_new_and_disappeared(self):
+        fabric, _ = self.discover([("cisco", "cisco")])
+        fabric.save_snapshot(self.path)
+
+        # sw5 is gone, sw6 is new behind sw4
+        del FakeCLI.devices["127.0.0.105"]
+        sw6 = FakeDevice("sw6", "127.0.0.106")
+        self.devices[3].connect(3, sw6, 1)
+        FakeCLI.devices[sw6.address] = sw6
+
+        fabric, _ = self.discover([("cisco", "cisco")], snapshot=self.path)
+        assert "sw6.example.com" in fabric.switches
+        assert fabric.disappeared == {"sw5.example.com": "127.0.0.105"}
+        assert fabric.discovery_status["127.0.0.105"] == "Failed"
+
+
+class TestPreflight(unittest.TestCase):
+    def setUp(self):
+        self.server = socket.socket()
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen()
+        self.open_port = self.server.getsockname()[1]
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_transport_port(self):
+        assert transport_port(None) == 22
+        assert transport_port({'transport': 'telnet'}) == 23
+        assert transport_port({'transport': 'ssh', 'port': 2222}) == 2222
+        assert transport_port({'transport': 'fake'}) is None
+        assert transport_port({'transport': 'nxos_ssh'}) is None
+
+    def test_preflight(self):
+        args = [{'port': 1}, {'transport': 'telnet', 'port': self.open_port}, {'transport': 'fake'}]
+        assert asyncio.run(preflight("127.0.0.1", args, 1)) == args[1:]
+
+        with self.assertRaises(HostUnreachable):
+            asyncio.run(preflight("127.0.0.1", args[:1], 1))
+
+    def test_fabric_preflight(self):
+        fabric = Fabric()
+        args = [{'port': 1}, {'transport': 'telnet', 'port': self.open_port}]
+        reachable = fabric._preflight(["127.0.0.1", "127.0.0.2"], args, 1)
+
+        assert reachable == {"127.0.0.1": args[1:]}
+        assert fabric.discovery_status == {"127.0.0.2": "Unreachable"}
+        # A missed port check is not a failure to remember
+        assert "127.0.0.2" not in fabric.failure_cache
+        assert fabric._preflight(["127.0.0.2"], args, 0) == {"127.0.0.2": args}
+
+    def test_threads_default_off(self):
+        fabric = Fabric()
+        with mock.patch.object(Fabric, "add_switch", side_effect=ConnectionError("refused")), \
+                mock.patch.object(Fabric, "_preflight", autospec=True,
+                                  side_effect=lambda self, hosts, args, timeout: {x: args for x in hosts}) as check:
+            fabric.init_from_seed_device(["127.0.0.2"], [("cisco", "cisco")])
+
+        assert check.call_args[0][3] == 0
+        assert fabric.discovery_status == {"127.0.0.2": "Failed"}
+
+    def test_preflight_in_event_loop(self):
+        fabric = Fabric()
+        args = [{'port': 1}, {'transport': 'telnet', 'port': self.open_port}]
+
+        async def main():
+            return fabric._preflight(["127.0.0.1"], args, 1)
+
+        assert asyncio.run(main()) == {"127.0.0.1": args[1:]}
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import datetime as dt
+import os
+import pickle
+import tempfile
+import unittest
+from netwalk import Checkpoint, Fabric, Switch
+
+from .fakedevice import FakeCLI, FakeDevice
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "discovery.checkpoint")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_record(self):
+        checkpoint = Checkpoint(self.path)
+        switch = Switch("10.0.0.1", facts={'fqdn': "sw1.example.com", 'hostname': "sw1"})
+        switch.on_facts = print
+        checkpoint.record({"10.0.0.1": "Queued"})
+        checkpoint.record({"10.0.0.1": dt.datetime.now(), "10.0.0.2": "Queued", "10.0.0.3": "Queued"},
+                          switch, {"10.0.0.2": {'hops': 1}})
+        checkpoint.record({"10.0.0.2": "Failed"})
+        checkpoint.close()
+
+        loaded = Checkpoint(self.path)
+        assert loaded.records == 3
+        assert loaded.pending == ["10.0.0.3"]
+        assert loaded.hosts == {"10.0.0.2": {'hops': 1}}
+        assert loaded.switches["10.0.0.1"].facts['hostname'] == "sw1"
+        assert loaded.switches["10.0.0.1"].on_facts is None
+
+    def test_pickle(self):
+        checkpoint = Checkpoint(self.path)
+        checkpoint.record({"10.0.0.1": "Queued"})
+
+        restored = pickle.loads(pickle.dumps(checkpoint))
+        assert restored.pending == ["10.0.0.1"]
+        checkpoint.close()
+        restored.record({"10.0.0.1": "Failed"})
+        restored.close()
+        assert Checkpoint(self.path).records == 2
+
+    def test_partial_record(self):
+        checkpoint = Checkpoint(self.path)
+        checkpoint.record({"10.0.0.1": "Queued"})
+        checkpoint.record({"10.0.0.1": "Failed"})
+        checkpoint.close()
+        size = os.path.getsize(self.path)
+        os.truncate(self.path, size - 5)
+
+        loaded = Checkpoint(self.path)
+        assert loaded.records == 1
+        assert loaded.pending == ["10.0.0.1"]
+        # Appends after the last good record
+        loaded.record({"10.0.0.1": "Unreachable"})
+        loaded.close()
+        assert Checkpoint(self.path).status == {"10.0.0.1": "Unreachable"}
+
+    def test_not_a_checkpoint(self):
+        with open(self.path, 'w') as checkfile:
+            checkfile.write("{}")
+        with self.assertRaises(ValueError):
+            Checkpoint(self.path)
+
+    def test_clear(self):
+        checkpoint = Checkpoint(self.path)
+        checkpoint.record({"10.0.0.1": "Queued"})
+        checkpoint.clear()
+        assert len(checkpoint) == 0
+        assert not os.path.exists(self.path)
+
+
+class _Interrupted(Exception):
+    pass
+
+
+class _CrashingFabric(Fabric):
+    "Stops after crash_after switches, like a killed discovery"
+
+    def __init__(self, crash_after: int):
+        super().__init__()
+        self.crash_after = crash_after
+
+    def _discovery_done(self, ticket, swobject, error=None):
+        queued = super()._discovery_done(ticket, swobject, error)
+        if len(self.switches) == self.crash_after:
+            raise _Interrupted()
+        return queued
+
+
+class TestResume(unittest.TestCase):
+    def setUp(self):
+        # sw1 - sw2 - sw3 - sw4 - sw5
+        self.devices = [FakeDevice(f"sw{x}", f"127.0.0.{100 + x}") for x in range(1, 6)]
+        for left, right in zip(self.devices, self.devices[1:]):
+            left.connect(2, right, 1)
+        FakeCLI.devices = {x.address: x for x in self.devices}
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "discovery.checkpoint")
+
+    def tearDown(self):
+        FakeCLI.devices = {}
+        self.tmp.cleanup()
+
+    def discover(self, fabric, engine="asyncio"):
+        fabric.init_from_seed_device(["127.0.0.101"], [("cisco", "cisco")], [{'transport': 'fake'}],
+                                     engine=engine, preflight_timeout=0, checkpoint=self.path)
+        return fabric
+
+    def test_resume(self):
+        crashed = _CrashingFabric(3)
+        with self.assertRaises(_Interrupted):
+            self.discover(crashed)
+        crashed.checkpoint.close()
+
+        fabric = self.discover(Fabric())
+        assert len(fabric.switches) == 5
+        # Only the switches left are logged in to again
+        assert [x.logins for x in self.devices] == [1, 1, 1, 1, 1]
+        assert fabric.discovery_status["127.0.0.104"] != "Queued"
+        assert fabric.hops["127.0.0.105"] == 4
+        assert fabric.switches["sw1.example.com"].interfaces["GigabitEthernet1/0/2"].neighbors[0].device \
+            is fabric.switches["sw2.example.com"]
+
+    def test_finished(self):
+        self.discover(Fabric())
+        fabric = self.discover(Fabric())
+        assert len(fabric.switches) == 5
+        assert [x.logins for x in self.devices] == [1, 1, 1, 1, 1]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,7 +16,13 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+import copyreg
+import os
+import pickle
+import tempfile
 import unittest
+from unittest import mock
+from netaddr import EUI
 from netwalk import Fabric, Switch, Interface
 
 
@@ -85,6 +91,62 @@ class TestFabricBase(unittest.TestCase):
         assert f.switches['D'].interfaces['GigabitEthernet0/0'].neighbors[0] == f.switches['C'].interfaces['GigabitEthernet0/0']
         assert f.switches['D'].interfaces['GigabitEthernet0/1'].neighbors[0] == f.switches['B'].interfaces['GigabitEthernet0/1']
 
+    def test_link_names(self):
+        """
+        CDP names with other case, cut at 40 characters, with serial or
+        without domain still join, the rest is reported
+        """
+        f = Fabric()
+        long_name = "a-very-long-switch-name-over-forty-chars.example.com"
+        a = Switch(hostname="A", facts={'hostname': 'A', 'fqdn': 'A.example.com'})
+        b = Switch(hostname="B", facts={'hostname': 'b-long', 'fqdn': long_name})
+        c = Switch(hostname="C", facts={'hostname': 'nx1', 'fqdn': 'nx1.example.com'})
+        f.switches = {'A.example.com': a, long_name: b, 'nx1.example.com': c}
+
+        a.interfaces = {f'GigabitEthernet0/{x}': Interface(name=f'GigabitEthernet0/{x}', switch=a,
+                                                          neighbors=[{'hostname': name, 'remote_int': port}])
+                        for x, (name, port) in enumerate([(long_name[:40], 'GigabitEthernet0/0'),
+                                                          ('NX1(FOX1234ABCD)', 'Ethernet1/1'),
+                                                          ('nx1', 'Ethernet1/9'),
+                                                          ('phone.example.com', 'Port 1')])}
+        b.interfaces = {'GigabitEthernet0/0': Interface(name='GigabitEthernet0/0', switch=b,
+                                                        neighbors=[{'hostname': 'a.example.com',
+                                                                    'remote_int': 'GigabitEthernet0/0'}])}
+        c.interfaces = {'Ethernet1/1': Interface(name='Ethernet1/1', switch=c, neighbors=[])}
+
+        unresolved = f._find_links()
+        assert a.interfaces['GigabitEthernet0/0'].neighbors[0] is b.interfaces['GigabitEthernet0/0']
+        assert b.interfaces['GigabitEthernet0/0'].neighbors[0] is a.interfaces['GigabitEthernet0/0']
+        assert a.interfaces['GigabitEthernet0/1'].neighbors[0] is c.interfaces['Ethernet1/1']
+        assert c.interfaces['Ethernet1/1'].neighbors == [a.interfaces['GigabitEthernet0/1']]
+
+        assert [(x['interface'], x['reason']) for x in unresolved] == [('GigabitEthernet0/2', "unknown interface"),
+                                                                      ('GigabitEthernet0/3', "unknown switch")]
+        assert f.unresolved_links == unresolved
+
+    def test_link_names_same_prefix(self):
+        "Full CDP names join the right switch, a name cut at 40 characters shared by two is reported"
+        f = Fabric()
+        names = ["datacenter-east-row-12-rack-07-tor-switch-a.example.com",
+                 "datacenter-east-row-12-rack-07-tor-switch-b.example.com"]
+        a = Switch(hostname="A", facts={'hostname': 'A', 'fqdn': 'A.example.com'})
+        tor_a = Switch(hostname="TA", facts={'hostname': 'tor-a', 'fqdn': names[0]})
+        tor_b = Switch(hostname="TB", facts={'hostname': 'tor-b', 'fqdn': names[1]})
+        f.switches = {'A.example.com': a, names[0]: tor_a, names[1]: tor_b}
+
+        a.interfaces = {f'GigabitEthernet0/{x}': Interface(name=f'GigabitEthernet0/{x}', switch=a,
+                                                          neighbors=[{'hostname': name,
+                                                                      'remote_int': 'GigabitEthernet0/1'}])
+                        for x, name in enumerate([names[0], names[1], names[1][:40]])}
+        for tor in (tor_a, tor_b):
+            tor.interfaces = {'GigabitEthernet0/1': Interface(name='GigabitEthernet0/1', switch=tor, neighbors=[])}
+
+        unresolved = f._find_links()
+        assert a.interfaces['GigabitEthernet0/0'].neighbors[0] is tor_a.interfaces['GigabitEthernet0/1']
+        assert a.interfaces['GigabitEthernet0/1'].neighbors[0] is tor_b.interfaces['GigabitEthernet0/1']
+        assert [(x['interface'], x['reason']) for x in unresolved] == [('GigabitEthernet0/2', "ambiguous switch")]
+        assert f._consistency_errors() == []
+
     def test_pathfinding_one_target(self):
         """
         A --- B
@@ -395,6 +457,223 @@ class TestFabricBase(unittest.TestCase):
         assert f.mac_table[pcmac] == {'interface' : c.interfaces['GigabitEthernet0/2']}
         assert c.interfaces['GigabitEthernet0/2'].mac_count == 1
 
+    def test_pickle(self):
+        f = Fabric()
+        a = Switch(hostname="A", facts={'hostname': 'A', 'fqdn': 'A.not set'})
+        a.add_interface(Interface(name='GigabitEthernet0/0', switch=a))
+        f.switches = {'A': a}
+        f.login_cache.record("10.0.0.1", (("admin", "admin"), None), 0)
+        f.failure_cache.record_failure("10.0.0.2", "timeout")
+        f.identities.claim("10.0.0.1", ["name:a"])
+        f.refresh_global_information()
+        f.find_paths(a, [a])
+
+        restored = pickle.loads(pickle.dumps(f))
+        assert list(restored.switches['A'].interfaces) == ['GigabitEthernet0/0']
+        assert restored.login_cache.host_method("10.0.0.1") == f.login_cache.host_method("10.0.0.1")
+        assert "10.0.0.2" in restored.failure_cache
+        assert restored.identities.owner(["name:a"]) == "10.0.0.1"
+        # Locks work again
+        restored.failure_cache.record_failure("10.0.0.3", "timeout")
+        restored.identities.claim("10.0.0.3", ["name:b"])
+
+    def test_unpickle_old_fabric(self):
+        # Fabrics pickled by older versions only had these attributes
+        class OldFabric():
+            def __init__(self, state):
+                self.state = state
+
+            def __reduce_ex__(self, protocol):
+                return (copyreg._reconstructor, (Fabric, object, None), self.state)
+
+        a = Switch(hostname="A", facts={'hostname': 'A', 'fqdn': 'A.not set'})
+        a.add_interface(Interface(name='GigabitEthernet0/0', switch=a))
+        state = {'switches': {'A': a}, 'discovery_status': {'A': "Queued"}, 'mac_table': {}}
+        restored = pickle.loads(pickle.dumps(OldFabric(state)))
+
+        assert list(restored.switches) == ['A']
+        assert restored.discovery_status == {'A': "Queued"}
+        assert len(restored.topology) == 1
+        assert restored.unresolved_links == []
+        restored.refresh_global_information()
+
+
+class TestFabricLoadConfigs(unittest.TestCase):
+    CONFIG = ("hostname {}\n"
+              "ip domain name example.com\n"
+              "!\n"
+              "interface GigabitEthernet0/1\n"
+              " switchport mode access\n"
+              "!\n"
+              "interface GigabitEthernet0/2\n"
+              " switchport mode trunk\n"
+              "!\n"
+              "end\n")
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        for name in ("A", "B", "C"):
+            with open(os.path.join(self.tempdir.name, name + ".cfg"), "w") as configfile:
+                configfile.write(self.CONFIG.format(name))
+
+        # No hostname, use file name
+        with open(os.path.join(self.tempdir.name, "D.cfg"), "w") as configfile:
+            configfile.write("interface GigabitEthernet0/1\n switchport mode access\n")
+
+        with open(os.path.join(self.tempdir.name, "empty.cfg"), "w") as configfile:
+            pass
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def check(self, f):
+        assert set(f.switches) == {"A.example.com", "B.example.com", "C.example.com", "D", "empty"}
+        assert f.switches["A.example.com"].facts['hostname'] == "A"
+        assert f.switches["A.example.com"].interfaces["GigabitEthernet0/2"].mode == "trunk"
+        assert f.switches["D"].interfaces["GigabitEthernet0/1"].mode == "access"
+        assert len(f.switches["empty"].interfaces) == 0
+        assert len(f.parse_times) == 5
+        assert f.switches["A.example.com"].interfaces["GigabitEthernet0/1"].device is f.switches["A.example.com"]
+
+    def test_load_directory(self):
+        f = Fabric()
+        f.load_configs(self.tempdir.name, workers=1)
+        self.check(f)
+
+    def test_load_own_parse_cache(self):
+        f = Fabric()
+        f.load_configs(self.tempdir.name, workers=1)
+        # A, B and C have the same interfaces
+        assert f.parse_cache.hits >= 4
+        assert len(f.parse_cache) > 0
+
+        # Nothing shared with other fabrics
+        other = Fabric()
+        other.load_configs(self.tempdir.name, workers=1)
+        assert other.parse_cache.misses == f.parse_cache.misses
+
+    def test_load_files_process_pool(self):
+        f = Fabric()
+        files = [os.path.join(self.tempdir.name, x) for x in os.listdir(self.tempdir.name)]
+        switches = f.load_configs(files, workers=2, chunksize=2)
+        assert switches is f.switches
+        self.check(f)
+
+
+
+class TestIncrementalRefresh(unittest.TestCase):
+    """
+    sw0 - sw1 - ... each with 3 hosts on GigabitEthernet0/3, seen by the
+    others on GigabitEthernet0/0 towards sw0 or GigabitEthernet0/1 away from it
+    """
+
+    def build(self, num: int, hosts: int = 3) -> Switch:
+        switch = Switch(f"sw{num}", facts={'hostname': f"sw{num}", 'fqdn': f"sw{num}.example.com"})
+        for port in range(4):
+            switch.add_interface(Interface(name=f"GigabitEthernet0/{port}", switch=switch, neighbors=[]))
+        switch.interfaces["GigabitEthernet0/0"].neighbors = [{'hostname': f"sw{num - 1}.example.com",
+                                                              'remote_int': "GigabitEthernet0/1"}]
+        switch.interfaces["GigabitEthernet0/1"].neighbors = [{'hostname': f"sw{num + 1}.example.com",
+                                                              'remote_int': "GigabitEthernet0/0"}]
+        self.hosts = hosts
+        return switch
+
+    def learn(self, switches: dict):
+        "Give every switch a new MAC table with all hosts"
+        count = len(switches)
+        for num in range(count):
+            switch = switches[f"sw{num}.example.com"]
+            table = {}
+            for other in range(count):
+                port = 3 if other == num else (0 if other < num else 1)
+                for host in range(self.hosts):
+                    table[EUI(f"00:00:00:00:{other:02x}:{host:02x}")] = {
+                        'interface': switch.interfaces[f"GigabitEthernet0/{port}"], 'vlan': 1}
+            switch.mac_table = table
+
+    def setUp(self):
+        self.fabric = Fabric()
+        self.fabric.switches = {f"sw{x}.example.com": self.build(x) for x in range(5)}
+        self.learn(self.fabric.switches)
+        self.fabric.refresh_global_information(check=True)
+
+    def closest(self, num: int) -> Interface:
+        return self.fabric.mac_table[EUI(f"00:00:00:00:{num:02x}:00")]['interface']
+
+    def test_full(self):
+        switches = self.fabric.switches
+        assert switches["sw1.example.com"].interfaces["GigabitEthernet0/0"].neighbors[0] \
+            is switches["sw0.example.com"].interfaces["GigabitEthernet0/1"]
+        assert self.closest(2) is switches["sw2.example.com"].interfaces["GigabitEthernet0/3"]
+        # Ends of the chain
+        assert [(x['switch'], x['reason']) for x in self.fabric.unresolved_links] == \
+            [("sw0.example.com", "unknown switch"), ("sw4.example.com", "unknown switch")]
+        assert not any(x.dirty for x in switches.values())
+
+    def test_add_switch(self):
+        switches = self.fabric.switches
+        switches["sw5.example.com"] = self.build(5)
+        with mock.patch.object(Switch, "index_mac_table", autospec=True,
+                               side_effect=Switch.index_mac_table) as index:
+            self.learn(switches)
+            self.fabric.refresh_global_information(check=True)
+
+        # Every MAC table changed
+        assert index.call_count == 6
+        assert switches["sw4.example.com"].interfaces["GigabitEthernet0/1"].neighbors[0] \
+            is switches["sw5.example.com"].interfaces["GigabitEthernet0/0"]
+        # As close as GigabitEthernet0/1 of sw4, seeing only them
+        assert self.closest(5).mac_count == 3
+        assert self.closest(4) is switches["sw4.example.com"].interfaces["GigabitEthernet0/3"]
+        assert len(self.fabric.unresolved_links) == 2
+
+    def test_only_dirty(self):
+        switches = self.fabric.switches
+        sw2 = switches["sw2.example.com"]
+        # A host moves from sw4 to sw2
+        mac = EUI("00:00:00:00:04:00")
+        for num, switch in enumerate(switches.values()):
+            port = 3 if num == 2 else (0 if num > 2 else 1)
+            switch.mac_table[mac] = {'interface': switch.interfaces[f"GigabitEthernet0/{port}"], 'vlan': 1}
+        for switch in switches.values():
+            switch.mark_dirty("mac_table")
+        self.fabric.refresh_global_information(check=True)
+        assert self.fabric.mac_table[mac]['interface'] is sw2.interfaces["GigabitEthernet0/3"]
+
+        with mock.patch.object(Switch, "index_mac_table", autospec=True,
+                               side_effect=Switch.index_mac_table) as index:
+            sw2.mac_table = dict(sw2.mac_table)
+            self.fabric.refresh_global_information(check=True)
+        assert [x.args[0] for x in index.call_args_list] == [sw2]
+
+    def test_replace_switch(self):
+        switches = self.fabric.switches
+        switches["sw2.example.com"] = self.build(2)
+        self.learn(switches)
+        self.fabric.refresh_global_information(check=True)
+
+        sw2 = switches["sw2.example.com"]
+        assert switches["sw1.example.com"].interfaces["GigabitEthernet0/1"].neighbors[0] \
+            is sw2.interfaces["GigabitEthernet0/0"]
+        assert self.closest(2) is sw2.interfaces["GigabitEthernet0/3"]
+
+    def test_remove_switch(self):
+        del self.fabric.switches["sw4.example.com"]
+        for switch in self.fabric.switches.values():
+            switch.mac_table = {mac: data for mac, data in switch.mac_table.items() if mac.words[4] != 4}
+        self.fabric.refresh_global_information(check=True)
+        assert self.closest(3) is self.fabric.switches["sw3.example.com"].interfaces["GigabitEthernet0/3"]
+
+    def test_check(self):
+        self.fabric.switches["sw1.example.com"].interfaces["GigabitEthernet0/3"].mac_count = 10
+        self.fabric.switches["sw3.example.com"].interfaces["GigabitEthernet0/5"] = Interface(
+            name="GigabitEthernet0/5", neighbors=[{'hostname': "sw2", 'remote_int': "GigabitEthernet0/2"}])
+        with self.assertRaises(AssertionError):
+            self.fabric.refresh_global_information(check=True)
+
+        errors = self.fabric._consistency_errors()
+        assert "GigabitEthernet0/3 of sw1: mac_count 10, expected 3" in errors
+        assert "GigabitEthernet0/5 of sw3.example.com: sw2 GigabitEthernet0/2 not joined" in errors
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,118 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import datetime as dt
+import os
+import tempfile
+import unittest
+from netwalk import Fabric, FailureCache
+
+from .fakedevice import FakeCLI, FakeDevice
+
+
+class TestFailureCache(unittest.TestCase):
+    def test_backoff(self):
+        cache = FailureCache(backoff=10, max_backoff=35)
+        assert not cache.should_skip("10.0.0.1", now=0)
+
+        cache.record_failure("10.0.0.1", "Unreachable", now=0)
+        assert cache.should_skip("10.0.0.1", now=9)
+        assert not cache.should_skip("10.0.0.1", now=10)
+
+        # 20s after the second failure, then 35 instead of 40
+        cache.record_failure("10.0.0.1", "Failed", now=10)
+        assert cache.get("10.0.0.1")['retry_after'] == 30
+        cache.record_failure("10.0.0.1", "Failed", now=30)
+        cache.record_failure("10.0.0.1", "Failed", now=65)
+        assert cache.get("10.0.0.1")['retry_after'] == 100
+        assert cache.get("10.0.0.1")['failures'] == 4
+        assert cache.get("10.0.0.1")['first_failure'] == 0
+        assert cache.skipped == 1
+
+    def test_success(self):
+        cache = FailureCache()
+        cache.record_failure("10.0.0.1", "Failed")
+        cache.record_success("10.0.0.1")
+        assert "10.0.0.1" not in cache
+        assert not cache.should_skip("10.0.0.1")
+
+    def test_ttl(self):
+        cache = FailureCache(backoff=10, ttl=100)
+        cache.record_failure("10.0.0.1", "Failed", now=0)
+        cache.record_failure("10.0.0.1", "Failed", now=10)
+
+        # Failures start again from one
+        cache.record_failure("10.0.0.1", "Failed", now=200)
+        assert cache.get("10.0.0.1")['failures'] == 1
+
+        cache.expire(now=301)
+        assert len(cache) == 0
+
+    def test_save(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "failures.json")
+            cache = FailureCache(path)
+            cache.record_failure("10.0.0.1", "Unreachable: no answer")
+            cache.save()
+
+            loaded = FailureCache(path)
+            assert loaded.get("10.0.0.1")['reason'] == "Unreachable: no answer"
+            assert loaded.should_skip("10.0.0.1")
+
+
+class TestFabricFailureCache(unittest.TestCase):
+    def setUp(self):
+        self.devices = [FakeDevice(f"sw{x}", f"127.0.0.{100 + x}") for x in range(1, 4)]
+        self.devices[0].connect(1, self.devices[1], 1)
+        self.devices[0].connect(2, self.devices[2], 1)
+        # sw3 is advertised but gone
+        FakeCLI.devices = {x.address: x for x in self.devices[:2]}
+
+    def tearDown(self):
+        FakeCLI.devices = {}
+
+    def discover(self, path):
+        fabric = Fabric(failure_cache=FailureCache(path))
+        fabric.init_from_seed_device(["127.0.0.101"], [("cisco", "cisco")], [{'transport': 'fake'}],
+                                     engine="asyncio")
+        return fabric
+
+    def test_skip_dead_neighbor(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "failures.json")
+            fabric = self.discover(path)
+            assert fabric.discovery_status["127.0.0.103"] == "Failed"
+            assert "127.0.0.103" in fabric.failure_cache
+
+            fabric = self.discover(path)
+            assert fabric.discovery_status["127.0.0.103"] == "Skipped"
+            assert isinstance(fabric.discovery_status["127.0.0.102"], dt.datetime)
+            assert fabric.failure_cache.skipped == 1
+
+            # Back online and backoff expired
+            FakeCLI.devices["127.0.0.103"] = self.devices[2]
+            cache = FailureCache(path, backoff=0)
+            fabric = Fabric(failure_cache=cache)
+            fabric.init_from_seed_device(["127.0.0.101"], [("cisco", "cisco")], [{'transport': 'fake'}],
+                                         engine="asyncio")
+            assert len(fabric.switches) == 3
+            assert len(cache) == 0
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import unittest
+from netwalk import Fabric, Switch
+from netwalk.identity import (DuplicateSwitch, IdentityIndex, cdp_keys, facts_keys, normalize_hostname,
+                              show_version_keys)
+
+from .fakedevice import FakeCLI, FakeDevice
+
+LONG_NAME = "access-switch-building-a-floor-3.campus.example.com"
+
+
+class TestIdentityKeys(unittest.TestCase):
+    def test_normalize_hostname(self):
+        assert normalize_hostname("SW1.Example.com") == "sw1.example.com"
+        assert normalize_hostname("N9K-01(FDO12345678)") == "n9k-01"
+        assert normalize_hostname(LONG_NAME) == LONG_NAME
+
+    def test_cdp_keys(self):
+        assert cdp_keys("N9K-01(FDO12345678)") == ["serial:FDO12345678", "name:n9k-01"]
+        # CDP may have cut a name of 40 characters, the prefix key matches the full name
+        assert cdp_keys(LONG_NAME[:40]) == ["name:" + LONG_NAME[:40], "prefix:" + LONG_NAME[:40]]
+        assert facts_keys({'fqdn': LONG_NAME, 'serial_number': "Unknown"}) == \
+            ["name:" + LONG_NAME, "prefix:" + LONG_NAME[:40]]
+        assert cdp_keys(LONG_NAME) == ["name:" + LONG_NAME]
+        assert cdp_keys(LONG_NAME[:40] + "(FDO1)") == ["serial:FDO1", "name:" + LONG_NAME[:40]]
+
+    def test_facts_keys(self):
+        assert facts_keys({'fqdn': "sw1.not set", 'hostname': "sw1", 'serial_number': "foc1"}) == \
+            ["serial:FOC1", "name:sw1"]
+        assert facts_keys({'fqdn': "Unknown", 'hostname': "sw1", 'serial_number': ""}) == ["name:sw1"]
+
+    def test_show_version_keys(self):
+        output = FakeDevice("sw1", "127.0.0.101").outputs()["show version"]
+        assert show_version_keys(output) == ["serial:FOCSW1", "mac:00-11-22-00-00-65"]
+
+
+class TestIdentityIndex(unittest.TestCase):
+    def test_claim(self):
+        index = IdentityIndex()
+        index.claim("10.0.0.1", ["serial:A", "name:sw1"])
+        index.claim("10.0.0.1", ["mac:00-11-22-33-44-55"])
+        assert index.owner(["name:sw1"]) == "10.0.0.1"
+        # Another serial overrides the name
+        assert index.owner(["serial:B", "name:sw1"]) is None
+
+        with self.assertRaises(DuplicateSwitch) as ctx:
+            index.claim("10.9.9.9", ["serial:C", "mac:00-11-22-33-44-55"])
+        assert ctx.exception.owner == "10.0.0.1"
+        # Nothing claimed by the duplicate
+        assert "serial:C" not in index
+
+        index.release("10.0.0.1")
+        assert len(index) == 0
+
+    def test_long_names(self):
+        index = IdentityIndex()
+        first = "datacenter-east-row-12-rack-07-tor-switch-a.example.com"
+        second = "datacenter-east-row-12-rack-07-tor-switch-b.example.com"
+        index.claim("10.0.0.1", facts_keys({'fqdn': first, 'serial_number': "FOC1"}))
+        index.claim("10.0.0.2", facts_keys({'fqdn': second, 'serial_number': "FOC2"}))
+
+        assert index.owner(cdp_keys(second)) == "10.0.0.2"
+        # The cut Device ID could be either
+        assert index.owner(cdp_keys(first[:40])) is None
+
+        with self.assertRaises(DuplicateSwitch):
+            index.claim("10.0.0.3", facts_keys({'fqdn': first, 'serial_number': "FOC1"}))
+
+    def test_on_facts(self):
+        device = FakeDevice("sw1", "127.0.0.101")
+        fabric = Fabric()
+        fabric.identities.claim("127.0.0.111", ["serial:FOCSW1"])
+
+        switch = Switch("127.0.0.101", on_facts=fabric._identity_check("127.0.0.101"))
+        with self.assertRaises(DuplicateSwitch):
+            switch.retrieve_data_from_outputs(device.outputs())
+        # Stopped before show run
+        assert switch.config is None
+
+
+class TestDeduplication(unittest.TestCase):
+    def setUp(self):
+        self.sw1 = FakeDevice("sw1", "127.0.0.101")
+        self.sw2 = FakeDevice("sw2", "127.0.0.102")
+        self.sw1.connect(1, self.sw2, 1)
+        FakeCLI.devices = {"127.0.0.101": self.sw1, "127.0.0.102": self.sw2,
+                           # Loopback of sw1
+                           "127.0.0.111": self.sw1}
+
+    def tearDown(self):
+        FakeCLI.devices = {}
+
+    def discover(self, seeds, **kwargs):
+        fabric = Fabric()
+        fabric.init_from_seed_device(seeds, [("cisco", "cisco")], [{'transport': 'fake'}], engine="asyncio",
+                                     **kwargs)
+        return fabric
+
+    def test_cdp_other_address(self):
+        # sw2 also sees sw1 through its loopback
+        loopback = FakeDevice("sw1", "127.0.0.111")
+        self.sw2.neighbors.append((self.sw2.port(2), loopback, self.sw1.port(2)))
+
+        fabric = self.discover(["127.0.0.101"])
+        assert sorted(fabric.switches) == ["sw1.example.com", "sw2.example.com"]
+        assert "127.0.0.111" not in fabric.discovery_status
+        assert self.sw1.logins == 1
+
+    def test_seed_other_address(self):
+        fabric = self.discover(["127.0.0.101", "127.0.0.111"])
+
+        assert sorted(fabric.switches) == ["sw1.example.com", "sw2.example.com"]
+        assert list(fabric.discovery_status.values()).count("Duplicate") == 1
+        # The second collection stopped after show version
+        assert self.sw1.commands.count("show version") == 2
+        assert self.sw1.commands.count("show run") == 1
+
+    def test_serial_other_name(self):
+        # Same chassis, renamed and reached through the loopback
+        renamed = FakeDevice("sw1-new", "127.0.0.111", serial=self.sw1.serial)
+        FakeCLI.devices["127.0.0.111"] = renamed
+
+        fabric = self.discover(["127.0.0.101", "127.0.0.111"], parse_processes=1)
+        assert len(fabric.switches) == 2
+        assert "Duplicate" in fabric.discovery_status.values()
+
+    def test_long_names(self):
+        # Names the same for the first 40 characters
+        first = FakeDevice("datacenter-east-row-12-rack-07-tor-switch-a", "127.0.0.103", serial="FOC1")
+        second = FakeDevice("datacenter-east-row-12-rack-07-tor-switch-b", "127.0.0.104", serial="FOC2")
+        self.sw1.connect(3, first, 1)
+        self.sw1.connect(4, second, 1)
+        FakeCLI.devices.update({first.address: first, second.address: second})
+
+        fabric = self.discover(["127.0.0.101"])
+        assert first.fqdn in fabric.switches
+        assert second.fqdn in fabric.switches
+        assert "Duplicate" not in fabric.discovery_status.values()
+
+
+if __name__ == '__main__':
+    unittest.main()
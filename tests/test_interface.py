@@ -18,6 +18,8 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import unittest
 import ipaddress
+import copyreg
+import pickle
 import netwalk
 
 
@@ -190,6 +192,121 @@ class TrunkInterfaceTester(unittest.TestCase):
             [1, 2, 3, 4, 5, 7, 8, 9, 10])
 
 
+class DispatchParserTester(unittest.TestCase):
+    def test_mode_after_mode_dependent_lines(self):
+        config = ("interface E0\n"
+                  " switchport trunk native vlan 3\n"
+                  " switchport trunk allowed vlan 1-5\n"
+                  " spanning-tree portfast trunk\n"
+                  " switchport mode trunk\n")
+
+        interface = netwalk.Interface(config=config)
+        assert interface.mode == "trunk"
+        assert interface.native_vlan == 3
+        assert interface.allowed_vlan == {1, 2, 3, 4, 5}
+        assert interface.type_edge
+        assert interface.unparsed_lines == []
+
+    def test_unparsed_lines_order(self):
+        config = ("interface E0\n"
+                  " switchport nonegotiate\n"
+                  " switchport access vlan 3\n"
+                  " no cdp enable\n"
+                  " switchport mode trunk\n")
+
+        interface = netwalk.Interface(config=config)
+        assert interface.native_vlan == 1
+        assert interface.unparsed_lines == ["switchport nonegotiate",
+                                            "switchport access vlan 3",
+                                            "no cdp enable"]
+
+    def test_shutdown_anywhere_in_line(self):
+        config = ("interface E0\n"
+                  " switchport mode access\n"
+                  " storm-control action shutdown\n")
+
+        interface = netwalk.Interface(config=config)
+        assert not interface.is_enabled
+
+    def test_svi_ignores_mode(self):
+        config = ("interface Vlan10\n"
+                  " switchport mode trunk\n"
+                  " ip vrf forwarding antani\n"
+                  " ip address 10.0.0.1 255.255.255.0\n")
+
+        interface = netwalk.Interface(config=config)
+        assert interface.mode == "access"
+        assert interface.native_vlan == 10
+        assert interface.vrf == "antani"
+        assert interface.routed_port
+
+
+class InterfaceLayoutTester(unittest.TestCase):
+    def test_defaults(self):
+        interface = netwalk.Interface(name="E0", mac_count=5)
+
+        assert interface.mode == "access"
+        assert interface.native_vlan == 1
+        assert interface.mac_count == 0
+        assert interface.neighbors == []
+        assert interface.address == {}
+
+    def test_containers_not_shared(self):
+        first = netwalk.Interface(name="E0")
+        second = netwalk.Interface(name="E1")
+
+        first.neighbors.append({'hostname': 'A'})
+        first.unparsed_lines.append("antani")
+        assert second.neighbors == []
+        assert second.unparsed_lines == []
+
+    def test_switch_sets_device(self):
+        switch = netwalk.Switch("sw1")
+        interface = netwalk.Interface(name="E0", switch=switch)
+        assert interface.device is switch
+
+    def test_pickle(self):
+        config = ("interface E0\n"
+                  " switchport mode trunk\n"
+                  " switchport trunk allowed vlan 1-5\n"
+                  " antani mascetti perozzi\n")
+
+        interface = netwalk.Interface(config=config)
+        interface.extra_data = "sblinda"
+        copied = pickle.loads(pickle.dumps(interface))
+
+        assert copied.name == "E0"
+        assert copied.allowed_vlan == {1, 2, 3, 4, 5}
+        assert copied.unparsed_lines == ["antani mascetti perozzi"]
+        assert copied.extra_data == "sblinda"
+
+    def test_unpickle_dict_state(self):
+        # Interfaces pickled before __slots__, at protocol 0 or 1: the class and a plain __dict__
+        class OldInterface():
+            def __init__(self, state):
+                self.state = state
+
+            def __reduce_ex__(self, protocol):
+                return (copyreg._reconstructor, (netwalk.Interface, object, None), self.state)
+
+        state = {'logger': None,
+                 'name': "GigabitEthernet0/1",
+                 'mode': "trunk",
+                 'allowed_vlan': {10, 20},
+                 'neighbors': [],
+                 'speed': 1000}
+        interface = pickle.loads(pickle.dumps(OldInterface(state)))
+
+        assert type(interface) is netwalk.Interface
+        assert interface.name == "GigabitEthernet0/1"
+        assert interface.mode == "trunk"
+        assert isinstance(interface.allowed_vlan, netwalk.VlanSet)
+        assert interface.allowed_vlan == {10, 20}
+        assert interface.speed == 1000
+        assert interface.native_vlan == 1
+        assert 'logger' not in interface.__dict__
+
+
 class TestInterfaceOutString(unittest.TestCase):
     def test_base(self):
         intdata = {'name': 'E0'}
@@ -298,7 +415,7 @@ class TestInterfaceOutString(unittest.TestCase):
         outconfig = ('interface E0\n'
                      ' switchport mode trunk\n'
                      ' switchport trunk native vlan 1\n'
-                     ' switchport trunk allowed vlan 1,2,3\n'
+                     ' switchport trunk allowed vlan 1-3\n'
                      ' no shutdown\n'
                      '!\n')
 
@@ -524,6 +641,25 @@ class TestPortChannel(unittest.TestCase):
         assert interface.parent_interface==po
         assert interface in po.child_interfaces
 
+    def test_po_first(self):
+        po = netwalk.Interface(name="port-channel2")
+        member = netwalk.Interface(name="Ethernet1/1", channel_group=2)
+        other = netwalk.Interface(name="Ethernet1/2", channel_group=3)
+
+        switch = netwalk.Switch(hostname="testswitch")
+        switch.add_interface(po)
+        switch.add_interface(member)
+        switch.add_interface(other)
+
+        assert member.parent_interface is po
+        assert po.child_interfaces == [member]
+        assert other.parent_interface is None
+
+        # Added again, i.e. config parsed again
+        new = netwalk.Interface(name="Ethernet1/1", channel_group=2)
+        switch.add_interface(new)
+        assert po.child_interfaces == [new]
+
 
 if __name__ == '__main__':
     unittest.main()
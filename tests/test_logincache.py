@@ -0,0 +1,144 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import tempfile
+import unittest
+from netwalk import Fabric, LoginCache
+
+from .fakedevice import FakeCLI, FakeDevice
+
+SSH = {'transport': 'ssh'}
+TELNET = {'transport': 'telnet'}
+CREDENTIALS = [("admin", "one"), ("admin", "two")]
+METHODS = [(("admin", "one"), SSH), (("admin", "two"), SSH),
+           (("admin", "one"), TELNET), (("admin", "two"), TELNET)]
+
+
+class TestLoginCache(unittest.TestCase):
+    def test_cold(self):
+        cache = LoginCache()
+        assert cache.order("10.0.0.1", METHODS, credentials=CREDENTIALS) == METHODS
+
+        cache.record("10.0.0.1", METHODS[3], 3, credentials=CREDENTIALS)
+        assert cache.stats == {'hits': 0, 'misses': 0, 'cold': 1, 'failed_attempts': 3}
+
+    def test_scopes(self):
+        cache = LoginCache()
+        cache.record("10.0.0.1", METHODS[3], 3, platform="cisco WS-C2960X", credentials=CREDENTIALS)
+
+        # Same host, subnet and platform
+        assert cache.order("10.0.0.1", METHODS, credentials=CREDENTIALS)[0] == METHODS[3]
+        assert cache.order("10.0.0.2", METHODS, credentials=CREDENTIALS)[0] == METHODS[3]
+        assert cache.order("10.9.0.2", METHODS, platform="cisco WS-C2960X", credentials=CREDENTIALS)[0] == METHODS[3]
+        # Nothing learned
+        assert cache.order("10.9.0.2", METHODS, credentials=CREDENTIALS) == METHODS
+        assert cache.order("switch.example.com", METHODS, credentials=CREDENTIALS) == METHODS
+
+    def test_host_wins(self):
+        cache = LoginCache()
+        for host in ("10.0.0.1", "10.0.0.2", "10.0.0.3"):
+            cache.record(host, METHODS[2], 0, credentials=CREDENTIALS)
+        cache.record("10.0.0.4", METHODS[1], 2, credentials=CREDENTIALS)
+
+        assert cache.order("10.0.0.4", METHODS, credentials=CREDENTIALS)[:2] == [METHODS[1], METHODS[2]]
+        assert cache.order("10.0.0.5", METHODS, credentials=CREDENTIALS)[:2] == [METHODS[2], METHODS[1]]
+
+        # The last method that worked on a host replaces the previous one
+        cache.record("10.0.0.4", METHODS[0], 1, credentials=CREDENTIALS)
+        assert cache.order("10.0.0.4", METHODS, credentials=CREDENTIALS)[0] == METHODS[0]
+
+    def test_stats(self):
+        cache = LoginCache()
+        cache.record("10.0.0.1", METHODS[2], 2, credentials=CREDENTIALS)
+        cache.record("10.0.0.2", METHODS[2], 0, credentials=CREDENTIALS)
+        cache.record("10.0.0.3", METHODS[1], 1, credentials=CREDENTIALS)
+        cache.record_failure(4)
+
+        assert cache.stats == {'hits': 1, 'misses': 1, 'cold': 1, 'failed_attempts': 7}
+
+    def test_save(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "logins.json")
+            cache = LoginCache(path)
+            cache.record("10.0.0.1", METHODS[3], 3, credentials=CREDENTIALS)
+            cache.save()
+
+            with open(path) as cachefile:
+                assert "two" not in cachefile.read()
+
+            loaded = LoginCache(path)
+            assert len(loaded) == 2
+            assert loaded.order("10.0.0.7", METHODS, credentials=CREDENTIALS)[0] == METHODS[3]
+
+    def test_method_id(self):
+        cache = LoginCache()
+        key = cache.method_id(METHODS[1], CREDENTIALS)
+        assert key != cache.method_id(METHODS[0], CREDENTIALS)
+        assert key != cache.method_id(METHODS[3], CREDENTIALS)
+
+        # Nothing depends on passwords, or secrets in optional_args
+        assert key == cache.method_id((("admin", "changed"), SSH), [("admin", "one"), ("admin", "changed")])
+        assert key == cache.method_id((("admin", "two"), dict(SSH, secret="enable")), CREDENTIALS)
+        # Nor on credentials of other users
+        assert key == cache.method_id(METHODS[1], [("other", "x")] + CREDENTIALS)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            # Keys of older versions hashed passwords, they are dropped
+            path = os.path.join(tmp, "logins.json")
+            with open(path, 'w') as cachefile:
+                cachefile.write('{"version": 2, "scopes": {"host:10.0.0.1": {"0011223344556677": 1}}}')
+            assert len(LoginCache(path)) == 0
+
+
+class TestFabricLoginCache(unittest.TestCase):
+    def setUp(self):
+        self.devices = [FakeDevice(f"sw{x}", f"127.0.0.{100 + x}", password="two") for x in range(1, 4)]
+        self.devices[0].connect(1, self.devices[1], 1)
+        self.devices[0].connect(2, self.devices[2], 1)
+        FakeCLI.devices = {x.address: x for x in self.devices}
+        self.credentials = [("cisco", "one"), ("cisco", "two")]
+        self.args = [{'transport': 'telnet', 'port': 1}, {'transport': 'fake'}]
+
+    def tearDown(self):
+        FakeCLI.devices = {}
+
+    def test_learn(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "logins.json")
+            fabric = Fabric(login_cache=LoginCache(path))
+            fabric.init_from_seed_device(["127.0.0.101"], self.credentials, self.args,
+                                         engine="asyncio", parallel_threads=1, preflight_timeout=0)
+
+            assert len(fabric.switches) == 3
+            # Seed tried everything, neighbors got it right at once
+            assert fabric.login_cache.stats == {'hits': 2, 'misses': 0, 'cold': 1, 'failed_attempts': 3}
+            assert fabric.neighbor_platforms["127.0.0.102"] == "cisco WS-C2960X-48FPD-L"
+
+            # Next run starts from the file
+            fabric = Fabric(login_cache=LoginCache(path))
+            fabric.init_from_seed_device(["127.0.0.101"], self.credentials, self.args,
+                                         engine="asyncio", parallel_threads=1, preflight_timeout=0)
+
+            assert len(fabric.switches) == 3
+            assert fabric.login_cache.stats['hits'] == 3
+            assert fabric.login_cache.stats['failed_attempts'] == 0
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import pickle
+import random
+import unittest
+from netaddr import EUI
+from netwalk import Fabric, Interface, MacTable, Switch
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@unittest.skipIf(numpy is None, "numpy not installed")
+class TestMacTable(unittest.TestCase):
+    def setUp(self):
+        self.gi0 = Interface(name="GigabitEthernet0/0")
+        self.gi1 = Interface(name="GigabitEthernet0/1")
+        self.entries = {EUI("aa:aa:aa:aa:aa:01"): {'interface': self.gi0, 'vlan': 10},
+                        EUI("aa:aa:aa:aa:aa:02"): {'interface': self.gi0, 'vlan': 11},
+                        EUI("aa:aa:aa:aa:aa:03"): {'interface': self.gi1, 'vlan': 10}}
+
+    def test_dict_view(self):
+        table = MacTable(self.entries)
+
+        assert len(table) == 3
+        assert dict(table) == self.entries
+        assert list(table) == list(self.entries)
+        assert table["aa:aa:aa:aa:aa:02"] == {'interface': self.gi0, 'vlan': 11}
+        assert EUI("aa:aa:aa:aa:aa:03") in table
+        assert EUI("aa:aa:aa:aa:aa:04") not in table
+        with self.assertRaises(KeyError):
+            table[EUI("aa:aa:aa:aa:aa:04")]
+
+    def test_change(self):
+        table = MacTable(self.entries)
+        table[EUI("aa:aa:aa:aa:aa:01")] = {'interface': self.gi1, 'vlan': 20}
+        table[EUI("aa:aa:aa:aa:aa:04")] = {'interface': self.gi1}
+        del table[EUI("aa:aa:aa:aa:aa:02")]
+
+        assert len(table) == 3
+        assert table[EUI("aa:aa:aa:aa:aa:01")] == {'interface': self.gi1, 'vlan': 20}
+        # Missing VLAN is not made up
+        assert table[EUI("aa:aa:aa:aa:aa:04")] == {'interface': self.gi1}
+        assert EUI("aa:aa:aa:aa:aa:02") not in table
+        with self.assertRaises(KeyError):
+            del table[EUI("aa:aa:aa:aa:aa:02")]
+
+        table[EUI("aa:aa:aa:aa:aa:02")] = {'interface': self.gi0, 'vlan': 11}
+        assert len(table) == 4
+        assert table.counts() == {self.gi0: 1, self.gi1: 3}
+
+    def test_many_inserts(self):
+        table = MacTable()
+        reference = {}
+        for num in range(20000):
+            mac = EUI(random.getrandbits(48))
+            value = {'interface': random.choice((self.gi0, self.gi1)), 'vlan': random.randint(1, 4094)}
+            table[mac] = value
+            reference[mac] = value
+            if num % 7 == 0:
+                mac = random.choice(list(reference)) if num % 5 == 0 else mac
+                del table[mac]
+                del reference[mac]
+
+        assert len(table) == len(reference)
+        assert dict(table.items()) == reference
+
+    def test_vectorized(self):
+        table = MacTable(self.entries)
+
+        assert table.counts() == {self.gi0: 2, self.gi1: 1}
+        assert table.by_interface() == {self.gi0: [EUI("aa:aa:aa:aa:aa:01"), EUI("aa:aa:aa:aa:aa:02")],
+                                        self.gi1: [EUI("aa:aa:aa:aa:aa:03")]}
+        assert table.vlans_by_interface() == {self.gi0: {10, 11}, self.gi1: {10}}
+
+    def test_pickle(self):
+        table = MacTable(self.entries)
+        restored = pickle.loads(pickle.dumps(table))
+
+        assert len(restored) == 3
+        assert restored.counts()
+        assert [x['vlan'] for x in restored.values()] == [10, 11, 10]
+
+    def test_switch(self):
+        sw = Switch("sw1")
+        gi0 = Interface(name="GigabitEthernet0/0", mode="trunk", neighbors=[{'hostname': 'ap01'}])
+        sw.add_interface(gi0)
+        sw.add_interface(self.gi1)
+        sw.mac_table = MacTable({EUI("aa:aa:aa:aa:aa:01"): {'interface': gi0, 'vlan': 10},
+                                 EUI("aa:aa:aa:aa:aa:02"): {'interface': gi0, 'vlan': 12},
+                                 EUI("aa:aa:aa:aa:aa:03"): {'interface': self.gi1, 'vlan': 30}})
+        sw.index_mac_table()
+
+        assert sw.get_active_vlans() == {1, 10, 12}
+        assert gi0.mac_count == 2
+        assert sw.mac_index[gi0] == [EUI("aa:aa:aa:aa:aa:01"), EUI("aa:aa:aa:aa:aa:02")]
+
+    def test_fabric_closest(self):
+        rnd = random.Random(3)
+        switches = []
+        for swnum in range(6):
+            sw = Switch(f"sw{swnum}", facts={'hostname': f"sw{swnum}", 'fqdn': f"sw{swnum}"})
+            for intnum in range(8):
+                sw.add_interface(Interface(name=f"GigabitEthernet0/{intnum}", switch=sw))
+            switches.append(sw)
+
+        macs = [EUI(rnd.getrandbits(48)) for _ in range(500)]
+        tables = []
+        for sw in switches:
+            interfaces = list(sw.interfaces.values())
+            tables.append({mac: {'interface': rnd.choice(interfaces), 'vlan': rnd.randint(1, 20)}
+                           for mac in rnd.sample(macs, 300)})
+
+        legacy = Fabric()
+        columnar = Fabric(columnar_mac_table=True)
+        for fabric, table_type in ((legacy, dict), (columnar, MacTable)):
+            for sw, table in zip(switches, tables):
+                sw.mac_table = table_type(table)
+                fabric.switches[sw.hostname] = sw
+            fabric._recalculate_macs()
+
+        assert isinstance(columnar.mac_table, MacTable)
+        assert dict(columnar.mac_table) == legacy.mac_table
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import pickle
+import unittest
+from netwalk import ParseCache, Switch, Interface
+
+ACCESS_PORT = (" switchport access vlan 10\n"
+               " switchport mode access\n"
+               " storm-control action trap\n"
+               " spanning-tree portfast\n"
+               "!\n")
+
+
+class TestParseCache(unittest.TestCase):
+    def test_identical_blocks(self):
+        cache = ParseCache()
+        first = cache.interface("interface GigabitEthernet0/1\n" + ACCESS_PORT)
+        second = cache.interface("interface GigabitEthernet0/2\n" + ACCESS_PORT)
+
+        assert cache.misses == 1
+        assert cache.hits == 1
+        assert first.name == "GigabitEthernet0/1"
+        assert second.name == "GigabitEthernet0/2"
+        assert second.native_vlan == 10
+        assert second.type_edge
+        assert second.unparsed_lines == ["storm-control action trap"]
+
+        # Containers must not be shared
+        second.unparsed_lines.append("antani")
+        second.neighbors.append({'hostname': 'A'})
+        assert first.unparsed_lines == ["storm-control action trap"]
+        assert first.neighbors == []
+
+    def test_same_as_uncached(self):
+        cache = ParseCache()
+        config = ("interface GigabitEthernet0/1\n"
+                  " switchport mode trunk\n"
+                  " switchport trunk allowed vlan 1-10\n"
+                  " ip address 10.0.0.1 255.255.255.0\n")
+
+        cache.interface(config)
+        cached = cache.interface(config.replace("0/1", "0/2"))
+        uncached = Interface(config=config.replace("0/1", "0/2"))
+
+        for attr in ('name', 'mode', 'allowed_vlan', 'address', 'routed_port', 'unparsed_lines'):
+            assert getattr(cached, attr) == getattr(uncached, attr)
+        assert cached.allowed_vlan is not uncached.allowed_vlan
+
+    def test_empty_containers_not_shared(self):
+        cache = ParseCache()
+        config = "interface E0\n switchport mode access\n"
+        first = cache.interface(config)
+        second = cache.interface(config.replace("E0", "E1"))
+        third = cache.interface(config.replace("E0", "E2"))
+
+        second.unparsed_lines.append("antani")
+        assert first.unparsed_lines == []
+        assert third.unparsed_lines == []
+
+    def test_svi_not_cached(self):
+        cache = ParseCache()
+        cache.interface("interface Vlan10\n no shutdown\n")
+        svi = cache.interface("interface Vlan20\n no shutdown\n")
+
+        assert len(cache) == 0
+        assert svi.native_vlan == 20
+
+    def test_lru_eviction(self):
+        cache = ParseCache(maxsize=2)
+        for vlan in (10, 20, 10, 30):
+            cache.interface(f"interface E0\n switchport access vlan {vlan}\n")
+
+        assert len(cache) == 2
+        cache.interface("interface E1\n switchport access vlan 10\n")
+        assert cache.hits == 2
+        cache.interface("interface E1\n switchport access vlan 20\n")
+        assert cache.misses == 4
+
+    def test_shared_between_switches(self):
+        cache = ParseCache()
+        config = ("interface GigabitEthernet0/1\n" + ACCESS_PORT +
+                  "interface GigabitEthernet0/2\n" + ACCESS_PORT)
+
+        sw1 = Switch("sw1", config=config, parse_cache=cache)
+        sw2 = Switch("sw2", config=config, parse_cache=cache)
+
+        assert cache.misses == 1
+        assert cache.hits == 3
+        assert sw2.interfaces["GigabitEthernet0/2"].native_vlan == 10
+        assert sw1.interfaces["GigabitEthernet0/2"] is not sw2.interfaces["GigabitEthernet0/2"]
+
+    def test_pickle(self):
+        cache = ParseCache(maxsize=10)
+        cache.interface("interface E0\n" + ACCESS_PORT)
+
+        copied = pickle.loads(pickle.dumps(cache))
+        assert copied.maxsize == 10
+        assert len(copied) == 0
+
+
+if __name__ == '__main__':
+    unittest.main()
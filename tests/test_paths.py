@@ -0,0 +1,137 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import time
+import unittest
+from netwalk import Fabric, Interface, Switch
+from netwalk.paths import PathEngine
+
+
+def build_fabric(count: int, cables: list) -> Fabric:
+    """
+    Return a Fabric of switches sw0 to sw(count - 1), cables is a list of
+    (switch, switch) pairs, the same pair twice for parallel links
+    """
+    fabric = Fabric()
+    switches = [Switch(f"sw{x}", facts={'hostname': f"sw{x}", 'fqdn': f"sw{x}.example.com"})
+                for x in range(count)]
+    fabric.switches = {x.facts['fqdn']: x for x in switches}
+
+    def port(switch):
+        name = f"GigabitEthernet0/{len(switch.interfaces)}"
+        switch.add_interface(Interface(name=name, switch=switch, neighbors=[]))
+        return switch.interfaces[name]
+
+    for left, right in cables:
+        local, remote = port(switches[left]), port(switches[right])
+        local.neighbors.append({'hostname': f"sw{right}.example.com", 'remote_int': remote.name})
+        remote.neighbors.append({'hostname': f"sw{left}.example.com", 'remote_int': local.name})
+
+    fabric.refresh_global_information()
+    return fabric
+
+
+def hops(path):
+    return [x.switch.hostname for x in path[1::2]]
+
+
+class TestPathEngine(unittest.TestCase):
+    def setUp(self):
+        """
+        sw0 = sw1 - sw3
+         |         |
+        sw2 ------ +    sw4 alone
+        """
+        self.fabric = build_fabric(5, [(0, 1), (0, 1), (1, 3), (0, 2), (2, 3)])
+        self.sw = [self.fabric.switches[f"sw{x}.example.com"] for x in range(5)]
+
+    def test_shortest(self):
+        path = self.fabric.shortest_path(self.sw[0], [self.sw[3]])
+        assert hops(path) == ["sw1", "sw3"]
+        assert path[0] is self.sw[0].interfaces["GigabitEthernet0/0"]
+        assert path[-1].switch is self.sw[3]
+        assert self.fabric.shortest_path(self.sw[0], [self.sw[4]]) is None
+        # First end reached
+        assert hops(self.fabric.shortest_path(self.sw[3], [self.sw[0], self.sw[1]])) == ["sw1"]
+
+    def test_k_shortest(self):
+        paths = self.fabric.k_shortest_paths(self.sw[0], [self.sw[3]], 10)
+        assert [hops(x) for x in paths] == [["sw1", "sw3"], ["sw1", "sw3"], ["sw2", "sw3"]]
+        # Two parallel links
+        assert paths[0][0] is not paths[1][0]
+        assert self.fabric.k_shortest_paths(self.sw[0], [self.sw[3]], 1) == paths[:1]
+
+    def test_paths(self):
+        paths = self.fabric.find_paths(self.sw[2], [self.sw[1]])
+        assert sorted(hops(x) for x in paths) == [["sw0", "sw1"], ["sw0", "sw1"], ["sw3", "sw1"]]
+        assert len(list(self.fabric.iter_paths(self.sw[2], [self.sw[1]], max_hops=1))) == 0
+        assert len(list(self.fabric.iter_paths(self.sw[2], [self.sw[1]], limit=2))) == 2
+        assert self.fabric.find_paths(self.sw[4], [self.sw[0]]) == []
+        with self.assertRaises(ValueError):
+            self.fabric.find_paths(self.sw[0], [])
+
+    def test_memoize(self):
+        engine = self.fabric.path_engine
+        first = self.fabric.find_paths(self.sw[2], [self.sw[1]])
+        hits = engine.hits
+        assert self.fabric.find_paths(self.sw[2], [self.sw[1]]) == first
+        assert engine.hits == hits + 1
+        assert self.fabric.path_engine is engine
+
+        # New links, new engine
+        self.fabric.refresh_global_information()
+        assert self.fabric.path_engine is not engine
+
+
+class TestMesh(unittest.TestCase):
+    def setUp(self):
+        # 9 core switches fully meshed with two links each, and an access switch on the last two
+        cables = [(x, y) for x in range(9) for y in range(x + 1, 9)] * 2 + [(7, 9), (8, 9)]
+        self.fabric = build_fabric(10, cables)
+        self.sw = [self.fabric.switches[f"sw{x}.example.com"] for x in range(10)]
+
+    def test_k_shortest(self):
+        start = time.perf_counter()
+        paths = self.fabric.k_shortest_paths(self.sw[0], [self.sw[9]], 20)
+        assert time.perf_counter() - start < 5
+        lengths = [len(x) // 2 for x in paths]
+        assert len(paths) == 20
+        assert lengths == sorted(lengths)
+        assert lengths[:4] == [2, 2, 2, 2]
+        assert len({tuple(map(id, x)) for x in paths}) == 20
+        for path in paths:
+            switches = [self.sw[0]] + [x.switch for x in path[1::2]]
+            assert len(set(switches)) == len(switches)
+
+    def test_bounded(self):
+        paths = list(self.fabric.iter_paths(self.sw[0], [self.sw[9]], max_hops=3))
+        # 2 links to 7 or 8 then 1 to 9, or 2 links to any of 7 other cores first
+        assert len(paths) == 2 * 2 + 2 * 7 * 2 * 2
+        assert all(len(x) // 2 <= 3 for x in paths)
+
+    def test_timeout(self):
+        start = time.perf_counter()
+        paths = list(self.fabric.iter_paths(self.sw[0], [self.sw[9]], timeout=0.2))
+        assert time.perf_counter() - start < 2
+        assert paths
+        # Not kept, it was cut short
+        assert ('paths', self.sw[0], frozenset([self.sw[9]]), None) not in self.fabric.path_engine._cache
+
+
+if __name__ == '__main__':
+    unittest.main()
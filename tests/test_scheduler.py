@@ -0,0 +1,258 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import concurrent.futures
+import unittest
+from napalm.base.exceptions import ConnectionException
+from netmiko.ssh_exception import NetMikoTimeoutException
+from netwalk import DiscoveryScheduler, Fabric
+from netwalk.asynccli import AuthenticationError
+from netwalk.scheduler import HostInfo, by_platform, closest_first, combine, congestion, most_connected
+
+from .fakedevice import FakeCLI, FakeDevice
+
+
+class TestDiscoveryScheduler(unittest.TestCase):
+    def test_limit(self):
+        scheduler = DiscoveryScheduler(initial=2, maximum=4)
+        for num in range(5):
+            scheduler.push(f"10.0.0.{num}", num)
+
+        tickets = scheduler.ready()
+        assert [x.payload for x in tickets] == [0, 1]
+        assert scheduler.ready() == []
+        assert scheduler.stats['in_flight'] == 2
+        assert scheduler.stats['queued'] == 3
+
+        scheduler.done(tickets[0])
+        assert scheduler.limit == 2.5
+        assert [x.host for x in scheduler.ready()] == ["10.0.0.2"]
+
+    def test_additive_increase(self):
+        scheduler = DiscoveryScheduler(initial=2, maximum=3)
+        for _ in range(10):
+            scheduler.push("10.0.0.1")
+            scheduler.done(scheduler.ready()[0], latency=1)
+
+        assert scheduler.limit == 3
+        assert scheduler.increases == 1
+
+    def test_multiplicative_decrease(self):
+        scheduler = DiscoveryScheduler(initial=8, latency_target=5)
+        for num in range(8):
+            scheduler.push(f"10.0.0.{num}")
+        tickets = scheduler.ready()
+
+        # Switches started in the same round decrease it once
+        scheduler.done(tickets[0], asyncio.TimeoutError())
+        scheduler.done(tickets[1], asyncio.TimeoutError())
+        assert scheduler.limit == 4
+        assert scheduler.decreases == 1
+
+        # Next round
+        scheduler.push("10.0.0.9")
+        assert scheduler.ready() == []
+        for ticket in tickets[2:6]:
+            scheduler.done(ticket)
+        ticket = scheduler.ready()[0]
+        scheduler.done(ticket, latency=6)
+        assert int(scheduler.limit) == 2
+        assert scheduler.decreases == 2
+
+    def test_minimum(self):
+        scheduler = DiscoveryScheduler(initial=2, minimum=2)
+        scheduler.push("10.0.0.1")
+        scheduler.done(scheduler.ready()[0], AuthenticationError())
+        assert scheduler.limit == 2
+
+    def test_fixed(self):
+        scheduler = DiscoveryScheduler.fixed(3)
+        scheduler.push("10.0.0.1")
+        ticket = scheduler.ready()[0]
+        scheduler.done(ticket, asyncio.TimeoutError(), latency=100)
+        assert scheduler.limit == 3
+
+    def test_group_limit(self):
+        scheduler = DiscoveryScheduler(initial=10, group_limit=2)
+        for host in ("10.0.0.1", "10.0.0.2", "10.0.0.3", "10.0.1.1", "10.0.0.4"):
+            scheduler.push(host)
+
+        tickets = scheduler.ready()
+        assert [x.host for x in tickets] == ["10.0.0.1", "10.0.0.2", "10.0.1.1"]
+        assert scheduler.stats['groups'] == {"10.0.0.0/24": 2, "10.0.1.0/24": 1}
+
+        scheduler.done(tickets[0])
+        assert [x.host for x in scheduler.ready()] == ["10.0.0.3"]
+
+    def test_group_of(self):
+        sites = {"10.0.0.1": "milan", "10.9.0.1": "milan", "10.5.0.1": "rome"}
+        scheduler = DiscoveryScheduler(initial=10, group_limit=1, group_of=sites.get)
+        for host in sites:
+            scheduler.push(host)
+
+        assert [x.host for x in scheduler.ready()] == ["10.0.0.1", "10.5.0.1"]
+
+    def test_fifo(self):
+        scheduler = DiscoveryScheduler.fixed(10)
+        for num in range(5):
+            scheduler.push(f"10.0.{num}.1", info=HostInfo(f"10.0.{num}.1", hops=num))
+        assert [x.host for x in scheduler.ready()] == [f"10.0.{x}.1" for x in range(5)]
+
+    def test_push_twice(self):
+        scheduler = DiscoveryScheduler.fixed(10)
+        scheduler.push("10.0.0.1", payload=1)
+        scheduler.push("10.0.0.2")
+        scheduler.push("10.0.0.1", payload=2)
+        assert scheduler.queued == 2
+
+        tickets = scheduler.ready()
+        assert [(x.host, x.payload) for x in tickets] == [("10.0.0.1", 2), ("10.0.0.2", None)]
+        assert scheduler.in_flight == 2
+
+    def test_priority(self):
+        scheduler = DiscoveryScheduler.fixed(1, priority=by_platform({"N9K": 10, "C9[35]00": 5}))
+        scheduler.push("10.0.0.1", info=HostInfo("10.0.0.1", platform="cisco WS-C2960X-48FPD-L"))
+        scheduler.push("10.0.0.2", info=HostInfo("10.0.0.2", platform="cisco C9300-48P"))
+        scheduler.push("10.0.0.3", info=HostInfo("10.0.0.3", platform="N9K-C93180YC-EX"))
+        scheduler.push("10.0.0.4", info=HostInfo("10.0.0.4", platform="cisco C9500-24Y4C"))
+
+        order = []
+        while scheduler.queued:
+            ticket, = scheduler.ready()
+            order.append(ticket.host)
+            scheduler.done(ticket)
+        # Same priority in the order queued
+        assert order == ["10.0.0.3", "10.0.0.2", "10.0.0.4", "10.0.0.1"]
+
+    def test_reprioritize(self):
+        scheduler = DiscoveryScheduler.fixed(1, priority=most_connected)
+        for num in range(1, 4):
+            scheduler.push(f"10.0.0.{num}", info=HostInfo(f"10.0.0.{num}", degree=1))
+        scheduler.reprioritize("10.0.0.3", HostInfo("10.0.0.3", degree=2))
+        # Not queued
+        scheduler.reprioritize("10.0.0.9", HostInfo("10.0.0.9", degree=5))
+        assert scheduler.queued == 3
+
+        order = []
+        while scheduler.queued:
+            ticket, = scheduler.ready()
+            order.append(ticket.host)
+            scheduler.done(ticket)
+        assert order == ["10.0.0.3", "10.0.0.1", "10.0.0.2"]
+
+    def test_combine(self):
+        priority = combine((1, most_connected), (2, closest_first))
+        assert priority(HostInfo("10.0.0.1", hops=2, degree=3)) == -1
+
+    def test_congestion(self):
+        assert congestion(None) is None
+        assert congestion(ValueError()) is None
+        assert congestion(asyncio.TimeoutError()) == "timeout"
+        assert congestion(concurrent.futures.TimeoutError()) == "timeout"
+
+        try:
+            try:
+                raise NetMikoTimeoutException("timed out")
+            except NetMikoTimeoutException as exc:
+                raise ConnectionException("Cannot connect") from exc
+        except ConnectionException as exc:
+            assert congestion(exc) == "timeout"
+
+        try:
+            raise ConnectionError("Could not log in") from AuthenticationError()
+        except ConnectionError as exc:
+            assert congestion(exc) == "auth"
+
+
+class TestAdaptiveDiscovery(unittest.TestCase):
+    def setUp(self):
+        # Star of 20 switches behind sw0
+        self.devices = [FakeDevice(f"sw{x}", f"127.0.1.{x + 1}", ports=21) for x in range(21)]
+        for num, device in enumerate(self.devices[1:], 2):
+            self.devices[0].connect(num, device, 1)
+        FakeCLI.devices = {x.address: x for x in self.devices}
+
+    def tearDown(self):
+        FakeCLI.devices = {}
+
+    def test_slow_logins(self):
+        scheduler = DiscoveryScheduler(initial=8, latency_target=0.05)
+        fabric = Fabric()
+        # Every login over the target
+        for device in self.devices:
+            device.delay = 0.03
+        fabric.init_from_seed_device(["127.0.1.1"], [("cisco", "cisco")], [{'transport': 'fake'}],
+                                     engine="asyncio", scheduler=scheduler)
+
+        assert len(fabric.switches) == 21
+        assert fabric.scheduler is scheduler
+        assert scheduler.decreases > 0
+        assert scheduler.limit < 8
+        assert scheduler.stats['in_flight'] == 0
+        assert all(x > 0.05 for x in fabric.login_times.values())
+
+    def test_fast_logins(self):
+        scheduler = DiscoveryScheduler(initial=2, maximum=4, latency_target=5)
+        fabric = Fabric()
+        fabric.init_from_seed_device(["127.0.1.1"], [("cisco", "cisco")], [{'transport': 'fake'}],
+                                     engine="asyncio", scheduler=scheduler)
+
+        assert len(fabric.switches) == 21
+        assert scheduler.limit == 4
+        assert scheduler.decreases == 0
+
+
+class TestPriorityDiscovery(unittest.TestCase):
+    def setUp(self):
+        # Core switch behind the last port of sw0, access switches on the others
+        self.devices = [FakeDevice(f"sw{x}", f"127.0.2.{x + 1}") for x in range(4)]
+        self.core = FakeDevice("core", "127.0.2.10", platform="N9K-C93180YC-EX")
+        for num, device in enumerate(self.devices[1:], 1):
+            self.devices[0].connect(num, device, 1)
+        self.devices[0].connect(4, self.core, 1)
+        FakeCLI.devices = {x.address: x for x in self.devices + [self.core]}
+
+    def tearDown(self):
+        FakeCLI.devices = {}
+
+    def discover(self, **kwargs) -> list:
+        fabric = Fabric()
+        fabric.init_from_seed_device(["127.0.2.1"], [("cisco", "cisco")], [{'transport': 'fake'}],
+                                     engine="asyncio", **kwargs)
+        assert len(fabric.switches) == 5
+        assert fabric.hops == {"127.0.2.2": 1, "127.0.2.3": 1, "127.0.2.4": 1, "127.0.2.10": 1}
+        assert all(x > 0 for x in fabric.collect_times.values())
+        return [x.hostname for x in fabric.switches.values()]
+
+    def test_fifo(self):
+        assert self.discover(scheduler=DiscoveryScheduler.fixed(1))[-1] == "127.0.2.10"
+
+    def test_duplicate_seeds(self):
+        fabric = Fabric()
+        fabric.init_from_seed_device(["127.0.2.1", "127.0.2.1"], [("cisco", "cisco")], [{'transport': 'fake'}],
+                                     engine="asyncio", scheduler=DiscoveryScheduler.fixed(2))
+        assert len(fabric.switches) == 5
+
+    def test_core_first(self):
+        scheduler = DiscoveryScheduler.fixed(1, priority=by_platform({"N9K": 10}))
+        assert self.discover(scheduler=scheduler)[:2] == ["127.0.2.1", "127.0.2.10"]
+
+
+if __name__ == '__main__':
+    unittest.main()
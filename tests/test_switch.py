@@ -19,6 +19,8 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import unittest
 from netwalk import Switch
 from netwalk import Interface
+from netwalk import VlanSet
+from netaddr import EUI
 
 class TestSwitchBasic(unittest.TestCase):
     def test_base_switch(self):
@@ -51,5 +53,222 @@ class TestSwitchBasic(unittest.TestCase):
         vlans = sw.get_active_vlans()
         assert vlans == {1,2,3,4,5,999,111}
 
+    def test_get_active_vlans_mac_table(self):
+        # CDP neighbor outside the fabric
+        gi00 = Interface(name="GigabitEthernet0/0",
+                         mode="trunk",
+                         neighbors=[{'hostname': 'ap01'}])
+        gi01 = Interface(name="GigabitEthernet0/1",
+                         mode="trunk",
+                         neighbors=[Interface(name="GigabitEthernet0/48")])
+        gi02 = Interface(name="GigabitEthernet0/2",
+                         mode="access",
+                         native_vlan=20)
+        sw = Switch("sw1")
+        for intf in (gi00, gi01, gi02):
+            sw.add_interface(intf)
+        sw.vlans_set = VlanSet(range(1, 100))
+        sw.mac_table = {EUI("aa:aa:aa:aa:aa:01"): {'interface': gi00, 'vlan': 10},
+                        EUI("aa:aa:aa:aa:aa:02"): {'interface': gi00, 'vlan': 11},
+                        EUI("aa:aa:aa:aa:aa:03"): {'interface': gi01, 'vlan': 30},
+                        EUI("aa:aa:aa:aa:aa:04"): {'interface': gi02, 'vlan': 20},
+                        EUI("aa:aa:aa:aa:aa:05"): {'interface': gi00, 'vlan': 200}}
+
+        # Only trunks without neighbors count, VLANs must be configured
+        assert sw.get_active_vlans() == {1, 10, 11, 20}
+        assert gi00.mac_count == 3
+        assert gi01.mac_count == 1
+        assert sw.mac_index[gi02] == [EUI("aa:aa:aa:aa:aa:04")]
+
+    def test_mac_index_refresh(self):
+        gi00 = Interface(name="GigabitEthernet0/0", mode="trunk",
+                         neighbors=[{'hostname': 'ap01'}])
+        sw = Switch("sw1")
+        sw.add_interface(gi00)
+        sw.mac_table = {EUI("aa:aa:aa:aa:aa:01"): {'interface': gi00, 'vlan': 10}}
+        assert sw.get_active_vlans() == {1, 10}
+
+        # Replacing the table drops the index
+        sw.mac_table = {EUI("aa:aa:aa:aa:aa:02"): {'interface': gi00, 'vlan': 11}}
+        assert sw.get_active_vlans() == {1, 11}
+
+        # Changes in place need an explicit refresh
+        sw.mac_table[EUI("aa:aa:aa:aa:aa:03")] = {'interface': gi00, 'vlan': 12}
+        sw.index_mac_table()
+        assert sw.get_active_vlans() == {1, 11, 12}
+        assert gi00.mac_count == 2
+
+class TestSwitchConfigSplitter(unittest.TestCase):
+    CONFIG = ("hostname testsw\n"
+              "!\n"
+              "interface GigabitEthernet0/1\n"
+              " description a   \n"
+              "\n"
+              "   \n"
+              "!comment\n"
+              " switchport mode access\n"
+              " !\n"
+              "  nested child\n"
+              "interface Tunnel0\n"
+              " ip address 10.0.0.1 255.255.255.0\n"
+              "interface Loopback0\r\n"
+              " ip address 10.0.1.1 255.255.255.255\r\n"
+              "interface Port-channel1\n"
+              " service-policy input antani\n"
+              "\tswitchport mode trunk\n"
+              "!\n"
+              " orphan\n"
+              "line vty 0 4\n"
+              " login\n"
+              "end\n")
+
+    def test_same_blocks_as_ciscoconfparse(self):
+        sw = Switch("testsw", config=self.CONFIG)
+        # CiscoConfParse keeps line terminators
+        expected = [[line.rstrip("\r\n") for line in x.ioscfg]
+                    for x in sw.parsed_conf.find_objects(Switch.INTERFACE_FILTER)]
+
+        assert list(sw._interface_blocks()) == expected
+        assert list(sw.interfaces) == ["GigabitEthernet0/1", "Loopback0", "Port-channel1"]
+
+    def test_same_interfaces_as_ciscoconfparse(self):
+        fast = Switch("testsw", config=self.CONFIG)
+        slow = Switch("testsw", config=self.CONFIG, fast_parse=False)
+
+        assert list(fast.interfaces) == list(slow.interfaces)
+        for name, intdata in fast.interfaces.items():
+            assert str(intdata) == str(slow.interfaces[name])
+
+    def test_parsed_conf_on_demand(self):
+        sw = Switch("testsw", config=self.CONFIG)
+        assert sw._parsed_conf is None
+        assert len(sw.parsed_conf.find_objects("^line vty")) == 1
+
+
+SHOW_INTERFACES = """Vlan10 is up, line protocol is up 
+  Hardware is EtherSVI, address is 0011.2233.4400 (bia 0011.2233.4400)
+  MTU 1500 bytes, BW 1000000 Kbit/sec, DLY 10 usec, 
+  Last input 00:00:01, output never, output hang never
+GigabitEthernet0/1 is up, line protocol is up (connected) 
+  Hardware is Gigabit Ethernet, address is 0011.2233.4401 (bia 0011.2233.4401)
+  Description: uplink
+  MTU 1500 bytes, BW 1000000 Kbit/sec, DLY 10 usec, 
+     reliability 255/255, txload 1/255, rxload 1/255
+  Encapsulation ARPA, loopback not set
+  Full-duplex, 1000Mb/s, media type is 10/100/1000BaseTX
+  input flow-control is off, output flow-control is unsupported 
+  Last input 00:00:01, output 01:02:03, output hang never
+  Last clearing of "show interface" counters 1d02h
+  Input queue: 0/75/12/0 (size/max/drops/flushes); Total output drops: 34
+  Queueing strategy: fifo
+  Output queue: 0/40 (size/max)
+  5 minute input rate 1000 bits/sec, 1 packets/sec
+  5 minute output rate 2000 bits/sec, 2 packets/sec
+     123456 packets input, 98765432 bytes, 0 no buffer
+     Received 2345 broadcasts (1234 multicasts)
+     0 runts, 0 giants, 0 throttles 
+     5 input errors, 0 CRC, 0 frame, 0 overrun, 0 ignored
+     0 watchdog, 1234 multicast, 0 pause input
+     654321 packets output, 87654321 bytes, 0 underruns
+     3 output errors, 0 collisions, 1 interfaces resets
+     0 output buffer failures, 0 output buffers swapped out
+GigabitEthernet0/2 is administratively down, line protocol is down (disabled) 
+  Hardware is Gigabit Ethernet, address is 0011.2233.4402 (bia 0011.2233.4402)
+  MTU 1500 bytes, BW 100000 Kbit/sec, DLY 100 usec, 
+  Last input never, output never, output hang never
+  Last clearing of "show interface" counters never
+  Input queue: 0/75/0/0 (size/max/drops/flushes); Total output drops: 0
+     0 packets input, 0 bytes, 0 no buffer
+     Received 0 broadcasts, 0 runts, 0 giants, 0 throttles
+     0 input errors, 0 CRC, 0 frame, 0 overrun, 0 ignored
+     0 packets output, 0 bytes, 0 underruns
+     0 output errors, 0 collisions, 0 interfaces resets
+GigabitEthernet0/3 is down, line protocol is down (notconnect) 
+  MTU 1500 bytes, BW 10000 Kbit/sec, DLY 1000 usec, 
+"""
+
+
+class FakeSession():
+    def __init__(self, outputs):
+        self.outputs = outputs
+
+    def cli(self, commands):
+        return {x: self.outputs[x] for x in commands}
+
+
+class TestSwitchShowInterfaces(unittest.TestCase):
+    CONFIG = ("interface Vlan10\n"
+              "!\n"
+              "interface GigabitEthernet0/1\n"
+              "!\n"
+              "interface GigabitEthernet0/2\n"
+              "!\n"
+              "interface GigabitEthernet0/3\n"
+              "!\n")
+
+    def test_same_as_napalm(self):
+        import napalm.ios.ios
+        driver = napalm.ios.ios.IOSDriver("testsw", "user", "password")
+        driver._send_command = lambda command: SHOW_INTERFACES
+        napalm_status = driver.get_interfaces()
+
+        single = Switch("testsw", config=self.CONFIG)
+        single.session = FakeSession({'show interfaces': SHOW_INTERFACES})
+        single._parse_show_interfaces(SHOW_INTERFACES)
+
+        legacy = Switch("testsw", config=self.CONFIG)
+        legacy.session = FakeSession({'show interfaces': SHOW_INTERFACES})
+        legacy.init_time = single.init_time
+        legacy._parse_int_last_inout()
+
+        for intname, intdata in single.interfaces.items():
+            assert intdata.is_enabled == napalm_status[intname]['is_enabled']
+            assert intdata.is_up == napalm_status[intname]['is_up']
+            assert intdata.speed == napalm_status[intname]['speed']
+            assert intdata.switch is single
+            assert intdata.last_in == legacy.interfaces[intname].last_in
+            assert intdata.last_out == legacy.interfaces[intname].last_out
+            assert intdata.last_clearing == legacy.interfaces[intname].last_clearing
+
+        assert single.interfaces['GigabitEthernet0/1'].last_in is not None
+        assert single.interfaces['Vlan10'].last_in is None
+
+    def test_counters(self):
+        sw = Switch("testsw", config=self.CONFIG)
+        sw._parse_show_interfaces(SHOW_INTERFACES)
+
+        assert sw.interfaces['GigabitEthernet0/1'].counters == {
+            'rx_discards': 12,
+            'tx_discards': 34,
+            'rx_unicast_packets': 123456,
+            'rx_octets': 98765432,
+            'rx_broadcast_packets': 2345,
+            'rx_multicast_packets': 1234,
+            'rx_errors': 5,
+            'tx_unicast_packets': 654321,
+            'tx_octets': 87654321,
+            'tx_broadcast_packets': -1,
+            'tx_multicast_packets': -1,
+            'tx_errors': 3}
+
+        assert sw.interfaces['GigabitEthernet0/2'].counters['rx_multicast_packets'] == -1
+        assert not sw.interfaces['GigabitEthernet0/2'].is_enabled
+        assert sw.interfaces['GigabitEthernet0/3'].is_enabled
+        assert not sw.interfaces['GigabitEthernet0/3'].is_up
+
+    def test_unexpected_lines(self):
+        output = SHOW_INTERFACES.replace(
+            "  Description: uplink\n",
+            "  Description: uplink - check input errors here, packets output BW\n"
+            "     packets input and output errors not counted\n")
+        sw = Switch("testsw", config=self.CONFIG)
+        sw._parse_show_interfaces(output)
+
+        counters = sw.interfaces['GigabitEthernet0/1'].counters
+        assert counters['rx_errors'] == 5
+        assert counters['tx_unicast_packets'] == 654321
+        assert sw.interfaces['GigabitEthernet0/1'].speed == 1000
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,124 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import io
+import threading
+import unittest
+from netwalk import Switch, Interface, TemplateRegistry
+
+CDP_ENTRY = ("-------------------------\n"
+             "Device ID: {host}\n"
+             "Entry address(es): \n"
+             "  IP address: 10.0.0.{num}\n"
+             "Platform: cisco WS-C2960X-48FPD-L,  Capabilities: Switch IGMP \n"
+             "Interface: GigabitEthernet0/{num},  Port ID (outgoing port): GigabitEthernet1/0/1\n"
+             "Holdtime : 150 sec\n"
+             "\n"
+             "Version :\n"
+             "Cisco IOS Software, C2960X Software (C2960X-UNIVERSALK9-M), Version 15.2(2)E7, RELEASE SOFTWARE (fc3)\n"
+             "\n")
+
+
+def cdp_output(count, prefix="sw"):
+    out = "switch01#show cdp neigh detail\n"
+    for num in range(1, count + 1):
+        out += CDP_ENTRY.format(host=f"{prefix}{num}", num=num)
+    return out + "switch01#"
+
+
+class TestTemplateRegistry(unittest.TestCase):
+    def test_builtin_template(self):
+        registry = TemplateRegistry()
+        results = registry.parse("show_cdp_neigh_detail", cdp_output(2))
+
+        assert len(results) == 2
+        assert results[0][:6] == ['switch01', 'sw1', '10.0.0.1', 'cisco WS-C2960X-48FPD-L',
+                                  'GigabitEthernet1/0/1', 'GigabitEthernet0/1']
+        assert registry.names() == ["show_cdp_neigh_detail"]
+
+    def test_parser_is_reset(self):
+        registry = TemplateRegistry()
+        registry.parse("show_cdp_neigh_detail", cdp_output(3))
+        results = registry.parse("show_cdp_neigh_detail", cdp_output(1, prefix="other"))
+
+        assert [x[1] for x in results] == ["other1"]
+
+    def test_parser_compiled_once(self):
+        registry = TemplateRegistry()
+        first = registry.get("show_cdp_neigh_detail")
+        second = registry.get("show_cdp_neigh_detail")
+
+        assert first is second
+        assert first.states is registry._templates["show_cdp_neigh_detail"][1].states
+
+    def test_threads(self):
+        registry = TemplateRegistry()
+        errors = []
+        parsers = []
+
+        def worker(count):
+            # Keep them alive, ids of dead ones could be reused
+            parsers.append(registry.get("show_cdp_neigh_detail"))
+            for _ in range(20):
+                results = registry.parse("show_cdp_neigh_detail", cdp_output(count, prefix=f"t{count}-"))
+                if [x[1] for x in results] != [f"t{count}-{x}" for x in range(1, count + 1)]:
+                    errors.append(results)
+
+        threads = [threading.Thread(target=worker, args=(x,)) for x in range(1, 9)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        assert len({id(x) for x in parsers}) == 8
+
+    def test_register_template(self):
+        registry = TemplateRegistry()
+        registry.register("show_hostname", io.StringIO("Value hostname (\\S+)\n\n"
+                                                       "Start\n"
+                                                       "  ^hostname ${hostname} -> Record\n"))
+
+        assert registry.parse("show_hostname", "hostname switch01\n") == [['switch01']]
+
+        # Replacing a template is picked up by parsers already handed out
+        registry.register("show_hostname", io.StringIO("Value name (\\S+)\n\n"
+                                                       "Start\n"
+                                                       "  ^name ${name} -> Record\n"))
+
+        assert registry.parse("show_hostname", "hostname switch01\nname sw1\n") == [['sw1']]
+
+    def test_unknown_template(self):
+        registry = TemplateRegistry()
+        with self.assertRaises(KeyError):
+            registry.get("show_nothing")
+
+    def test_switch_cdp_neighbors(self):
+        switch = Switch('192.168.1.1')
+        switch.interfaces = {f"GigabitEthernet0/{x}": Interface(name=f"GigabitEthernet0/{x}")
+                             for x in range(1, 3)}
+        switch._parse_cdp_neighbors(cdp_output(2))
+
+        assert switch.interfaces["GigabitEthernet0/2"].neighbors == [{'hostname': 'sw2',
+                                                                      'ip': '10.0.0.2',
+                                                                      'platform': 'cisco WS-C2960X-48FPD-L',
+                                                                      'remote_int': 'GigabitEthernet1/0/1'}]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import importlib.util
+import unittest
+from netwalk import Interface, Switch, Topology
+from tests.test_paths import build_fabric
+
+HAS_NETWORKX = importlib.util.find_spec("networkx") is not None
+HAS_SCIPY = importlib.util.find_spec("scipy") is not None
+
+
+class TestTopology(unittest.TestCase):
+    def setUp(self):
+        """
+        sw0 = sw1 - sw3
+         |         |
+        sw2 ------ +    sw4 alone
+        """
+        self.fabric = build_fabric(5, [(0, 1), (0, 1), (1, 3), (0, 2), (2, 3)])
+        self.sw = [self.fabric.switches[f"sw{x}.example.com"] for x in range(5)]
+        self.topology = self.fabric.topology
+
+    def test_ids(self):
+        assert len(self.topology) == 5
+        assert self.topology.edge_count == 5
+        assert self.topology.arc_count == 10
+        assert [self.topology.node_id[x] for x in self.sw] == [0, 1, 2, 3, 4]
+        assert list(self.topology.indptr) == [0, 3, 6, 8, 10, 10]
+        assert [self.topology.degree(x) for x in self.sw] == [3, 3, 2, 2, 0]
+
+    def test_edges(self):
+        for edge, (local, remote) in enumerate(self.topology.edges):
+            assert local.neighbors[0] is remote
+            assert self.topology.edge_id[local] == edge
+            assert self.topology.edge_id[remote] == edge
+
+        # Both sides of a link are the same edge
+        for arc, local in enumerate(self.topology.arc_interfaces):
+            edge = int(self.topology.edge_ids[arc])
+            assert local in self.topology.edges[edge]
+            assert self.topology.switches[int(self.topology.indices[arc])] is local.neighbors[0].switch
+
+    def test_links(self):
+        links = list(self.topology.links(self.sw[0]))
+        assert [x[2] for x in links] == [self.sw[1], self.sw[1], self.sw[2]]
+        assert all(x[0].switch is self.sw[0] and x[1].neighbors[0] is x[0] for x in links)
+        assert list(self.topology.links(self.sw[4])) == []
+
+    def test_rebuilt(self):
+        assert self.fabric.topology is self.topology
+        assert self.fabric.path_engine.links == self.topology.arc_count
+        self.fabric.refresh_global_information()
+        assert self.fabric.topology is not self.topology
+
+    def test_device(self):
+        # Interfaces not in show interfaces only have device
+        switches = [Switch(f"sw{x}") for x in range(2)]
+        for switch in switches:
+            switch.add_interface(Interface(name="GigabitEthernet0/0"))
+        local, remote = (x.interfaces["GigabitEthernet0/0"] for x in switches)
+        local.neighbors.append(remote)
+        remote.neighbors.append(local)
+
+        topology = Topology(switches)
+        assert topology.edge_count == 1
+        assert list(topology.links(switches[1])) == [(remote, local, switches[0])]
+
+    def test_outside(self):
+        # Links to switches not given are left out
+        topology = Topology(self.sw[:2])
+        assert topology.edge_count == 2
+        assert topology.degree(self.sw[1]) == 2
+
+    @unittest.skipUnless(HAS_NETWORKX, "networkx not installed")
+    def test_networkx(self):
+        graph = self.topology.to_networkx()
+        assert graph.number_of_nodes() == 5
+        assert graph.number_of_edges() == 5
+        assert graph.nodes[3]['switch'] is self.sw[3]
+        assert graph.number_of_edges(0, 1) == 2
+        assert self.topology.to_networkx(multigraph=False).number_of_edges() == 4
+
+    @unittest.skipUnless(HAS_SCIPY, "scipy not installed")
+    def test_scipy(self):
+        matrix = self.topology.to_scipy()
+        assert matrix.shape == (5, 5)
+        assert matrix[0, 1] == 2
+        assert matrix[1, 0] == 2
+        assert matrix[4].nnz == 0
+        weighted = self.topology.to_scipy(weights=[10] * self.topology.edge_count)
+        assert weighted[0, 1] == 20
+
+
+class TestLag(unittest.TestCase):
+    def setUp(self):
+        """
+        sw0 Po1 (Gi0/0, Gi0/1) = sw1 Po10 (Gi0/0, Gi0/1)
+        sw1 Gi0/2 - sw2 Gi0/0
+        """
+        self.fabric = build_fabric(3, [(0, 1), (0, 1), (1, 2)])
+        self.sw = [self.fabric.switches[f"sw{x}.example.com"] for x in range(3)]
+        for switch, group in ((self.sw[0], 1), (self.sw[1], 10)):
+            for name in ("GigabitEthernet0/0", "GigabitEthernet0/1"):
+                switch.interfaces[name].channel_group = group
+                switch.interfaces[name].speed = 1000
+            # Not in show interfaces, switch is not set
+            switch.add_interface(Interface(name=f"Port-channel{group}"))
+        self.fabric.refresh_global_information()
+        self.po1 = self.sw[0].interfaces["Port-channel1"]
+        self.po10 = self.sw[1].interfaces["Port-channel10"]
+
+    def test_collapsed(self):
+        topology = self.fabric.topology
+        assert topology.edge_count == 2
+        edge = topology.edge_id[self.po1]
+        assert topology.edges[edge] == (self.po1, self.po10)
+        assert topology.edge_id[self.sw[1].interfaces["GigabitEthernet0/1"]] == edge
+        assert [(x.name, y.name) for x, y in topology.members[edge]] == \
+            [("GigabitEthernet0/0", "GigabitEthernet0/0"), ("GigabitEthernet0/1", "GigabitEthernet0/1")]
+        assert topology.speed(edge) == 2000
+        assert [topology.degree(x) for x in self.sw] == [1, 2, 1]
+        assert list(topology.links(self.sw[0])) == [(self.po1, self.po10, self.sw[1])]
+
+    def test_physical(self):
+        topology = Topology(self.sw, collapse_lags=False)
+        assert topology.edge_count == 3
+        assert [topology.degree(x) for x in self.sw] == [2, 3, 1]
+        assert topology.speed(0) == 1000
+
+    def test_paths(self):
+        paths = self.fabric.k_shortest_paths(self.sw[0], [self.sw[2]], 10)
+        assert [[x.name for x in path] for path in paths] == \
+            [["Port-channel1", "Port-channel10", "GigabitEthernet0/2", "GigabitEthernet0/0"]]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+"""
+netwalk
+Copyright (C) 2021 NTT Ltd
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import pickle
+import unittest
+from netwalk import VlanSet
+
+
+class TestVlanSet(unittest.TestCase):
+    def test_all(self):
+        vlans = VlanSet.all()
+        assert len(vlans) == 4094
+        assert 1 in vlans
+        assert 4094 in vlans
+        assert 0 not in vlans
+        assert 4095 not in vlans
+        assert vlans == {x for x in range(1, 4095)}
+
+    def test_from_string(self):
+        vlans = VlanSet.from_string("1,2,3-5,10")
+        assert vlans == {1, 2, 3, 4, 5, 10}
+        assert list(vlans) == [1, 2, 3, 4, 5, 10]
+
+    def test_set_operations(self):
+        vlans = VlanSet([1, 2, 3])
+        vlans.update({10, 11}, VlanSet([20]))
+        assert vlans == {1, 2, 3, 10, 11, 20}
+
+        assert vlans.union([30]) == {1, 2, 3, 10, 11, 20, 30}
+        assert vlans | {30} == {1, 2, 3, 10, 11, 20, 30}
+        assert vlans & {1, 20, 99} == {1, 20}
+        assert vlans - {1, 2} == {3, 10, 11, 20}
+
+        vlans.intersection_update(VlanSet.from_string("1-10"))
+        assert vlans == {1, 2, 3, 10}
+
+        vlans.discard(10)
+        vlans.discard(999)
+        assert vlans == {1, 2, 3}
+        assert vlans <= VlanSet.all()
+
+    def test_out_of_range(self):
+        vlans = VlanSet()
+        with self.assertRaises(ValueError):
+            vlans.add(4096)
+        assert "antani" not in vlans
+
+    def test_str(self):
+        assert str(VlanSet.from_string("1-10,20")) == "1-10,20"
+        assert str(VlanSet([1, 2, 4, 5, 6, 4094])) == "1,2,4-6,4094"
+        assert str(VlanSet()) == ""
+
+    def test_pickle(self):
+        vlans = VlanSet.from_string("1-10,20")
+        assert pickle.loads(pickle.dumps(vlans)) == vlans
+
+
+if __name__ == '__main__':
+    unittest.main()